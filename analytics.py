@@ -0,0 +1,274 @@
+"""
+Post-call analytics: talk time, interruptions, response latency and long
+silences, per call and aggregated per agent and day.
+
+With ANALYTICS=1 (off by default; needs the numpy "audio" extra) every
+bridged call is spooled in the capture format (capture.py) to
+ANALYTICS_DIR; when the call ends the file is analyzed in a process pool
+and removed, unless it was an explicit capture. The analysis decodes each
+leg's mu-law once and works on 20 ms frame energies with NumPy:
+
+  caller  inbound frames, laid on the grid by arrival order
+  agent   outbound chunks, laid where Twilio plays them (each starts at
+          max(sent, end of the previous one))
+
+Voice activity is an energy threshold with short gaps bridged and clicks
+dropped, and every statistic is computed from the two activity tracks.
+Per-call rows go to SQLite (ANALYTICS_DB); the daily per-agent sums are
+rebuilt from them for the day a row lands in, so analysing a call again
+replaces its contribution instead of adding it twice:
+
+    GET /analytics?agent=stacy&since=2026-10-01&until=2026-10-31
+"""
+import os, json, time, base64, sqlite3, asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+ANALYTICS           = os.getenv("ANALYTICS", "0") == "1"
+ANALYTICS_DIR       = os.getenv("ANALYTICS_DIR", "analytics_spool")
+ANALYTICS_DB        = os.getenv("ANALYTICS_DB", "analytics.db")
+ANALYTICS_PROCESSES = int(os.getenv("ANALYTICS_PROCESSES", 1))
+
+FRAME_S        = 0.02
+FRAME_SAMPLES  = 160         # 20 ms at 8 kHz
+VOICE_DBFS     = -40.0
+MAX_GAP_FRAMES = 10          # pauses up to 200 ms stay inside one utterance
+MIN_RUN_FRAMES = 5           # shorter bursts are clicks, not speech
+LONG_SILENCE_S = 3.0
+
+# ── ANALYSIS (runs in worker processes) ──────────────────────────────────────
+def _frame_db(ulaw: bytes):
+    """dBFS of each whole 20 ms frame of a mu-law byte string."""
+    import numpy as np
+    import audio
+    n = len(ulaw) // FRAME_SAMPLES
+    pcm = audio.ulaw_to_pcm16(ulaw[:n * FRAME_SAMPLES]).astype(np.float32)
+    rms = np.sqrt((pcm.reshape(n, FRAME_SAMPLES) ** 2).mean(axis=1))
+    return 20 * np.log10(np.maximum(rms, 1.0) / 32768)
+
+def _runs(frames, voiced):
+    """Merged (start, end) frame runs of activity at grid positions `frames`."""
+    import numpy as np
+    idx = np.unique(frames[voiced])
+    if not len(idx):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(idx) > MAX_GAP_FRAMES + 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    keep = ends - starts >= MIN_RUN_FRAMES
+    return starts[keep], ends[keep]
+
+def _mask(starts, ends, length: int):
+    import numpy as np
+    delta = np.zeros(length + 1, dtype=np.int32)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def analyze_capture(path: str) -> dict:
+    import numpy as np
+    from capture import read_capture, TWILIO_IN, TWILIO_OUT, META
+
+    meta, t_start = {}, None
+    inbound, outbound, out_t = [], [], []
+    for channel, t_ns, text in read_capture(path):
+        if channel == META:
+            meta.update(json.loads(text))
+        elif channel == TWILIO_IN:
+            msg = json.loads(text)
+            if msg.get("event") == "start":
+                t_start = t_ns
+                meta.setdefault("call_sid", msg["start"].get("callSid"))
+            elif msg.get("event") == "media" and t_start is not None:
+                inbound.append(base64.b64decode(msg["media"]["payload"]))
+        elif channel == TWILIO_OUT and t_start is not None:
+            msg = json.loads(text)
+            if msg.get("event") == "media":
+                outbound.append(base64.b64decode(msg["media"]["payload"]))
+                out_t.append((t_ns - t_start) / 1e9)
+    if t_start is None:
+        raise ValueError(f"{path}: stream never started")
+
+    # caller: Twilio delivers inbound audio in real time, one frame after another
+    caller_db = _frame_db(b"".join(inbound))
+    caller_frames = np.arange(len(caller_db))
+
+    # agent: playout time of each chunk, then of each 20 ms frame inside it
+    agent_db = _frame_db(b"".join(outbound))
+    if outbound:
+        n = np.array([len(b) for b in outbound], dtype=np.float64) / 8000
+        before = np.concatenate(([0.0], np.cumsum(n)))
+        play_end = np.maximum.accumulate(np.array(out_t) - before[:-1]) + before[1:]
+        play_start = play_end - n
+        frame_t = np.arange(len(agent_db)) * FRAME_S
+        chunk = np.searchsorted(before, frame_t, side="right") - 1
+        agent_frames = np.rint((play_start[chunk] + frame_t - before[chunk]) / FRAME_S).astype(np.int64)
+    else:
+        agent_frames = np.zeros(0, dtype=np.int64)
+
+    length = int(max(len(caller_frames), agent_frames.max() + 1 if len(agent_frames) else 0, 1))
+    c_start, c_end = _runs(caller_frames, caller_db > VOICE_DBFS)
+    a_start, a_end = _runs(agent_frames, agent_db > VOICE_DBFS)
+    agent_on = _mask(a_start, a_end, length)
+    either = _mask(c_start, c_end, length) | agent_on
+
+    # caller starts talking while the agent is audible
+    interruptions = int(agent_on[c_start].sum()) if len(c_start) else 0
+
+    # caller turn end -> next agent audio, if the agent answers before the caller goes on
+    latencies = np.zeros(0)
+    if len(c_end) and len(a_start):
+        nxt = np.searchsorted(a_start, c_end)
+        ok = nxt < len(a_start)
+        nxt_caller = np.append(c_start[1:], np.iinfo(np.int64).max)
+        answer = a_start[np.minimum(nxt, len(a_start) - 1)]
+        ok &= answer < nxt_caller
+        latencies = (answer[ok] - c_end[ok]) * FRAME_S * 1000
+
+    # silences between the first and last sound of the call
+    silence_s = long_silences = 0
+    active = np.flatnonzero(either)
+    if len(active):
+        quiet = ~either[active[0]:active[-1] + 1]
+        edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+        gaps = (np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)) * FRAME_S
+        long_gaps = gaps[gaps >= LONG_SILENCE_S]
+        long_silences, silence_s = int(len(long_gaps)), float(long_gaps.sum())
+
+    caller_talk = float((c_end - c_start).sum() * FRAME_S)
+    agent_talk = float((a_end - a_start).sum() * FRAME_S)
+    return {
+        "call_sid":          meta.get("call_sid"),
+        "agent":             meta.get("agent"),
+        "duration_s":        round(length * FRAME_S, 2),
+        "caller_talk_s":     round(caller_talk, 2),
+        "agent_talk_s":      round(agent_talk, 2),
+        "talk_ratio":        round(agent_talk / (agent_talk + caller_talk), 3)
+                             if agent_talk + caller_talk else None,
+        "interruptions":     interruptions,
+        "responses":         int(len(latencies)),
+        "first_response_ms": round(float(latencies[0])) if len(latencies) else None,
+        "p50_response_ms":   round(float(np.percentile(latencies, 50))) if len(latencies) else None,
+        "p90_response_ms":   round(float(np.percentile(latencies, 90))) if len(latencies) else None,
+        "response_ms_sum":   float(latencies.sum()),
+        "long_silences":     long_silences,
+        "long_silence_s":    round(silence_s, 2),
+    }
+
+# ── STORE ────────────────────────────────────────────────────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_sid TEXT PRIMARY KEY, agent TEXT, day TEXT, ended REAL,
+    duration_s REAL, caller_talk_s REAL, agent_talk_s REAL, talk_ratio REAL,
+    interruptions INTEGER, responses INTEGER, first_response_ms REAL,
+    p50_response_ms REAL, p90_response_ms REAL, long_silences INTEGER, long_silence_s REAL,
+    response_ms_sum REAL
+);
+CREATE INDEX IF NOT EXISTS calls_agent_day ON calls (agent, day);
+CREATE TABLE IF NOT EXISTS daily (
+    agent TEXT, day TEXT, calls INTEGER, duration_s REAL, caller_talk_s REAL,
+    agent_talk_s REAL, interruptions INTEGER, responses INTEGER, response_ms_sum REAL,
+    first_responses INTEGER, first_response_ms_sum REAL, long_silences INTEGER,
+    long_silence_s REAL, PRIMARY KEY (agent, day)
+);
+"""
+_CALL_COLS = ("call_sid", "agent", "day", "ended", "duration_s", "caller_talk_s", "agent_talk_s",
+              "talk_ratio", "interruptions", "responses", "first_response_ms",
+              "p50_response_ms", "p90_response_ms", "long_silences", "long_silence_s",
+              "response_ms_sum")
+_DAILY_FROM_CALLS = """
+INSERT INTO daily
+SELECT agent, day, COUNT(*), SUM(duration_s), SUM(caller_talk_s), SUM(agent_talk_s),
+       SUM(interruptions), SUM(responses), TOTAL(response_ms_sum), COUNT(first_response_ms),
+       TOTAL(first_response_ms), SUM(long_silences), SUM(long_silence_s)
+FROM calls WHERE agent = ? AND day = ? GROUP BY agent, day
+"""
+
+class Analytics:
+    def __init__(self, path: str = ANALYTICS_DB, spool_dir: str = ANALYTICS_DIR,
+                 processes: int = ANALYTICS_PROCESSES, enabled: bool = ANALYTICS):
+        self.enabled   = enabled
+        self.spool_dir = spool_dir if enabled else None
+        self.processes = processes
+        self.db        = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        if "response_ms_sum" not in [c[1] for c in self.db.execute("PRAGMA table_info(calls)")]:
+            self.db.execute("ALTER TABLE calls ADD COLUMN response_ms_sum REAL")
+        self.pool      = None
+        self._pending  = set()
+
+    def start(self):
+        if self.enabled:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.pool = ProcessPoolExecutor(self.processes)
+
+    def stop(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, capture, agent: str = None):
+        """Analyze a finished session's capture in the background."""
+        if self.pool is None or capture is None:
+            return
+        task = asyncio.ensure_future(self._run(capture.path, capture.spooled, agent))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _run(self, path: str, spooled: bool, agent: str):
+        loop = asyncio.get_running_loop()
+        try:
+            row = await loop.run_in_executor(self.pool, analyze_capture, path)
+            row["agent"] = row["agent"] or agent
+            self.store(row)
+            print(f"Analytics {row['call_sid']}: talk ratio {row['talk_ratio']}, "
+                  f"{row['interruptions']} interruptions, p50 response {row['p50_response_ms']} ms")
+        except Exception as e:
+            print(f"Analytics failed for {path}: {e}")
+        finally:
+            if spooled:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def store(self, row: dict):
+        row = dict(row, ended=time.time(),
+                   day=datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+        old = self.db.execute("SELECT agent, day FROM calls WHERE call_sid = ?",
+                              (row["call_sid"],)).fetchone()
+        with self.db:
+            self.db.execute(f"INSERT OR REPLACE INTO calls ({','.join(_CALL_COLS)}) "
+                            f"VALUES ({','.join('?' * len(_CALL_COLS))})",
+                            [row[c] for c in _CALL_COLS])
+            # re-aggregate the row's day, and the day it was filed under before if that differs
+            for agent, day in {(row["agent"], row["day"]), *([tuple(old)] if old else [])}:
+                self.db.execute("DELETE FROM daily WHERE agent = ? AND day = ?", (agent, day))
+                self.db.execute(_DAILY_FROM_CALLS, (agent, day))
+
+    def query(self, agent: str = None, since: str = None, until: str = None) -> list:
+        """Daily per-agent aggregates (days as YYYY-MM-DD, inclusive)."""
+        where, args = [], []
+        for clause, value in (("agent = ?", agent), ("day >= ?", since), ("day <= ?", until)):
+            if value:
+                where.append(clause)
+                args.append(value)
+        sql = "SELECT * FROM daily" + (" WHERE " + " AND ".join(where) if where else "") \
+              + " ORDER BY day, agent"
+        cur = self.db.execute(sql, args)
+        cols = [d[0] for d in cur.description]
+        rows = []
+        for values in cur:
+            r = dict(zip(cols, values))
+            talk = r["agent_talk_s"] + r["caller_talk_s"]
+            r["talk_ratio"] = round(r["agent_talk_s"] / talk, 3) if talk else None
+            r["mean_response_ms"] = round(r["response_ms_sum"] / r["responses"]) if r["responses"] else None
+            r["mean_first_response_ms"] = (round(r["first_response_ms_sum"] / r["first_responses"])
+                                           if r["first_responses"] else None)
+            r["interruptions_per_call"] = round(r["interruptions"] / r["calls"], 2)
+            rows.append(r)
+        return rows
+
+    def call(self, call_sid: str):
+        cur = self.db.execute("SELECT * FROM calls WHERE call_sid = ?", (call_sid,))
+        row = cur.fetchone()
+        return dict(zip([d[0] for d in cur.description], row)) if row else None
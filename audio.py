@@ -0,0 +1,196 @@
+"""
+G.711 transcoding and 8 kHz <-> 24 kHz resampling with NumPy.
+
+Codecs are table lookups (256 entries to decode, 65536 to encode) applied
+to whole arrays, so a batch of frames costs one fancy-index each way.
+Resamplers are streaming polyphase FIR filters: the history needed by
+the next call is carried over, and each call is one sliding-window matrix
+product with no per-sample Python loop. Conditioner cleans up caller
+audio a frame at a time the same way: per-frame statistics, then one
+gain ramp multiplied across the frame.
+
+Requires numpy (`pip install .[audio]`).
+"""
+import math, base64
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ── G.711 TABLES ─────────────────────────────────────────────────────────────
+def _build_ulaw_decode():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = ((u & 0x0F) << 3) + 0x84
+    t <<= (u & 0x70) >> 4
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+def _build_ulaw_encode():
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    mag = np.minimum(np.abs(pcm), 8159) + 33
+    seg = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), mag)
+    uval = (seg << 4) | ((mag >> (seg + 1)) & 0x0F)
+    table = (np.where(seg >= 8, 0x7F, uval) ^ mask).astype(np.uint8)
+    return np.roll(table, -32768)          # index with int16.view(uint16)
+
+def _build_alaw_decode():
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(seg == 0, t + 8, (t + 0x108) << np.maximum(seg - 1, 0))
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+def _build_alaw_encode():
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    mag = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), mag)
+    aval = (seg << 4) | (np.where(seg < 2, mag >> 1, mag >> np.maximum(seg, 1)) & 0x0F)
+    table = (np.where(seg >= 8, 0x7F, aval) ^ mask).astype(np.uint8)
+    return np.roll(table, -32768)
+
+ULAW_DECODE = _build_ulaw_decode()
+ULAW_ENCODE = _build_ulaw_encode()
+ALAW_DECODE = _build_alaw_decode()
+ALAW_ENCODE = _build_alaw_encode()
+ULAW_DECODE_F32 = ULAW_DECODE.astype(np.float32)
+
+def _u8(data) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else data
+
+def ulaw_to_pcm16(data) -> np.ndarray:
+    return ULAW_DECODE[_u8(data)]
+
+def pcm16_to_ulaw(pcm: np.ndarray) -> np.ndarray:
+    return ULAW_ENCODE[pcm.astype(np.int16, copy=False).view(np.uint16)]
+
+def alaw_to_pcm16(data) -> np.ndarray:
+    return ALAW_DECODE[_u8(data)]
+
+def pcm16_to_alaw(pcm: np.ndarray) -> np.ndarray:
+    return ALAW_ENCODE[pcm.astype(np.int16, copy=False).view(np.uint16)]
+
+# ── RESAMPLING ───────────────────────────────────────────────────────────────
+RATIO = 3                 # 8 kHz <-> 24 kHz
+TAPS_PER_PHASE = 16
+
+def _lowpass(taps: int, cutoff: float) -> np.ndarray:
+    """Windowed-sinc lowpass; cutoff as a fraction of the high rate's Nyquist."""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(taps, 8.0)
+    return h / h.sum()
+
+# passband to ~3.6 kHz, the top of the narrowband telephone channel
+_H = _lowpass(RATIO * TAPS_PER_PHASE, 0.9 / RATIO)
+
+def _clip16(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+
+class Upsampler:
+    """8 kHz -> 24 kHz. Each input window yields RATIO outputs (one per phase)."""
+    __slots__ = ("_hist", "_phases")
+
+    def __init__(self):
+        self._hist = np.zeros(TAPS_PER_PHASE - 1, dtype=np.float32)
+        # _phases[k, p] multiplies window sample k for output phase p
+        self._phases = (RATIO * _H.reshape(TAPS_PER_PHASE, RATIO)[::-1]).astype(np.float32)
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        x = np.concatenate((self._hist, pcm.astype(np.float32, copy=False)))
+        self._hist = x[len(x) - (TAPS_PER_PHASE - 1):]
+        return _clip16((sliding_window_view(x, TAPS_PER_PHASE) @ self._phases).ravel())
+
+class Downsampler:
+    """24 kHz -> 8 kHz. Only every RATIO-th filter output is computed."""
+    __slots__ = ("_hist", "_taps")
+
+    def __init__(self):
+        self._taps = _H[::-1].astype(np.float32)
+        self._hist = np.zeros(len(_H) - 1, dtype=np.float32)
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        x = np.concatenate((self._hist, pcm.astype(np.float32, copy=False)))
+        taps = len(self._taps)
+        n = (len(x) - taps) // RATIO + 1 if len(x) >= taps else 0
+        self._hist = x[n * RATIO:]
+        if not n:
+            return np.zeros(0, dtype=np.int16)
+        return _clip16(sliding_window_view(x, taps)[:n * RATIO:RATIO] @ self._taps)
+
+# ── INPUT CONDITIONING ───────────────────────────────────────────────────────
+class Conditioner:
+    """
+    DC removal, noise gate and AGC for one caller's 8 kHz audio.
+
+    Per frame: the DC estimate follows the frame mean; the level (dBFS
+    after DC removal) is compared with an adaptive noise floor (drops at
+    once, rises slowly) and the gate opens when it clears both the floor
+    by gate_margin_db and the absolute gate_dbfs. Open frames steer the
+    AGC gain towards target_dbfs (fast to cut, slow to boost, never above
+    max_gain_db); closed frames are attenuated by gate_atten_db. The gain
+    moves linearly across each frame, so steps never click.
+    """
+    __slots__ = ("dc_alpha", "gate_dbfs", "gate_margin", "gate_atten", "agc", "target",
+                 "max_gain", "attack", "release", "_dc", "_floor", "_agc", "_gain", "_ramp")
+
+    def __init__(self, dc: bool = True, gate: bool = True, agc: bool = True,
+                 gate_dbfs: float = -55.0, gate_margin_db: float = 8.0, gate_atten_db: float = -18.0,
+                 target_dbfs: float = -22.0, max_gain_db: float = 18.0,
+                 attack: float = 0.5, release: float = 0.05):
+        self.dc_alpha    = 0.05 if dc else 0.0
+        self.gate_dbfs   = gate_dbfs if gate else None
+        self.gate_margin = gate_margin_db
+        self.gate_atten  = 10 ** (gate_atten_db / 20)
+        self.agc         = agc
+        self.target      = target_dbfs
+        self.max_gain    = 10 ** (max_gain_db / 20)
+        self.attack      = attack       # per-frame smoothing when the gain must fall
+        self.release     = release      # ... and when it may rise
+        self._dc    = 0.0
+        self._floor = -60.0
+        self._agc   = 1.0
+        self._gain  = 1.0
+        self._ramp  = np.zeros(0, dtype=np.float32)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """float32 samples in, int16 out; x may be modified in place."""
+        n = len(x)
+        if not n:
+            return x.astype(np.int16)
+        if self.dc_alpha:
+            self._dc += (float(x.mean()) - self._dc) * self.dc_alpha
+            x -= self._dc
+        energy = float(np.dot(x, x)) / n
+        db = 10 * math.log10(energy / 32768.0 ** 2) if energy > 0 else -120.0
+        self._floor = db if db < self._floor else self._floor + 0.02
+
+        speech = True
+        if self.gate_dbfs is not None:
+            speech = db > self.gate_dbfs and db > self._floor + self.gate_margin
+        if self.agc and speech:
+            want = min(self.max_gain, 10 ** ((self.target - db) / 20))
+            rate = self.attack if want < self._agc else self.release
+            self._agc += (want - self._agc) * rate
+        # a closed gate attenuates from unity, not from whatever boost speech needed
+        gain = self._agc if speech else min(self._agc, 1.0) * self.gate_atten
+
+        if len(self._ramp) != n:
+            self._ramp = np.arange(1, n + 1, dtype=np.float32) / n
+        x *= self._gain + (gain - self._gain) * self._ramp
+        self._gain = gain
+        return _clip16(x)
+
+def condition_ulaw_b64(payload: str, cond: Conditioner) -> str:
+    """Twilio media payload -> conditioned mu-law payload (g711_ulaw upstream)."""
+    x = ULAW_DECODE_F32[np.frombuffer(base64.b64decode(payload), dtype=np.uint8)]
+    return base64.b64encode(pcm16_to_ulaw(cond.process(x)).tobytes()).decode()
+
+# ── EDGE TRANSCODING (bridge helpers) ────────────────────────────────────────
+def ulaw8k_b64_to_pcm24k_b64(payload: str, up: Upsampler, cond: Conditioner = None) -> str:
+    """Twilio media payload -> Realtime pcm16 append payload, conditioned first if given."""
+    codes = np.frombuffer(base64.b64decode(payload), dtype=np.uint8)
+    pcm = up.process(cond.process(ULAW_DECODE_F32[codes]) if cond else ULAW_DECODE[codes])
+    return base64.b64encode(pcm.astype("<i2", copy=False).tobytes()).decode()
+
+def pcm24k_b64_to_ulaw8k_b64(delta: str, down: Downsampler) -> str:
+    """Realtime pcm16 audio delta -> Twilio media payload."""
+    pcm = np.frombuffer(base64.b64decode(delta), dtype="<i2")
+    return base64.b64encode(pcm16_to_ulaw(down.process(pcm)).tobytes()).decode()
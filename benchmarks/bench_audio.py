@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Throughput of the audio module in 20 ms frames per millisecond of one
+core, for single frames and for batches.
+
+    python benchmarks/bench_audio.py [--seconds 1]
+"""
+import os, sys, time, base64, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import audio
+
+FRAME_8K  = 160    # samples per 20 ms
+FRAME_24K = 480
+
+def frames_per_ms(fn, frames_per_call: int, seconds: float) -> float:
+    fn()  # warm up
+    calls, t0 = 0, time.process_time()
+    while time.process_time() - t0 < seconds:
+        for _ in range(50):
+            fn()
+        calls += 50
+    return calls * frames_per_call / ((time.process_time() - t0) * 1000)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=1.0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'stage':34s} {'batch':>5s} {'frames/ms/core':>15s}")
+    for batch in (1, 10, 50):
+        ulaw = rng.integers(0, 256, FRAME_8K * batch, dtype=np.uint8)
+        pcm8 = audio.ulaw_to_pcm16(ulaw)
+        pcm24 = rng.integers(-8000, 8000, FRAME_24K * batch).astype(np.int16)
+        ulaw_b64 = base64.b64encode(ulaw.tobytes()).decode()
+        pcm24_b64 = base64.b64encode(pcm24.tobytes()).decode()
+        up, down = audio.Upsampler(), audio.Downsampler()
+
+        stages = {
+            "ulaw decode":              lambda: audio.ulaw_to_pcm16(ulaw),
+            "ulaw encode":              lambda: audio.pcm16_to_ulaw(pcm8),
+            "alaw decode":              lambda: audio.alaw_to_pcm16(ulaw),
+            "upsample 8k->24k":         lambda: up.process(pcm8),
+            "downsample 24k->8k":       lambda: down.process(pcm24),
+            "inbound b64 ulaw->pcm24k": lambda: audio.ulaw8k_b64_to_pcm24k_b64(ulaw_b64, up),
+            "outbound b64 pcm24k->ulaw": lambda: audio.pcm24k_b64_to_ulaw8k_b64(pcm24_b64, down),
+        }
+        for name, fn in stages.items():
+            print(f"{name:34s} {batch:5d} {frames_per_ms(fn, batch, args.seconds):15.1f}")
+
+if __name__ == "__main__":
+    main()
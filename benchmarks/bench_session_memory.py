@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+RSS per bridged call: N MediaSessions on in-process stand-in sockets,
+first idle (stream started, no audio), then active (a 20 ms frame each
+way per call). Only the bridge's own state is measured; real sockets add
+their kernel and websockets buffers on top.
+
+    python benchmarks/bench_session_memory.py [--calls 1000] [--seconds 5]
+"""
+import os, sys, gc, json, time, asyncio, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge import MediaSession
+
+FRAME = "/" * 214   # base64 of 160 mu-law bytes (20 ms)
+
+def rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+class Twilio:
+    def __init__(self, n: int, active: asyncio.Event, done: asyncio.Event):
+        self.n, self.active, self.done = n, active, done
+
+    async def iter_text(self):
+        yield json.dumps({"event": "start", "start": {"streamSid": f"MZ{self.n}", "callSid": f"CA{self.n}"}})
+        await self.active.wait()
+        frame = '{"event":"media","media":{"track":"inbound","payload":"' + FRAME + '"},"streamSid":"MZ%d"}' % self.n
+        while not self.done.is_set():
+            yield frame
+            await asyncio.sleep(0.02)
+        yield '{"event":"stop"}'
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self):
+        pass
+
+class Upstream:
+    def __init__(self, active: asyncio.Event, done: asyncio.Event):
+        self.active, self.done = active, done
+
+    async def send(self, text):
+        pass
+
+    async def __aiter__(self):
+        await self.active.wait()
+        delta = '{"type":"response.audio.delta","event_id":"e","delta":"' + FRAME + '"}'
+        while not self.done.is_set():
+            yield delta
+            await asyncio.sleep(0.02)
+
+    async def close(self):
+        pass
+
+async def main(calls: int, seconds: float):
+    active, done = asyncio.Event(), asyncio.Event()
+    gc.collect()
+    base = rss_kb()
+
+    async def run(i):
+        up = Upstream(active, done)
+        async def connect():
+            return up
+        await MediaSession(Twilio(i, active, done), "alex", connect=connect).run()
+
+    runs = [asyncio.ensure_future(run(i)) for i in range(calls)]
+    await asyncio.sleep(1)
+    gc.collect()
+    idle = rss_kb()
+
+    active.set()
+    t0 = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - t0
+    gc.collect()
+    busy = rss_kb()
+
+    done.set()
+    await asyncio.gather(*runs)
+    return (idle - base) / calls, (busy - base) / calls, cpu / seconds * 100
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=1000)
+    ap.add_argument("--seconds", type=float, default=5)
+    args = ap.parse_args()
+    import builtins
+    builtins.print, _print = (lambda *a, **k: None), builtins.print   # silence per-call logs
+    try:
+        idle, active, cpu = asyncio.run(main(args.calls, args.seconds))
+    finally:
+        builtins.print = _print
+    print(f"calls={args.calls}")
+    print(f"idle    {idle:7.1f} KB/call")
+    print(f"active  {active:7.1f} KB/call")
+    print(f"cpu     {cpu:7.1f} % of one core (stand-in pacing included)")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Webhook latency under burst dialing: legacy per-request VoiceResponse
+building vs. the precompiled TwimlEngine, in-process and through ASGI.
+
+    python benchmarks/bench_twiml.py [--burst 200] [--rounds 20]
+"""
+import os, sys, time, asyncio, argparse
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name in ("OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER"):
+    os.environ.setdefault(name, "bench")
+
+import httpx
+from twilio.twiml.voice_response import VoiceResponse
+
+import fastapi_service
+from twiml import TwimlEngine
+
+BASE = "https://cmac.ngrok.app"
+
+def legacy_render(agent: str, scenario: str) -> str:
+    # what outbound_handler/inbound_handler did before the engine
+    proto = "wss" if BASE.startswith("https") else "ws"
+    host  = BASE.replace("https://", "").replace("http://", "")
+    qs    = "&".join(f"{k}={v}" for k, v in {"agent": agent, "scenario": scenario}.items())
+    vr = VoiceResponse()
+    vr.connect().stream(url=f"{proto}://{host}/media-stream?{qs}")
+    return str(vr)
+
+def per_render_us(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+async def burst(client: httpx.AsyncClient, size: int):
+    # signed like Twilio's webhook, or the handler refuses it
+    url, form = "/outbound-call-handler?agent=jessica", {"CallSid": "CA0"}
+    body, headers = urlencode(form).encode(), {
+        "content-type": "application/x-www-form-urlencoded",
+        "x-twilio-signature": fastapi_service.twilio_validator.compute_signature(
+            fastapi_service.tunnel.url.rstrip("/") + url, form)}
+    async def one():
+        t0 = time.perf_counter()
+        r = await client.post(url, content=body, headers=headers)
+        r.raise_for_status()
+        return time.perf_counter() - t0
+    return await asyncio.gather(*(one() for _ in range(size)))
+
+async def webhook_latency(burst_size: int, rounds: int):
+    transport = httpx.ASGITransport(app=fastapi_service.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await burst(client, 10)  # warm up
+        samples = []
+        for _ in range(rounds):
+            samples += await burst(client, burst_size)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--burst", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("-n", type=int, default=20000)
+    args = ap.parse_args()
+
+    engine = TwimlEngine(BASE, fastapi_service.PROMPTS)
+    assert engine.render("jessica", "outbound").decode().count("scenario=outbound") == 1
+
+    legacy = per_render_us(lambda: legacy_render("jessica", "outbound"), args.n)
+    fast   = per_render_us(lambda: engine.render("jessica", "outbound"), args.n)
+    params = per_render_us(lambda: engine.render("jessica", "outbound", {"tenant": "a b&c"}), args.n)
+    print(f"render legacy        {legacy:8.2f} us")
+    print(f"render precompiled   {fast:8.2f} us   ({legacy / fast:.0f}x)")
+    print(f"render + params      {params:8.2f} us")
+
+    p50, p99 = asyncio.run(webhook_latency(args.burst, args.rounds))
+    print(f"webhook burst={args.burst}  p50 {p50 * 1e3:.2f} ms  p99 {p99 * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main()
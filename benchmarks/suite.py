@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Throughput of the service's hot paths, checked against stored baselines.
+
+Each case reports operations per second and a score: its throughput
+relative to a fixed reference workload timed alongside it, which keeps
+comparisons stable on shared or frequency-scaled CPUs. Without --update,
+a case fails when its score drops more than --threshold below the
+baseline in benchmarks/baseline.json and the suite exits 1. Baselines
+still belong to the machine that recorded them; the file keeps that
+machine's description, and a mismatch is reported.
+
+    python benchmarks/suite.py                 # compare
+    python benchmarks/suite.py --update        # record new baselines
+    python benchmarks/suite.py -k twiml        # only matching cases
+"""
+import os, sys, json, time, base64, inspect, asyncio, argparse, platform
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for name in ("OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER"):
+    os.environ.setdefault(name, "bench")
+os.environ.setdefault("ANALYTICS", "0")
+
+import httpx
+from starlette.requests import Request
+
+import bridge
+import cmac_multi
+import fastapi_service
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PAYLOAD  = "/" * 214      # base64 of 160 mu-law bytes (20 ms)
+FRAME    = ('{"event":"media","sequenceNumber":"42","media":{"track":"inbound","chunk":"41",'
+            '"timestamp":"820","payload":"' + PAYLOAD + '"},"streamSid":"MZ0"}')
+DELTA    = ('{"type":"response.audio.delta","event_id":"event_1","response_id":"resp_1",'
+            '"item_id":"item_1","output_index":0,"content_index":0,"delta":"' + PAYLOAD + '"}')
+HEAD     = '{"event":"media","streamSid":"MZ0","media":{"payload":"'
+
+def machine() -> str:
+    return f"{platform.machine()} {platform.processor() or platform.node()} x{os.cpu_count()} py{platform.python_version()}"
+
+# ── CASES ────────────────────────────────────────────────────────────────────
+# Each returns (fn, ops_per_call); sync fns are timed directly, async ones in a loop.
+def case_twilio_frame_decode():
+    slice_, key, prefix = bridge._slice_string, bridge._PAYLOAD_KEY, bridge._TWILIO_MEDIA
+    def fn():
+        if FRAME.startswith(prefix):
+            return slice_(FRAME, key)
+    return fn, 1
+
+def case_realtime_append_encode():
+    head, tail = bridge._APPEND_HEAD, bridge._APPEND_TAIL
+    return (lambda: head + PAYLOAD + tail), 1
+
+def case_outbound_delta_wrap():
+    slice_, kind, key, tail = bridge._slice_string, bridge._DELTA_TYPE, bridge._DELTA_KEY, bridge._MEDIA_TAIL
+    def fn():
+        if DELTA.find(kind, 0, 64) >= 0:
+            return HEAD + slice_(DELTA, key) + tail
+    return fn, 1
+
+def case_bridge_inbound_frames():
+    """100 Twilio frames through MediaSession.twilio_to_upstream."""
+    class Twilio:
+        async def iter_text(self):
+            for _ in range(100):
+                yield FRAME
+    class Upstream:
+        async def send(self, text):
+            pass
+        async def close(self):
+            pass
+    session = bridge.MediaSession(Twilio(), "alex")
+    session.upstream = Upstream()
+    return session.twilio_to_upstream, 100
+
+def case_bridge_outbound_deltas():
+    """100 Realtime deltas through MediaSession.upstream_to_twilio."""
+    class Upstream:
+        async def __aiter__(self):
+            for _ in range(100):
+                yield DELTA
+    class Twilio:
+        async def send_text(self, text):
+            pass
+    session = bridge.MediaSession(Twilio(), "alex")
+    session.upstream, session._media_head = Upstream(), HEAD
+    return session.upstream_to_twilio, 100
+
+def _voice_payload() -> str:
+    """20 ms of a quiet 300 Hz tone over hiss, as a real mu-law payload."""
+    import numpy as np, audio
+    t = np.arange(160) / 8000
+    pcm = 600 * np.sin(2 * np.pi * 300 * t) + np.random.default_rng(0).normal(0, 30, 160)
+    return base64.b64encode(audio.pcm16_to_ulaw(pcm).tobytes()).decode()
+
+def case_condition_ulaw_frame():
+    """DC removal + gate + AGC on one 20 ms mu-law frame, base64 in and out."""
+    import audio
+    cond, payload = audio.Conditioner(), _voice_payload()
+    return (lambda: audio.condition_ulaw_b64(payload, cond)), 1
+
+def case_bridge_inbound_frames_conditioned():
+    """case_bridge_inbound_frames with input conditioning on; 50 frames = 1 s of one call."""
+    import audio
+    bridge.audio = audio        # imported by bridge only when a conditioning file exists
+    frame = FRAME.replace(PAYLOAD, _voice_payload())
+    class Twilio:
+        async def iter_text(self):
+            for _ in range(100):
+                yield frame
+    class Upstream:
+        async def send(self, text):
+            pass
+        async def close(self):
+            pass
+    session = bridge.MediaSession(Twilio(), "alex")
+    session.upstream, session._cond = Upstream(), audio.Conditioner()
+    return session.twilio_to_upstream, 100
+
+def _request(url: str) -> Request:
+    scheme, rest = url.split("://", 1)
+    host, _, path = rest.partition("/")
+    hostname, _, port = host.partition(":")
+    return Request({"type": "http", "scheme": scheme, "path": "/" + path, "query_string": b"",
+                    "headers": [(b"host", host.encode())],
+                    "server": (hostname, int(port) if port else (443 if scheme == "https" else 80))})
+
+def case_ws_url_service():
+    req = _request("https://cmac.ngrok.app/outbound-call-handler")
+    params = {"agent": "jessica", "scenario": "outbound"}
+    return (lambda: fastapi_service.ws_url(req, "/media-stream", params)), 1
+
+def case_ws_url_multi():
+    req = _request("https://cmac.ngrok.app/outbound-call-handler")
+    params = {"agent": "jessica", "scenario": "outbound"}
+    return (lambda: cmac_multi.ws_url(req, "/media-stream", params)), 1
+
+def case_twiml_render_outbound():
+    engine = fastapi_service.twiml_engine
+    return (lambda: engine.render("jessica", "outbound")), 1
+
+def case_twiml_render_inbound():
+    engine = fastapi_service.twiml_engine
+    return (lambda: engine.render(fastapi_service.router.lookup("+14055550100", "+19185550100"),
+                                  "inbound")), 1
+
+def _asgi(app, method: str, url: str, n: int = 50, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    async def fn():
+        for _ in range(n):
+            r = await client.request(method, url, **kwargs)
+            r.raise_for_status()
+    return fn, n
+
+def case_asgi_health():
+    return _asgi(fastapi_service.app, "GET", "/health")
+
+def _twilio_post(url: str, form: dict) -> dict:
+    """Request kwargs for a webhook POST signed the way Twilio signs it (body encoded once)."""
+    signed = fastapi_service.tunnel.url.rstrip("/") + url
+    return {"content": urlencode(form).encode(), "headers": {
+        "content-type": "application/x-www-form-urlencoded",
+        "x-twilio-signature": fastapi_service.twilio_validator.compute_signature(signed, form)}}
+
+def case_asgi_outbound_handler():
+    url = "/outbound-call-handler?agent=jessica"
+    return _asgi(fastapi_service.app, "POST", url, **_twilio_post(url, {"CallSid": "CA0"}))
+
+def case_asgi_inbound_handler():
+    url = "/inbound-call-handler"
+    return _asgi(fastapi_service.app, "POST", url, **_twilio_post(
+        url, {"CallSid": "CA0", "To": "+14055550100", "From": "+19185550100"}))
+
+def case_asgi_outbound_handler_multi():
+    return _asgi(cmac_multi.app, "POST", "/outbound-call-handler?agent=jessica")
+
+CASES = {name[5:]: fn for name, fn in sorted(globals().items()) if name.startswith("case_")}
+
+# ── RUNNER ───────────────────────────────────────────────────────────────────
+_REF_DATA = {"event": "media", "media": {"payload": PAYLOAD}, "seq": list(range(8))}
+
+def reference():
+    """Fixed CPU-bound work timed next to every case, to cancel out clock drift."""
+    json.dumps(_REF_DATA)
+    sorted(range(64, 0, -1))
+
+def _rate(call, batch: int, seconds: float) -> float:
+    calls, t0 = 0, time.perf_counter()
+    while (elapsed := time.perf_counter() - t0) < seconds:
+        for _ in range(batch):
+            call()
+        calls += batch
+    return calls / elapsed
+
+def measure(fn, ops: int, seconds: float, repeat: int, loop):
+    """
+    (ops/s, score): best raw throughput, and the median of throughput
+    relative to reference() timed alongside it. Shared or frequency-scaled
+    CPUs move both together, so the score is what baselines compare.
+    """
+    is_async = inspect.iscoroutinefunction(fn)
+    call = (lambda: loop.run_until_complete(fn())) if is_async else fn
+    call()  # warm up
+    raw, scores = [], []
+    for _ in range(repeat):
+        ref = _rate(reference, 200, seconds / 2)
+        ops_s = _rate(call, 1 if is_async else 200, seconds) * ops
+        ref = (ref + _rate(reference, 200, seconds / 2)) / 2
+        raw.append(ops_s)
+        scores.append(ops_s / ref)
+    return max(raw), sorted(scores)[len(scores) // 2]
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--update", action="store_true", help="store results as the new baselines")
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="allowed throughput drop before a case fails (fraction)")
+    ap.add_argument("--seconds", type=float, default=0.3)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("-k", default="", help="only run cases containing this string")
+    args = ap.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    if baseline and not args.update and baseline.get("machine") != machine():
+        print(f"note: baselines recorded on '{baseline.get('machine')}', running on '{machine()}'")
+
+    import builtins
+    _print, builtins.print = builtins.print, (lambda *a, **k: None)   # silence per-frame logs
+    loop, results = asyncio.new_event_loop(), {}
+    try:
+        for name, make in CASES.items():
+            if args.k in name:
+                fn, ops = make()
+                results[name] = measure(fn, ops, args.seconds, args.repeat, loop)
+    finally:
+        builtins.print = _print
+        loop.close()
+
+    failed = []
+    print(f"{'case':32s} {'ops/s':>12s} {'score':>9s} {'baseline':>9s} {'change':>8s}")
+    for name, (ops, score) in results.items():
+        base = baseline.get("cases", {}).get(name)
+        change = f"{(score / base - 1) * 100:+7.1f}%" if base else "     new"
+        flag = ""
+        if base and not args.update and score < base * (1 - args.threshold):
+            failed.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:32s} {ops:12,.0f} {score:9.4g} {base or 0:9.4g} {change}{flag}")
+
+    if args.update:
+        cases = dict(baseline.get("cases", {}),
+                     **{k: float(f"{score:.4g}") for k, (_, score) in results.items()})
+        with open(BASELINE, "w") as f:
+            json.dump({"machine": machine(), "cases": cases}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines written to {os.path.relpath(BASELINE, ROOT)}")
+        return 0
+    if failed:
+        print(f"{len(failed)} case(s) regressed more than {args.threshold:.0%}: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
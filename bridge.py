@@ -0,0 +1,406 @@
+"""
+Twilio Media Stream <-> OpenAI Realtime bridge used by /media-stream.
+
+One MediaSession per call. Audio frames take a string-level fast path in
+both directions (payload sliced out of the frame and spliced into a
+prebuilt envelope), so the steady state allocates no dicts per frame;
+everything else goes through json as before.
+
+`connect` opens the upstream socket and is swappable so the same bridge
+can be driven by recorded or scripted stand-ins (see replay.py).
+
+Live sessions are registered in SESSIONS with their last-activity times so
+reaper.py can close the ones that stopped making progress, and in CALLS by
+call SID once Twilio's start frame names it (listen-in, control). A
+listen.Tap, when attached, gets every media frame either leg carried.
+"""
+import os, json, time, asyncio, websockets
+
+from prompts import PROMPTS
+from event_hub import hub
+from capture import TWILIO_IN, UPSTREAM_OUT, UPSTREAM_IN, TWILIO_OUT, META
+from profiling import profiler
+from metrics import Gauge
+from context import ConversationContext
+from turn_taking import turns
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_WS      = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
+# "pcm16" runs the upstream at 24 kHz PCM and transcodes at the edge (needs numpy)
+UPSTREAM_AUDIO_FORMAT = os.getenv("UPSTREAM_AUDIO_FORMAT", "g711_ulaw")
+# Caller-audio conditioning (DC removal, noise gate, AGC; needs numpy), per
+# agent from a JSON file of audio.Conditioner settings; "*" applies to the
+# rest and false turns an agent off:
+#   {"*": {}, "jessica": {"gate_dbfs": -50, "target_dbfs": -20}, "alex": false}
+AUDIO_CONDITIONING = os.getenv("AUDIO_CONDITIONING", "conditioning.json")
+CONDITIONING = {}
+if os.path.exists(AUDIO_CONDITIONING):
+    with open(AUDIO_CONDITIONING) as f:
+        CONDITIONING = json.load(f)
+
+if UPSTREAM_AUDIO_FORMAT == "pcm16" or CONDITIONING:
+    import audio
+
+def conditioning(agent: str):
+    """The agent's Conditioner settings, or None when it gets the raw caller audio."""
+    spec = CONDITIONING.get(agent, CONDITIONING.get("*"))
+    return spec if isinstance(spec, dict) else None
+
+# Frame envelopes. Base64 never needs JSON escaping, so payloads are spliced
+# in as-is; anything that doesn't match these shapes takes the json path.
+_TWILIO_MEDIA   = '{"event":"media"'
+_PAYLOAD_KEY    = '"payload":"'
+_APPEND_HEAD    = '{"type":"input_audio_buffer.append","audio":"'
+_DELTA_TYPE     = '"type":"response.audio.delta"'
+_DELTA_KEY      = '"delta":"'
+_APPEND_TAIL    = '"}'
+_MEDIA_TAIL     = '"}}'
+
+SESSIONS = set()
+CALLS    = {}           # call_sid -> MediaSession, from the start frame on
+Gauge("bridge_sessions_active", "Bridged calls currently open", fn=lambda: len(SESSIONS))
+
+async def connect_upstream():
+    return await websockets.connect(
+        OPENAI_WS,
+        additional_headers={
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "OpenAI-Beta": "realtime=v1"
+        }
+    )
+
+def _slice_string(message: str, key: str, start: int = 0):
+    """Value of a "key":"..." string field, or None."""
+    i = message.find(key, start)
+    if i < 0:
+        return None
+    i += len(key)
+    j = message.find('"', i)
+    return message[i:j] if j >= 0 else None
+
+# ── SESSION ──────────────────────────────────────────────────────────────────
+class MediaSession:
+    __slots__ = ("ws", "agent", "scenario", "connect", "capture", "upstream",
+                 "stream_sid", "call_sid", "tasks", "prof", "_media_head", "_up", "_down", "_cond",
+                 "started", "last_inbound", "last_upstream", "closing", "context", "turns", "tap", "notes",
+                 "expect_call")
+
+    def __init__(self, ws, agent: str, scenario: str = "outbound",
+                 connect=connect_upstream, capture=None, expect_call: str = None):
+        self.ws          = ws
+        self.agent       = agent if agent in PROMPTS else "alex"
+        self.scenario    = scenario
+        self.connect     = connect
+        self.capture     = capture
+        self.upstream    = None
+        self.stream_sid  = None
+        self.call_sid    = None
+        self.tasks       = ()
+        self.prof        = None
+        self._media_head = None
+        self._up         = audio.Upsampler() if UPSTREAM_AUDIO_FORMAT == "pcm16" else None
+        self._down       = audio.Downsampler() if UPSTREAM_AUDIO_FORMAT == "pcm16" else None
+        spec = conditioning(self.agent)
+        self._cond       = audio.Conditioner(**spec) if spec is not None else None
+        # monotonic seconds; the idle clocks start at creation so a leg that
+        # never produces anything still times out
+        self.started = self.last_inbound = self.last_upstream = time.monotonic()
+        self.closing     = None     # reap reason once shutdown() was called
+        self.context     = ConversationContext()
+        self.turns       = turns.meter(self.agent, UPSTREAM_AUDIO_FORMAT)
+        self.tap         = None     # listen.Tap while someone is listening
+        self.notes       = []       # supervisor instructions kept across handoffs
+        self.expect_call = expect_call  # call SID the stream token was issued for
+
+    def instructions(self) -> str:
+        if not self.notes:
+            return PROMPTS[self.agent]
+        return PROMPTS[self.agent] + "\n\nSupervisor instructions for this call:\n" + "\n".join(
+            f"- {n}" for n in self.notes)
+
+    def session_config(self) -> dict:
+        return {
+            "type": "session.update",
+            "session": {
+                "modalities": ["text", "audio"],
+                "instructions": self.instructions(),
+                "voice": "alloy",
+                "input_audio_format": UPSTREAM_AUDIO_FORMAT,
+                "output_audio_format": UPSTREAM_AUDIO_FORMAT,
+                "input_audio_transcription": {
+                    "model": "whisper-1"
+                },
+                "turn_detection": turns.turn_detection(self.agent),
+                "tools": [],
+                "tool_choice": "auto",
+                "temperature": 0.8,
+                "max_response_output_tokens": 4096
+            }
+        }
+
+    async def send_upstream(self, text: str):
+        await self.upstream.send(text)
+        if self.capture:
+            self.capture.record(UPSTREAM_OUT, text)
+
+    async def send_twilio(self, text: str):
+        await self.ws.send_text(text)
+        if self.capture:
+            self.capture.record(TWILIO_OUT, text)
+
+    def shutdown(self, reason: str):
+        """End both pumps; run() then closes both legs as on a normal stop."""
+        if self.closing:
+            return
+        self.closing = reason
+        for task in self.tasks:
+            task.cancel()
+
+    async def run(self):
+        """Bridge until both legs end, then close both."""
+        print(f"Media stream connected for agent: {self.agent}")
+        SESSIONS.add(self)
+        if self.capture:
+            self.capture.record(META, json.dumps({"agent": self.agent, "scenario": self.scenario}))
+        try:
+            self.upstream = await self.connect()
+            print("Connected to OpenAI Realtime API")
+            hub.publish("upstream.connected", agent=self.agent)
+
+            await self.send_upstream(json.dumps(self.session_config()))
+            print("OpenAI session configured")
+            if self.closing:        # reaped while the upstream was connecting
+                return
+
+            self.tasks = (asyncio.ensure_future(self.twilio_to_upstream()),
+                          asyncio.ensure_future(self.upstream_to_twilio()))
+            await asyncio.gather(*self.tasks)
+
+        except asyncio.CancelledError:
+            if not self.closing:
+                raise
+            print(f"Session reaped: {self.closing}")
+        except Exception as e:
+            print(f"Error in media stream: {e}")
+            hub.publish("error", self.call_sid, self.agent, source="bridge", detail=str(e))
+        finally:
+            SESSIONS.discard(self)
+            if CALLS.get(self.call_sid) is self:
+                del CALLS[self.call_sid]
+            if self.tap:
+                self.tap.close()
+            if self.prof:
+                profiler.end(self.prof)
+            if self.capture:
+                self.capture.close()
+            if self.upstream:
+                await self.upstream.close()
+            try:
+                await self.ws.close()
+            except Exception:
+                pass            # Twilio already dropped the socket
+
+    # ── Twilio → upstream ────────────────────────────────────────────────────
+    async def twilio_to_upstream(self):
+        capture, now = self.capture, time.monotonic
+        async for message in self.ws.iter_text():
+            self.last_inbound = now()
+            if capture:
+                capture.record(TWILIO_IN, message)
+            try:
+                if message.startswith(_TWILIO_MEDIA):
+                    payload = _slice_string(message, _PAYLOAD_KEY)
+                    if payload is not None:
+                        if self._up:
+                            payload = audio.ulaw8k_b64_to_pcm24k_b64(payload, self._up, self._cond)
+                        elif self._cond:
+                            payload = audio.condition_ulaw_b64(payload, self._cond)
+                        await self.send_upstream(_APPEND_HEAD + payload + _APPEND_TAIL)
+                        if self.tap:
+                            self.tap.push(message)
+                        continue
+                if not await self.on_twilio_event(json.loads(message)):
+                    break
+            except json.JSONDecodeError:
+                print("Invalid JSON from Twilio")
+            except Exception as e:
+                print(f"Error processing Twilio message: {e}")
+        # the call is over; closing the upstream ends the other pump too
+        await self.upstream.close()
+
+    async def on_twilio_event(self, data: dict) -> bool:
+        """Handle a non-fast-path Twilio frame; False ends the inbound leg."""
+        event = data["event"]
+        if event == "start":
+            if self.expect_call and data["start"]["callSid"] != self.expect_call:
+                print(f"Stream for {data['start']['callSid']} used a token for {self.expect_call}")
+                return False
+            self.stream_sid = data["start"]["streamSid"]
+            self.call_sid = data["start"]["callSid"]
+            CALLS[self.call_sid] = self
+            for task in self.tasks:     # so loop_watchdog stalls name the call
+                task.set_name(f"bridge {self.call_sid} {task.get_coro().__name__}")
+            self._media_head = ('{"event":"media","streamSid":' + json.dumps(self.stream_sid)
+                                + ',"media":{"payload":"')
+            print(f"Stream started - SID: {self.stream_sid}")
+            hub.publish("stream.start", self.call_sid, self.agent, stream_sid=self.stream_sid)
+            if profiler.armed and profiler.wants(self.call_sid, self.agent):
+                self.prof = profiler.begin(self.call_sid, self.agent, self.tasks)
+
+        elif event == "media":
+            # a media frame the fast path didn't recognise
+            payload = data["media"]["payload"]
+            if self.tap:
+                self.tap.push(json.dumps(data))
+            if self._up:
+                payload = audio.ulaw8k_b64_to_pcm24k_b64(payload, self._up, self._cond)
+            elif self._cond:
+                payload = audio.condition_ulaw_b64(payload, self._cond)
+            await self.send_upstream(json.dumps({
+                "type": "input_audio_buffer.append",
+                "audio": payload
+            }))
+
+        elif event == "stop":
+            print("Stream stopped")
+            hub.publish("stream.stop", self.call_sid, self.agent)
+            return False
+        return True
+
+    # ── upstream → Twilio ────────────────────────────────────────────────────
+    async def upstream_to_twilio(self):
+        capture, now = self.capture, time.monotonic
+        async for message in self.upstream:
+            self.last_upstream = t = now()
+            if capture:
+                capture.record(UPSTREAM_IN, message)
+            try:
+                if self._media_head and message.find(_DELTA_TYPE, 0, 64) >= 0:
+                    delta = _slice_string(message, _DELTA_KEY)
+                    if delta is not None:
+                        self.turns.audio(t, len(delta))     # not cached: handoff swaps it
+                        if self._down:
+                            delta = audio.pcm24k_b64_to_ulaw8k_b64(delta, self._down)
+                        frame = self._media_head + delta + _MEDIA_TAIL
+                        await self.send_twilio(frame)
+                        if self.tap:
+                            self.tap.push(frame)
+                        continue
+                await self.on_upstream_event(json.loads(message))
+            except json.JSONDecodeError:
+                print("Invalid JSON from OpenAI")
+            except Exception as e:
+                print(f"Error processing OpenAI message: {e}")
+
+    async def on_upstream_event(self, response: dict):
+        kind = response["type"]
+        call_sid, agent = self.call_sid, self.agent
+        self.context.observe(response)
+
+        if kind == "response.audio.delta":
+            # before the stream started, or a delta the fast path didn't match
+            delta = response["delta"]
+            self.turns.audio(time.monotonic(), len(delta))
+            if self._down:
+                delta = audio.pcm24k_b64_to_ulaw8k_b64(delta, self._down)
+            frame = json.dumps({
+                "event": "media",
+                "streamSid": self.stream_sid,
+                "media": {"payload": delta}
+            })
+            await self.send_twilio(frame)
+            if self.tap:
+                self.tap.push(frame)
+
+        elif kind == "response.audio.done":
+            print("Audio response completed")
+
+        elif kind == "input_audio_buffer.speech_started":
+            self.turns.speech_started(time.monotonic())
+            hub.publish("barge_in", call_sid, agent)
+
+        elif kind == "input_audio_buffer.speech_stopped":
+            self.turns.speech_stopped(time.monotonic())
+
+        elif kind == "conversation.item.input_audio_transcription.completed":
+            transcript = response["transcript"]
+            print(f"User said: {transcript}")
+            hub.publish("transcript", call_sid, agent, role="user", text=transcript)
+
+        elif kind == "response.audio_transcript.done":
+            hub.publish("transcript", call_sid, agent, role="assistant",
+                        text=response.get("transcript", ""))
+
+        elif kind == "error":
+            hub.publish("error", call_sid, agent, source="upstream", detail=response.get("error"))
+
+        elif kind == "response.done":
+            print("Response completed")
+            await self.compact_context()
+
+    async def compact_context(self):
+        """Fold old turns into a summary item once over budget; runs between responses."""
+        events = self.context.compaction()
+        if not events:
+            return
+        for event in events:
+            await self.send_upstream(json.dumps(event))
+        deleted = sum(e["type"] == "conversation.item.delete" for e in events)
+        print(f"Context compacted: {deleted} items folded into a summary")
+        hub.publish("context.compacted", self.call_sid, self.agent, items=deleted,
+                    tokens=self.context.tokens)
+
+    # ── supervisor control ───────────────────────────────────────────────────
+    # Sent straight from the calling request on the same loop, so they reach
+    # the upstream ahead of the next audio frame.
+    async def inject(self, text: str, persistent: bool = False, respond: bool = False):
+        """A system message in the conversation, or (persistent) a standing instruction."""
+        if persistent:
+            self.notes.append(text)
+            await self.send_upstream(json.dumps({"type": "session.update",
+                                                 "session": {"instructions": self.instructions()}}))
+        else:
+            await self.send_upstream(json.dumps({
+                "type": "conversation.item.create",
+                "item": {"type": "message", "role": "system",
+                         "content": [{"type": "input_text", "text": text}]},
+            }))
+        if respond:
+            await self.send_upstream('{"type":"response.create"}')
+        hub.publish("control.inject", self.call_sid, self.agent, text=text, persistent=persistent)
+
+    async def cancel(self):
+        """Stop the response in progress and drop the audio Twilio has buffered."""
+        await self.send_upstream('{"type":"response.cancel"}')
+        if self.stream_sid:
+            await self.send_twilio(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+        self.turns.playout_until = 0.0      # nothing is playing any more
+        hub.publish("control.cancel", self.call_sid, self.agent)
+
+    async def handoff(self, agent: str, respond: bool = True):
+        """
+        Continue the call as another agent on the same upstream session:
+        new instructions and turn detection, conversation kept. The voice
+        stays, since Realtime won't change it once it has spoken.
+        """
+        previous, self.agent = self.agent, agent
+        self.turns = turns.meter(agent, UPSTREAM_AUDIO_FORMAT)
+        spec = conditioning(agent)
+        if spec is not conditioning(previous):          # same settings keep their AGC state
+            self._cond = audio.Conditioner(**spec) if spec is not None else None
+        await self.cancel()
+        await self.send_upstream(json.dumps({"type": "session.update", "session": {
+            "instructions": self.instructions(),
+            "turn_detection": turns.turn_detection(agent),
+        }}))
+        if respond:
+            await self.send_upstream('{"type":"response.create"}')
+        print(f"Call {self.call_sid} handed off: {previous} -> {agent}")
+        hub.publish("control.handoff", self.call_sid, agent, previous=previous)
+
+async def run_bridge(ws, agent: str, scenario: str = "outbound",
+                     connect=connect_upstream, capture=None, expect_call: str = None):
+    """Bridge an accepted Twilio socket to a Realtime session until both legs end."""
+    session = MediaSession(ws, agent, scenario, connect, capture, expect_call)
+    await session.run()
+    return session
@@ -0,0 +1,153 @@
+"""
+Batched call status and bulk call control over Twilio's REST API.
+
+Status for many calls comes from the Calls list endpoint (up to 1000 calls
+per page) rather than one fetch per call, and every request goes through
+one pooled aiohttp session. Results are merged with what this process
+knows locally (calls it placed, live bridge sessions) and yielded row by
+row so the endpoints can stream NDJSON as pages arrive.
+
+Bulk hang-up/modify still needs one update per call (Twilio has no batch
+update), so those run behind a semaphore and back off on 429s.
+"""
+import os, time, asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.base.exceptions import TwilioRestException
+
+from bridge import SESSIONS
+
+PAGE_SIZE        = 1000     # Twilio's maximum
+STATUS_WINDOW_H  = float(os.getenv("CALL_STATUS_WINDOW_H", 24))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 8))
+CALL_TABLE_SIZE  = int(os.getenv("CALL_TABLE_SIZE", 10000))
+RETRY_429        = 4
+
+def _value(v):
+    """Enum members (CallInstance.Status etc.) as their plain string."""
+    return getattr(v, "value", v)
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+# ── LOCAL STATE ──────────────────────────────────────────────────────────────
+class CallTable:
+    """Calls placed by this process, newest last, capped at CALL_TABLE_SIZE."""
+
+    def __init__(self, size: int = CALL_TABLE_SIZE):
+        self.size  = size
+        self.calls = OrderedDict()
+
+    def record(self, call_sid: str, **fields):
+        entry = self.calls.pop(call_sid, None) or {"placed_at": time.time()}
+        entry.update(fields)
+        self.calls[call_sid] = entry
+        while len(self.calls) > self.size:
+            self.calls.popitem(last=False)
+        return entry
+
+    def get(self, call_sid: str):
+        return self.calls.get(call_sid)
+
+    def earliest(self, call_sids):
+        """Earliest local placement time among call_sids, or None if any is unknown."""
+        times = [self.calls[s]["placed_at"] for s in call_sids if s in self.calls]
+        return min(times) if len(times) == len(call_sids) else None
+
+def live_sessions() -> dict:
+    return {s.call_sid: s for s in SESSIONS if s.call_sid}
+
+# ── CONTROL ──────────────────────────────────────────────────────────────────
+class CallControl:
+    def __init__(self, account_sid: str, auth_token: str, calls: CallTable = None):
+        self.account_sid = account_sid
+        self.auth_token  = auth_token
+        self.calls       = calls if calls is not None else CallTable()
+        self.http        = None
+        self.client      = None
+
+    async def open(self):
+        """Create the pooled client; its aiohttp session needs a running loop."""
+        self.http   = AsyncTwilioHttpClient()
+        self.client = Client(self.account_sid, self.auth_token, http_client=self.http)
+
+    async def close(self):
+        if self.client:
+            await self.http.close()
+            self.client = None
+
+    def merge(self, call_sid: str, remote=None, now: float = None, live: dict = None) -> dict:
+        row = {"call_sid": call_sid, "found": remote is not None}
+        if remote is not None:
+            row.update(status=_value(remote.status), direction=_value(remote.direction),
+                       to=remote.to, **{"from": remote.from_}, start_time=_iso(remote.start_time),
+                       end_time=_iso(remote.end_time), duration=remote.duration)
+        local = self.calls.get(call_sid)
+        if local:
+            row["local"] = local
+        session = (live if live is not None else live_sessions()).get(call_sid)
+        row["bridged"] = session is not None
+        if session is not None:
+            now = now or time.monotonic()
+            row.update(agent=session.agent, bridge_age_s=round(now - session.started, 1),
+                       inbound_idle_s=round(now - session.last_inbound, 1))
+        return row
+
+    async def status(self, call_sids=None, status: str = None, since: datetime = None):
+        """
+        Yield one merged row per call. With call_sids, the list is walked from
+        the earliest of them and stops once all are seen; unseen ones still get
+        a row with found=false.
+        """
+        wanted = set(call_sids or ())
+        if since is None:
+            placed = self.calls.earliest(wanted) if wanted else None
+            since = (datetime.fromtimestamp(placed - 60, timezone.utc) if placed
+                     else datetime.now(timezone.utc) - timedelta(hours=STATUS_WINDOW_H))
+        filters = {"start_time_after": since, "page_size": PAGE_SIZE}
+        if status:
+            filters["status"] = status
+
+        live = live_sessions()
+        async for call in await self.client.calls.stream_async(**filters):
+            if wanted:
+                if call.sid not in wanted:
+                    continue
+                wanted.discard(call.sid)
+            yield self.merge(call.sid, call, live=live)
+            if call_sids and not wanted:
+                return
+        for call_sid in wanted:
+            yield self.merge(call_sid, live=live)
+
+    async def select(self, status: str, since: datetime = None):
+        return [row["call_sid"] async for row in self.status(status=status, since=since)]
+
+    async def _update(self, sem: asyncio.Semaphore, call_sid: str, params: dict) -> dict:
+        async with sem:
+            for attempt in range(RETRY_429 + 1):
+                try:
+                    call = await self.client.calls(call_sid).update_async(**params)
+                    return {"call_sid": call_sid, "ok": True, "status": _value(call.status)}
+                except TwilioRestException as e:
+                    if e.status == 429 and attempt < RETRY_429:
+                        await asyncio.sleep(0.5 * 2 ** attempt)
+                        continue
+                    return {"call_sid": call_sid, "ok": False, "error": e.msg, "code": e.code}
+                except Exception as e:
+                    return {"call_sid": call_sid, "ok": False, "error": str(e)}
+
+    async def bulk_update(self, call_sids, params: dict, concurrency: int = BULK_CONCURRENCY):
+        """Apply one update to every call, yielding results as they finish."""
+        sem = asyncio.Semaphore(concurrency)
+        pending = [asyncio.ensure_future(self._update(sem, sid, params))
+                   for sid in dict.fromkeys(call_sids)]
+        try:
+            for done in asyncio.as_completed(pending):
+                yield await done
+        finally:
+            for task in pending:
+                task.cancel()
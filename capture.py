@@ -0,0 +1,80 @@
+"""
+Opt-in capture of /media-stream sessions for offline replay (see replay.py).
+The same format spools every call for post-call analytics (analytics.py);
+spooled files are deleted once analyzed.
+
+A capture file is a magic header followed by records of
+
+    channel:u8  t_ns:u64  length:u32  payload[length]
+
+where t_ns is monotonic time since the session started and payload is
+the raw WebSocket text exactly as it crossed the bridge.
+"""
+import os, time, struct
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR")            # unset = capture disabled
+CAPTURE_ALL = os.getenv("CAPTURE_ALL", "0") == "1"
+
+MAGIC  = b"TWCAP\x00\x01\x00"
+RECORD = struct.Struct("<BQI")
+
+# channels, named from the bridge's point of view
+TWILIO_IN    = 0   # Twilio -> bridge
+UPSTREAM_OUT = 1   # bridge -> Realtime
+UPSTREAM_IN  = 2   # Realtime -> bridge
+TWILIO_OUT   = 3   # bridge -> Twilio
+META         = 4   # JSON written by the bridge (agent, scenario, ...)
+
+CHANNELS = {TWILIO_IN: "twilio_in", UPSTREAM_OUT: "upstream_out",
+            UPSTREAM_IN: "upstream_in", TWILIO_OUT: "twilio_out", META: "meta"}
+
+# ── WRITER ───────────────────────────────────────────────────────────────────
+class CaptureWriter:
+    __slots__ = ("path", "spooled", "_f", "_t0", "_pack")
+
+    def __init__(self, path: str, spooled: bool = False):
+        self.path  = path
+        self.spooled = spooled
+        self._f    = open(path, "wb", buffering=1 << 16)
+        self._f.write(MAGIC)
+        self._t0   = time.monotonic_ns()
+        self._pack = RECORD.pack
+
+    def record(self, channel: int, text: str):
+        data = text.encode()
+        self._f.write(self._pack(channel, time.monotonic_ns() - self._t0, len(data)))
+        self._f.write(data)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+def capture_for(query_params, spool_dir: str = None) -> "CaptureWriter | None":
+    """
+    A writer when capture is enabled for this stream; otherwise a spooled
+    writer in spool_dir if one is given, else None.
+    """
+    if CAPTURE_DIR and (CAPTURE_ALL or query_params.get("capture") == "1"):
+        directory, spooled = CAPTURE_DIR, False
+    elif spool_dir:
+        directory, spooled = spool_dir, True
+    else:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.monotonic_ns() % 10**9}.twcap"
+    return CaptureWriter(os.path.join(directory, name), spooled)
+
+# ── READER ───────────────────────────────────────────────────────────────────
+def read_capture(path: str):
+    """List of (channel, t_ns, text) in file order."""
+    with open(path, "rb") as f:
+        buf = f.read()
+    if not buf.startswith(MAGIC):
+        raise ValueError(f"{path} is not a capture file")
+    records, pos, size = [], len(MAGIC), RECORD.size
+    while pos + size <= len(buf):
+        channel, t_ns, length = RECORD.unpack_from(buf, pos)
+        pos += size
+        records.append((channel, t_ns, buf[pos:pos + length].decode()))
+        pos += length
+    return records
@@ -37,9 +37,9 @@ interface CallStatus {
 }
 
 interface SystemStatus {
-  fastapi: 'online' | 'offline';
-  twilio: 'connected' | 'disconnected';
-  openai: 'active' | 'inactive';
+  fastapi: 'online' | 'degraded' | 'offline';
+  twilio: 'connected' | 'unreachable' | 'disconnected';
+  openai: 'active' | 'unreachable' | 'inactive';
   websocket: 'connected' | 'standby' | 'disconnected';
 }
 
@@ -1,4 +1,5 @@
-import os, json, asyncio, websockets
+import os, json, time, asyncio, websockets
+from contextlib import asynccontextmanager
 from urllib.parse import parse_qs
 
 from fastapi import FastAPI, Request, WebSocket
@@ -10,6 +11,8 @@ from twilio.twiml.voice_response import VoiceResponse, Connect
 from dotenv import load_dotenv
 
 from prompts import PROMPTS
+from recordings import RecordingPipeline
+from turn_taking import turns
 
 # ── ENV ──────────────────────────────────────────────────────────────────────
 load_dotenv()
@@ -30,8 +33,17 @@ for name, val in {
 
 twilio = Client(TWILIO_SID, TWILIO_TOKEN)
 
+# make_call records every call; finished recordings land here
+recordings = RecordingPipeline(auth=(TWILIO_SID, TWILIO_TOKEN))
+
 # ── FASTAPI ──────────────────────────────────────────────────────────────────
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    await recordings.start()
+    yield
+    await recordings.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all for now, lock down in production
@@ -95,6 +107,7 @@ async def media(ws: WebSocket):
     agent      = qs.get("agent", ["alex"])[0]
     prompt     = PROMPTS.get(agent, PROMPTS["alex"])
     stream_sid = None
+    meter      = turns.meter(agent)
 
     hdrs = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
@@ -118,12 +131,7 @@ async def media(ws: WebSocket):
                     "input_audio_transcription": {
                         "model": "whisper-1"
                     },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 200
-                    }
+                    "turn_detection": turns.turn_detection(agent)
                 }
             }
             
@@ -180,12 +188,19 @@ async def media(ws: WebSocket):
                                     # Send audio data to Twilio
                                     audio_data = msg.get("delta", "")
                                     if audio_data:
+                                        meter.audio(time.monotonic(), len(audio_data))
                                         await ws.send_json({
                                             "event": "media",
                                             "streamSid": stream_sid,
                                             "media": {"payload": audio_data}
                                         })
                                         
+                                elif msg_type == "input_audio_buffer.speech_started":
+                                    meter.speech_started(time.monotonic())
+
+                                elif msg_type == "input_audio_buffer.speech_stopped":
+                                    meter.speech_stopped(time.monotonic())
+
                                 elif msg_type == "response.audio.done":
                                     print("OpenAI audio response completed")
                                     
@@ -213,10 +228,17 @@ async def media(ws: WebSocket):
         print(f"Unexpected error in media stream: {e}")
         await ws.close()
 
-# ── RECORDING CALLBACK (STUB) ────────────────────────────────────────────────
+# ── RECORDINGS ───────────────────────────────────────────────────────────────
 @app.post("/recording-status-callback")
-async def rec_cb():
-    return {"ok": True}
+async def rec_cb(request: Request):
+    form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+    # make_call registered this callback under request.base_url, which is what Twilio signs
+    status, body = recordings.callback(str(request.url), form, request.headers.get("x-twilio-signature"))
+    return JSONResponse(body, status_code=status)
+
+@app.get("/recordings")
+async def recording_jobs(state: str = None, limit: int = 100):
+    return {"counts": recordings.counts(), "jobs": recordings.status(state, limit)}
 
 # ── ENTRYPOINT ───────────────────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+"""
+Conversation-size bookkeeping for a Realtime session.
+
+The bridge feeds every non-audio upstream event to `observe()`, which
+tracks conversation items in order with an estimated token cost: text at
+~4 characters per token, audio at ~10 tokens per second (user audio timed
+from the VAD events, assistant audio estimated from its transcript). When
+the estimate passes CONTEXT_BUDGET_TOKENS, `compaction()` returns the
+events that fold everything but the last CONTEXT_KEEP_ITEMS items into one
+system message at the root of the conversation and delete the originals.
+
+The summary is extractive (clipped transcripts, newest kept when it runs
+long), so compaction costs no extra model call. The bridge only compacts
+after response.done, so a response is never cut off.
+"""
+import os
+from collections import OrderedDict
+
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", 8000))   # 0 disables
+CONTEXT_KEEP_ITEMS    = int(os.getenv("CONTEXT_KEEP_ITEMS", 8))
+SUMMARY_CHARS         = int(os.getenv("CONTEXT_SUMMARY_CHARS", 1200))
+TURN_CHARS            = 200
+
+CHARS_PER_TOKEN   = 4
+AUDIO_TOKENS_PER_S = 10
+SPOKEN_CHARS_PER_S = 15
+SUMMARY_PREFIX    = "ctxsum_"
+
+class _Item:
+    __slots__ = ("role", "text", "audio_ms")
+
+    def __init__(self, role: str):
+        self.role, self.text, self.audio_ms = role, "", 0
+
+    @property
+    def tokens(self) -> int:
+        audio_ms = self.audio_ms
+        if not audio_ms and self.role == "assistant":
+            audio_ms = len(self.text) * 1000 // SPOKEN_CHARS_PER_S
+        return len(self.text) // CHARS_PER_TOKEN + audio_ms * AUDIO_TOKENS_PER_S // 1000
+
+def _content_text(item: dict) -> str:
+    parts = []
+    for c in item.get("content") or ():
+        parts.append(c.get("text") or c.get("transcript") or "")
+    if item.get("type") == "function_call":
+        parts.append(item.get("arguments") or "")
+    elif item.get("type") == "function_call_output":
+        parts.append(item.get("output") or "")
+    return " ".join(p for p in parts if p)
+
+class ConversationContext:
+    __slots__ = ("budget", "keep", "items", "compactions", "_speech_start", "_speech")
+
+    def __init__(self, budget: int = CONTEXT_BUDGET_TOKENS, keep: int = CONTEXT_KEEP_ITEMS):
+        self.budget       = budget
+        self.keep         = keep
+        self.items        = OrderedDict()    # item_id -> _Item, conversation order
+        self.compactions  = 0
+        self._speech_start = 0
+        self._speech       = (None, 0)       # (item_id, ms) seen before its item
+
+    @property
+    def tokens(self) -> int:
+        return sum(i.tokens for i in self.items.values())
+
+    def observe(self, event: dict):
+        kind = event["type"]
+        if kind == "conversation.item.created":
+            item = event["item"]
+            entry = _Item(item.get("role") or item.get("type", ""))
+            entry.text = _content_text(item)
+            prev = event.get("previous_item_id")
+            if self._speech[0] == item["id"]:
+                entry.audio_ms = self._speech[1]
+            self.items[item["id"]] = entry
+            if prev is None and len(self.items) > 1:
+                self.items.move_to_end(item["id"], last=False)   # inserted at root
+        elif kind == "conversation.item.deleted":
+            self.items.pop(event["item_id"], None)
+        elif kind == "input_audio_buffer.speech_started":
+            self._speech_start = event.get("audio_start_ms", 0)
+        elif kind == "input_audio_buffer.speech_stopped":
+            ms = max(0, event.get("audio_end_ms", 0) - self._speech_start)
+            entry = self.items.get(event.get("item_id"))
+            if entry is not None:
+                entry.audio_ms = ms
+            else:                       # the item is created on commit, just after
+                self._speech = (event.get("item_id"), ms)
+        elif kind in ("conversation.item.input_audio_transcription.completed",
+                      "response.audio_transcript.done"):
+            entry = self.items.get(event.get("item_id"))
+            if entry is not None:
+                entry.text = event.get("transcript") or ""
+
+    def compaction(self) -> list:
+        """Events to send now (between responses), or [] if under budget."""
+        if not self.budget or len(self.items) <= self.keep:
+            return []
+        if self.tokens <= self.budget:
+            return []
+        old = list(self.items.items())[:-self.keep] if self.keep else list(self.items.items())
+        self.compactions += 1
+
+        lines = []
+        for item_id, entry in old:
+            if not entry.text:
+                continue
+            if item_id.startswith(SUMMARY_PREFIX):
+                lines.append(entry.text.split("\n", 1)[-1])   # previous summary body
+            else:
+                who = {"user": "Caller", "assistant": "You"}.get(entry.role, entry.role)
+                lines.append(f"{who}: {entry.text[:TURN_CHARS]}")
+        body = "\n".join(lines)[-SUMMARY_CHARS:]
+
+        events = []
+        if body:
+            events.append({
+                "type": "conversation.item.create",
+                "previous_item_id": "root",
+                "item": {
+                    "id": f"{SUMMARY_PREFIX}{self.compactions}",
+                    "type": "message",
+                    "role": "system",
+                    "content": [{"type": "input_text",
+                                 "text": "Summary of the earlier part of this call:\n" + body}],
+                },
+            })
+        for item_id, _ in old:
+            # dropped now rather than on conversation.item.deleted, so a delete
+            # that fails upstream can't wedge later compactions
+            del self.items[item_id]
+            events.append({"type": "conversation.item.delete", "item_id": item_id})
+        return events
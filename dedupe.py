@@ -0,0 +1,111 @@
+"""
+Idempotent dialing for /make-call.
+
+A resent request (dashboard timeout, retry script) must not ring the same
+homeowner twice. Each dial is registered before it starts under its
+Idempotency-Key, if the client sent one, and under its destination: the
+(number, agent, tenant) tuple the caller passes, so tenants never share an
+entry. A later request matching either gets the first dial's
+call_sid; one arriving while that dial is still in flight awaits the same
+future, so concurrent duplicates coalesce onto a single Twilio request.
+
+Entries live in one TTL cache bounded at DIAL_DEDUPE_SIZE with LRU
+eviction: destinations for DIAL_DEDUPE_WINDOW_S (0 disables that check),
+keys for DIAL_IDEMPOTENCY_TTL_S. A dial that fails or is refused is
+forgotten at once so it can be retried. Reusing a key for a different
+destination is an error rather than a silent replay.
+"""
+import os, time, asyncio
+from collections import OrderedDict
+
+from metrics import Counter
+
+DIAL_DEDUPE_WINDOW_S   = float(os.getenv("DIAL_DEDUPE_WINDOW_S", 120))
+DIAL_IDEMPOTENCY_TTL_S = float(os.getenv("DIAL_IDEMPOTENCY_TTL_S", 86400))
+DIAL_DEDUPE_SIZE       = int(os.getenv("DIAL_DEDUPE_SIZE", 10000))
+
+DEDUPED = Counter("dial_deduplicated_total", "Dial requests answered by an earlier dial",
+                  ("match", "state"))
+
+class IdempotencyConflict(Exception):
+    pass
+
+class TTLCache:
+    """LRU-bounded mapping whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.data    = OrderedDict()      # key -> (expires, value), least recently used first
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, now: float = None):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= (now or time.monotonic()):
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, now: float = None, ttl: float = None):
+        now = now or time.monotonic()
+        self.data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self.data.move_to_end(key)
+        while self.data:                  # expired or over size, from the cold end
+            k, (expires, _) = next(iter(self.data.items()))
+            if expires > now and len(self.data) <= self.maxsize:
+                break
+            del self.data[k]
+
+    def pop(self, key, value=None):
+        """Remove key, only if it still maps to value when one is given."""
+        entry = self.data.get(key)
+        if entry is not None and (value is None or entry[1] is value):
+            del self.data[key]
+
+class DialDeduper:
+    def __init__(self, window: float = DIAL_DEDUPE_WINDOW_S, key_ttl: float = DIAL_IDEMPOTENCY_TTL_S,
+                 maxsize: int = DIAL_DEDUPE_SIZE):
+        self.window  = window
+        self.key_ttl = key_ttl
+        self.cache   = TTLCache(maxsize, window)
+
+    async def dial(self, key, destination: tuple, start):
+        """
+        (call_sid, duplicate): the result of `start()` for a new dial, or of the
+        earlier dial this request repeats. Raises IdempotencyConflict when key
+        was used for another destination; exceptions from start() propagate.
+        """
+        entry = self.cache.get(("key", key)) if key else None
+        match = "idempotency_key"
+        if entry is not None and entry[0] != destination:
+            raise IdempotencyConflict(f"Idempotency-Key already used for {entry[0][0]}")
+        if entry is None and self.window:
+            entry, match = self.cache.get(("dest", destination)), "destination"
+        if entry is not None:
+            future = entry[1]
+            DEDUPED.inc(match=match, state="done" if future.done() else "in_flight")
+            return await asyncio.shield(future), True
+
+        entry = (destination, asyncio.get_running_loop().create_future())
+        if key:
+            self.cache.set(("key", key), entry, ttl=self.key_ttl)
+        if self.window:
+            self.cache.set(("dest", destination), entry)
+        try:
+            call_sid = await start()
+        except BaseException as e:
+            self.cache.pop(("key", key), entry)
+            self.cache.pop(("dest", destination), entry)
+            if isinstance(e, Exception):
+                entry[1].set_exception(e)
+                entry[1].exception()      # waiters re-raise it; don't warn if there are none
+            else:
+                entry[1].cancel()
+            raise
+        entry[1].set_result(call_sid)
+        return call_sid, False
@@ -0,0 +1,67 @@
+"""
+Fan-out hub for live call events (stream start, transcripts, barge-ins,
+errors). Each event is serialized once and handed to every matching
+subscriber's bounded queue, so a slow dashboard never blocks the bridge.
+"""
+import os, json, time, asyncio
+from collections import deque
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 256))
+
+# ── SUBSCRIBER ───────────────────────────────────────────────────────────────
+class Subscriber:
+    __slots__ = ("queue", "call_sid", "agent", "allow", "dropped", "_wake")
+
+    def __init__(self, maxlen: int, call_sid: str = None, agent: str = None, allow=None):
+        self.queue    = deque(maxlen=maxlen)
+        self.call_sid = call_sid
+        self.agent    = agent
+        self.allow    = allow       # allow(call_sid) -> bool, for callers scoped to some calls
+        self.dropped  = 0
+        self._wake    = asyncio.Event()
+
+    def matches(self, call_sid, agent):
+        if self.call_sid and self.call_sid != call_sid:
+            return False
+        if self.agent and self.agent != agent:
+            return False
+        return self.allow is None or self.allow(call_sid)
+
+    def offer(self, payload: str):
+        # deque(maxlen) drops the oldest entry for us; just keep count
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(payload)
+        self._wake.set()
+
+    async def get(self) -> str:
+        while not self.queue:
+            self._wake.clear()
+            await self._wake.wait()
+        return self.queue.popleft()
+
+# ── HUB ──────────────────────────────────────────────────────────────────────
+class EventHub:
+    def __init__(self, maxlen: int = EVENTS_QUEUE_SIZE):
+        self.maxlen      = maxlen
+        self.subscribers = set()
+
+    def subscribe(self, call_sid: str = None, agent: str = None, allow=None) -> Subscriber:
+        sub = Subscriber(self.maxlen, call_sid, agent, allow)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def publish(self, type: str, call_sid: str = None, agent: str = None, **data):
+        """Called from the event loop; never awaits."""
+        if not self.subscribers:
+            return
+        payload = json.dumps({"type": type, "ts": time.time(),
+                              "call_sid": call_sid, "agent": agent, **data})
+        for sub in self.subscribers:
+            if sub.matches(call_sid, agent):
+                sub.offer(payload)
+
+hub = EventHub()
@@ -1,15 +1,39 @@
-import os, json, asyncio, websockets
-from urllib.parse import parse_qs
+import os, hmac, json, asyncio
+from datetime import datetime
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs, urlencode, urlsplit
 
 from fastapi import FastAPI, Request, WebSocket
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.websockets import WebSocketDisconnect
+import httpx
 from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse, Connect
+from twilio.request_validator import RequestValidator
 from dotenv import load_dotenv
 
 from prompts import PROMPTS
+from event_hub import hub
+from twiml import TwimlEngine, ws_base
+from routing import Router
+from suppression import Suppression, normalize_e164, e164_int
+from capture import capture_for
+from bridge import run_bridge, connect_upstream, OPENAI_WS, CALLS
+from listen import listen
+from tenants import Tenants
+from dedupe import DialDeduper, IdempotencyConflict
+from loop_watchdog import watchdog, TaskNames, WATCHDOG
+from profiling import profiler
+from reaper import Reaper, HANGUP_TWIML
+from call_control import CallControl
+from retries import RetryScheduler, RetryLater
+from recordings import RecordingPipeline
+from analytics import Analytics
+from turn_taking import turns
+from health import HealthMonitor, Tunnel, LoopLag, http_probe, \
+    HEALTH_UPSTREAM_S, HEALTH_TWILIO_S, HEALTH_TUNNEL_S, HEALTH_LOOP_S, HEALTH_TIMEOUT_S
+import simulator
+import metrics
 
 # ── ENV ──────────────────────────────────────────────────────────────────────
 load_dotenv()
@@ -18,8 +42,22 @@ TWILIO_SID     = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_TOKEN   = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_NUMBER  = os.getenv("TWILIO_PHONE_NUMBER")
 PORT           = int(os.getenv("PORT", 8000))
+ADMIN_TOKEN    = os.getenv("ADMIN_TOKEN")
+SUPPRESS_CONTACTED = os.getenv("SUPPRESS_CONTACTED", "1") == "1"
+# a tenant's retry that finds it over quota or rate-limited waits this long (at least)
+TENANT_RETRY_DEFER_S = float(os.getenv("TENANT_RETRY_DEFER_S", 60))
+# comma-separated dashboard origins; "*" keeps the old allow-all behaviour
+CORS_ORIGINS   = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
+# DRY_RUN=1: no Twilio or OpenAI; calls are simulated against this process
+DRY_RUN        = simulator.DRY_RUN
+DRY_RUN_BASE   = os.getenv("DRY_RUN_BASE", f"http://127.0.0.1:{PORT}")
 
-for name, val in {
+if DRY_RUN:
+    TWILIO_SID, TWILIO_TOKEN = TWILIO_SID or "ACdryrun", TWILIO_TOKEN or "dryrun"
+    TWILIO_NUMBER = TWILIO_NUMBER or "+15005550006"
+    print(f"DRY RUN: calls are simulated against {DRY_RUN_BASE}")
+
+for name, val in {} if DRY_RUN else {
     "OPENAI_API_KEY": OPENAI_API_KEY,
     "TWILIO_ACCOUNT_SID": TWILIO_SID,
     "TWILIO_AUTH_TOKEN": TWILIO_TOKEN,
@@ -30,333 +68,636 @@ for name, val in {
 
 twilio = Client(TWILIO_SID, TWILIO_TOKEN)
 
+# Twilio signs every webhook with the auth token (X-Twilio-Signature)
+twilio_validator = RequestValidator(TWILIO_TOKEN)
+
+# TwiML documents are compiled once here and again only if the base URL moves
+twiml_engine = TwimlEngine(os.getenv("FASTAPI_URL", "https://cmac.ngrok.app"), PROMPTS)
+
+# Inbound routing rules (ROUTING_TABLE, default routing.json); reloaded on change
+router = Router(agents=PROMPTS)
+
+# Do-not-call / already-contacted lists, memory-mapped from SUPPRESSION_DIR
+suppression = Suppression()
+
+# Closes bridged calls that went idle or ran past the duration cap
+reaper = Reaper(hangup=simulator.hangup if DRY_RUN else
+                lambda sid: twilio.calls(sid).update(twiml=HANGUP_TWIML))
+
+# Batched status / bulk control over a pooled async Twilio client
+call_control = CallControl(TWILIO_SID, TWILIO_TOKEN)
+
+# Busy / no-answer / failed dials come back here for another attempt (RETRY_DB)
+retries = RetryScheduler()
+
+# Completed recordings are downloaded and trimmed/transcoded in the background
+recordings = RecordingPipeline(auth=(TWILIO_SID, TWILIO_TOKEN))
+
+# API keys with per-tenant call quotas and dial-rate buckets (TENANTS); off without the file
+tenants = Tenants(secret=TWILIO_TOKEN)
+
+# Resent /make-call requests get the first dial's call_sid instead of a second call
+dials = DialDeduper()
+
+# Post-call talk/latency statistics, computed off-loop from spooled sessions
+analytics = Analytics()
+
+# Dependency probes run in the background; /health serves the cached result
+probe_client = httpx.AsyncClient(timeout=HEALTH_TIMEOUT_S)
+health = HealthMonitor(agents=list(PROMPTS), dry_run=DRY_RUN)
+tunnel = Tunnel(probe_client, os.getenv("FASTAPI_URL", "https://cmac.ngrok.app"))
+health.add("event_loop", LoopLag().probe, HEALTH_LOOP_S)
+if not DRY_RUN:
+    model = parse_qs(urlsplit(OPENAI_WS).query)["model"][0]
+    health.add("upstream", http_probe(probe_client, f"https://api.openai.com/v1/models/{model}",
+                                      headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}),
+               HEALTH_UPSTREAM_S)
+    health.add("twilio", http_probe(probe_client,
+                                    f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_SID}.json",
+                                    auth=(TWILIO_SID, TWILIO_TOKEN)),
+               HEALTH_TWILIO_S)
+    health.add("tunnel", tunnel.probe, HEALTH_TUNNEL_S)
+
 # ── FASTAPI ──────────────────────────────────────────────────────────────────
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    if WATCHDOG:
+        watchdog.start()
+    await call_control.open()
+    await recordings.start()
+    analytics.start()
+    if "tunnel" in health.probes:
+        await health.check(health.probes["tunnel"])     # dial with the live URL from the start
+    health.start()
+    reaper_task = asyncio.create_task(reaper.run())
+    # retries skip the "contacted" list (they are meant to re-dial) but not do-not-call
+    retry_task = asyncio.create_task(retries.run(
+        redial, blocked=lambda number: e164_int(number) in suppression.lists["dnc"]))
+    yield
+    retry_task.cancel()
+    reaper_task.cancel()
+    await recordings.stop()
+    analytics.stop()
+    health.stop()
+    await probe_client.aclose()
+    await call_control.close()
+    watchdog.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all for now, lock down in production
+    allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TaskNames)
 
 # ── HEALTH CHECK ────────────────────────────────────────────────────────────
 @app.get("/")
-async def health():
-    return {"status": "running", "agents": list(PROMPTS.keys())}
-
 @app.get("/health")
 async def health_check():
-    return {"status": "online", "agents": list(PROMPTS.keys())}
+    """Last result of each background probe; never makes a request itself."""
+    return Response(health.body(), media_type="application/json")
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # ── DIAL ENDPOINT ───────────────────────────────────────────────────────────
 @app.get("/make-call/{number}")
-async def make_call(number: str, request: Request, agent: str = "alex"):
+async def make_call(number: str, request: Request, agent: str = "alex", capture: bool = False):
+    tenant, denied = tenant_for(request)
+    if denied:
+        return denied
     if agent not in PROMPTS:
         return JSONResponse({"error": f"unknown agent {agent}"}, status_code=400)
+    try:
+        number = normalize_e164(number)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def dial():
+        # screened inside the deduped dial: a resend must not be refused because the
+        # first request already put the number on the contacted list or spent a token
+        blocked = suppression.check(number)
+        if blocked:
+            raise DialRefused(403, f"{number} is on the {blocked} list")
+        if tenant and (refused := tenants.admit_dial(tenant, agent)):
+            raise DialRefused(*refused)
+        return await place_call(number, agent, capture=capture, tenant=tenant)
+
+    # one tenant's dial must never answer another's (or the admin's), by key or by destination
+    scope = tenant.name if tenant else None
+    key = request.headers.get("idempotency-key")
+    try:
+        call_sid, duplicate = await dials.dial((scope, key) if key else None,
+                                               (number, agent, scope), dial)
+    except IdempotencyConflict as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except DialRefused as e:
+        headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after else None
+        return JSONResponse({"error": e.error}, status_code=e.status, headers=headers)
+    return {"call_sid": call_sid, "agent": agent, "deduplicated": duplicate}
+
+class DialRefused(Exception):
+    def __init__(self, status: int, error: str, retry_after: float = None):
+        super().__init__(error)
+        self.status, self.error, self.retry_after = status, error, retry_after
+
+def tenant_for(request: Request):
+    """(tenant, None) for a valid API key; (None, None) when tenancy is off or for
+    the admin token; (None, 401 response) otherwise."""
+    if not tenants.enabled:
+        return None, None
+    tenant = tenants.authenticate(request.headers)
+    if tenant:
+        return tenant, None
+    if ADMIN_TOKEN and request.headers.get("x-admin-token") == ADMIN_TOKEN:
+        return None, None
+    return None, JSONResponse({"error": "valid X-API-Key required"}, status_code=401)
+
+def caller_scope(request: Request):
+    """
+    (tenant, None) for a tenant API key, which sees only that tenant's calls;
+    (None, None) for the admin token, or for anyone while neither tenancy nor
+    ADMIN_TOKEN is configured; (None, 401/403 response) otherwise.
+    """
+    if tenants.enabled:
+        return tenant_for(request)
+    return None, admin_denied(request)
+
+def owns(tenant, call_sid: str) -> bool:
+    """The admin scope (tenant None) sees every call, a tenant only those it placed."""
+    return tenant is None or (call_control.calls.get(call_sid) or {}).get("tenant") == tenant.name
+
+async def redial(number: str, agent: str, retry_id: int, tenant_name: str = None) -> str:
+    """Retry scheduler's dialer: a tenant's retry goes through its admission again."""
+    tenant = tenants.get(tenant_name) if tenant_name and tenants.enabled else None
+    if tenant_name and tenants.enabled and tenant is None:
+        raise DialRefused(403, f"tenant {tenant_name} no longer exists")
+    if tenant and (refused := tenants.admit_dial(tenant, agent)):
+        status, error, retry_after = refused
+        if status == 429:
+            raise RetryLater(retry_after or TENANT_RETRY_DEFER_S, error)
+        raise DialRefused(*refused)
+    return await place_call(number, agent, retry_id=retry_id, tenant=tenant)
+
+async def place_call(number: str, agent: str, capture: bool = False, retry_id: int = None,
+                     tenant=None) -> str:
+    """
+    Dial an already normalized and screened number; returns the call SID.
+    A tenant must have been admitted; its reserved slot is given back if the dial fails.
+    """
+    try:
+        call_sid = await _dial(number, agent, capture, retry_id, tenant)
+    except BaseException:
+        if tenant:
+            tenants.release(tenant)
+        raise
+    if tenant:
+        tenants.dialed(tenant, call_sid)
+    if SUPPRESS_CONTACTED:
+        suppression.add("contacted", [number])
+    return call_sid
+
+async def _dial(number: str, agent: str, capture: bool, retry_id: int, tenant) -> str:
+    # tunnel.url is kept current by the health probe, so dialing never waits on ngrok
+    base = DRY_RUN_BASE if DRY_RUN else tunnel.url
+    twiml_engine.ensure_base(base)
+    print(f"🔥 USING OPENAI REALTIME API: {twiml_engine.stream_url(agent, 'outbound')}")
+
+    # Precompiled TwiML that connects to our WebSocket for OpenAI Realtime API
+    stream_params = {"capture": "1"} if capture else {}
+    stream_params.update(tenants.stream_params(tenant))
+    twiml = twiml_engine.render(agent, "outbound", stream_params or None).decode()
+    # final status comes back to /call-status-callback for the retry scheduler, which
+    # looks the call up in call_control.calls rather than trusting the request
+    status_callback = f"{base.rstrip('/')}/call-status-callback"
+    if DRY_RUN:
+        call_sid = simulator.dial(number, twiml, status_callback, auth_token=TWILIO_TOKEN)
+    else:
+        call = await asyncio.to_thread(twilio.calls.create, to=number, from_=TWILIO_NUMBER,
+                                       twiml=twiml, status_callback=status_callback)
+        call_sid = call.sid
+    call_control.calls.record(call_sid, to=number, agent=agent, retry=retry_id,
+                              tenant=tenant.name if tenant else None)
+    return call_sid
+
+# ── TWILIO WEBHOOKS ──────────────────────────────────────────────────────────
+def public_url(request: Request) -> str:
+    """The URL Twilio posted to (and signed), not the one uvicorn sees behind the tunnel."""
+    base = DRY_RUN_BASE if DRY_RUN else tunnel.url
+    return base.rstrip("/") + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+
+def twilio_signed(request: Request, form: dict) -> bool:
+    url, signature = public_url(request), request.headers.get("x-twilio-signature", "")
+    # one HMAC for the usual case; validate() also tries the URL with and without its port
+    return (hmac.compare_digest(twilio_validator.compute_signature(url, form), signature)
+            or twilio_validator.validate(url, form, signature))
+
+async def twilio_form(request: Request) -> dict:
+    return {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+
+# ── CALL OUTCOMES / RETRIES ─────────────────────────────────────────────────
+@app.post("/call-status-callback")
+async def call_status_callback(request: Request):
+    form = await twilio_form(request)
+    if not twilio_signed(request, form):
+        return JSONResponse({"error": "invalid X-Twilio-Signature"}, status_code=403)
+    call_sid, status = form.get("CallSid"), form.get("CallStatus", "")
+    if not call_sid:
+        return JSONResponse({"error": "CallSid required"}, status_code=400)
+    # what to redial (and whose quota it counts against) comes from our own record
+    # of the dial, never from the request; a SID we didn't place is not ours to act on
+    placed = call_control.calls.get(call_sid)
+    if placed is None:
+        return Response(status_code=204)
+    number, agent, retry, tenant = placed["to"], placed["agent"], placed["retry"], placed["tenant"]
+    call_control.calls.record(call_sid, status=status)
+    tenants.finished(call_sid)
+    state = retries.outcome(call_sid, number, agent, status, retry, tenant)
+    print(f"Call {call_sid} to {number} ended {status}" + (f", retry {state}" if state else ""))
+    return Response(status_code=204)
+
+@app.get("/retries")
+async def retry_stats(request: Request):
+    if (denied := admin_denied(request)):
+        return denied
+    return retries.stats()
+
+@app.delete("/retries/{number}")
+async def retry_cancel(number: str, request: Request):
+    """With a tenant API key, only that tenant's retries of the number are dropped."""
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    try:
+        number = normalize_e164(number)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"number": number, "canceled": retries.cancel(number, tenant.name if tenant else None)}
+
+# ── CALL STATUS / BULK CONTROL ───────────────────────────────────────────────
+def ndjson(rows, keep=None):
+    async def body():
+        async for row in rows:
+            if keep is None or keep(row):
+                yield json.dumps(row) + "\n"
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def parse_since(body: dict):
+    return datetime.fromisoformat(body["since"]) if body.get("since") else None
+
+@app.post("/calls/status")
+async def calls_status(request: Request):
+    """
+    Body: {"call_sids": [...]} and/or {"status": "in-progress", "since": ISO-8601}.
+    With a tenant API key instead of the admin token, only that tenant's calls are listed.
+    """
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    body = await request.json()
+    try:
+        since = parse_since(body)
+    except ValueError:
+        return JSONResponse({"error": "since must be ISO-8601"}, status_code=400)
+    call_sids = body.get("call_sids")
+    if tenant and call_sids:
+        call_sids = [sid for sid in call_sids if owns(tenant, sid)]
+        if not call_sids:
+            return Response(b"", media_type="application/x-ndjson")
+    return ndjson(call_control.status(call_sids, body.get("status"), since),
+                  keep=(lambda row: owns(tenant, row["call_sid"])) if tenant else None)
 
-    # Use OpenAI Realtime API with Media Streams - PROPER IMPLEMENTATION
-    # Force use a working ngrok URL - will be dynamically detected
-    import requests
-    import time
-    
-    # Try to get live ngrok URL
-    ngrok_url = None
-    for _ in range(3):
+@app.post("/calls/bulk")
+async def calls_bulk(request: Request):
+    """
+    Body: {"call_sids": [...]} or {"status": ..., "since": ...} to select, plus
+    "action": "hangup" (default) | "modify" with "twiml" or "url" [+ "method"].
+    With a tenant API key instead of the admin token, only that tenant's calls are touched.
+    """
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    body = await request.json()
+    action = body.get("action", "hangup")
+    if action == "hangup":
+        params = {"status": "completed"}
+    elif action == "modify" and (body.get("twiml") or body.get("url")):
+        params = {k: body[k] for k in ("twiml", "url", "method") if body.get(k)}
+    else:
+        return JSONResponse({"error": "action must be hangup, or modify with twiml or url"},
+                            status_code=400)
+    call_sids = body.get("call_sids")
+    if not call_sids:
+        if not body.get("status"):
+            return JSONResponse({"error": "call_sids or status required"}, status_code=400)
         try:
-            tunnels = requests.get("http://localhost:4040/api/tunnels", timeout=2).json()
-            if tunnels.get("tunnels") and len(tunnels["tunnels"]) > 0:
-                ngrok_url = tunnels["tunnels"][0]["public_url"]
-                break
-        except:
-            time.sleep(1)
-    
-    # Fallback to environment or default
-    if not ngrok_url:
-        ngrok_url = os.getenv("FASTAPI_URL", "https://cmac.ngrok.app")
-    
-    ws_url = ngrok_url.replace("https://", "wss://").replace("http://", "ws://")
-    
-    print(f"🔥 USING OPENAI REALTIME API: {ws_url}/media-stream?agent={agent}")
-    
-    # Create TwiML that connects to our WebSocket for OpenAI Realtime API
-    twiml = VoiceResponse()
-    connect = twiml.connect()
-    stream = connect.stream(url=f"{ws_url}/media-stream?agent={agent}")
-    
-    call = twilio.calls.create(
-        to=number,
-        from_=TWILIO_NUMBER,
-        twiml=str(twiml)
-    )
-    
-    return {"call_sid": call.sid, "agent": agent}
+            call_sids = await call_control.select(body["status"], parse_since(body))
+        except ValueError:
+            return JSONResponse({"error": "since must be ISO-8601"}, status_code=400)
+    if tenant:
+        call_sids = [sid for sid in call_sids if owns(tenant, sid)]
+    return ndjson(call_control.bulk_update(call_sids, params))
+
+@app.get("/tenants")
+async def tenant_usage(request: Request):
+    if (denied := admin_denied(request)):
+        return denied
+    return {"enabled": tenants.enabled, "tenants": tenants.usage()}
+
+# ── SUPPRESSION LISTS ────────────────────────────────────────────────────────
+@app.post("/suppression/{list_name}")
+async def suppression_add(list_name: str, request: Request):
+    """Body: {"numbers": ["+14055550100", ...]}"""
+    if (denied := admin_denied(request)):
+        return denied
+    if list_name not in suppression.lists:
+        return JSONResponse({"error": f"unknown list {list_name}"}, status_code=404)
+    body = await request.json()
+    try:
+        added = suppression.add(list_name, body.get("numbers", []))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"list": list_name, "added": added, "size": len(suppression.lists[list_name])}
+
+@app.get("/suppression/check/{number}")
+async def suppression_check(number: str, request: Request):
+    if (denied := caller_scope(request)[1]):
+        return denied
+    try:
+        number = normalize_e164(number)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"number": number, "suppressed": suppression.check(number)}
 
 # ── HELPER: BUILD WS URL FOR TWIML ───────────────────────────────────────────
 def ws_url(req: Request, path: str, params: dict):
-    # Use ngrok URL for WebSocket connections
-    base = os.getenv("FASTAPI_URL", "https://cmac.ngrok.app")
-    proto = "wss" if base.startswith("https") else "ws"
-    host = base.replace("https://", "").replace("http://", "")
-    qs = "&".join(f"{k}={v}" for k, v in params.items())
-    return f"{proto}://{host}{path}?{qs}"
+    # Same ngrok/FASTAPI_URL base the TwiML templates were compiled against
+    return f"{ws_base(twiml_engine.base_url)}{path}?{urlencode(params)}"
+
+# ── ADMIN ────────────────────────────────────────────────────────────────────
+def is_admin(token: str) -> bool:
+    """The admin token matches; with no ADMIN_TOKEN, admin is open unless tenancy is on."""
+    return token == ADMIN_TOKEN if ADMIN_TOKEN else not tenants.enabled
+
+def admin_denied(request: Request):
+    """403 response unless the caller is admin (X-Admin-Token)"""
+    if is_admin(request.headers.get("x-admin-token")):
+        return None
+    return JSONResponse({"error": "admin token required"}, status_code=403)
+
+def is_supervisor(token: str) -> bool:
+    """Listening to or steering a live call needs ADMIN_TOKEN set and sent; never open."""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or "", ADMIN_TOKEN)
+
+@app.post("/admin/profile")
+async def profile_arm(request: Request):
+    """Body: {"call_sid": ...} | {"agent": ...} | {"next_calls": N}; optional "seconds" limit"""
+    if (denied := admin_denied(request)):
+        return denied
+    body = await request.json()
+    if body.get("agent") and body["agent"] not in PROMPTS:
+        return JSONResponse({"error": f"unknown agent {body['agent']}"}, status_code=400)
+    profiler.arm(body.get("call_sid"), body.get("agent"), int(body.get("next_calls", 0)),
+                 body.get("seconds"))
+    return profiler.status()
+
+@app.get("/admin/profile")
+async def profile_status(request: Request):
+    if (denied := admin_denied(request)):
+        return denied
+    return profiler.status()
+
+@app.delete("/admin/profile")
+async def profile_disarm(request: Request):
+    if (denied := admin_denied(request)):
+        return denied
+    profiler.disarm()
+    return profiler.status()
+
+@app.get("/admin/stalls")
+async def loop_stalls(request: Request, limit: int = 20):
+    """Recent event-loop stalls, newest first, with the blocked stack and task."""
+    if (denied := admin_denied(request)):
+        return denied
+    return watchdog.report(limit)
+
+# ── LIVE EVENTS ──────────────────────────────────────────────────────────────
+def events_for(tenant, call_sid: str = None, agent: str = None):
+    """Hub subscription for a caller; a tenant gets only events of calls it placed."""
+    return hub.subscribe(call_sid, agent, None if tenant is None else lambda sid: owns(tenant, sid))
+
+@app.websocket("/events")
+async def events_ws(ws: WebSocket):
+    """Push bridge events to a dashboard; filter with ?call_sid= or ?agent="""
+    tenant, denied = caller_scope(ws)
+    if denied:
+        await ws.close(code=1008, reason="admin token or API key required")
+        return
+    await ws.accept()
+    sub = events_for(tenant, ws.query_params.get("call_sid"), ws.query_params.get("agent"))
+    try:
+        while True:
+            await ws.send_text(await sub.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        hub.unsubscribe(sub)
+
+@app.get("/events")
+async def events_sse(request: Request, call_sid: str = None, agent: str = None):
+    """Same feed as the /events WebSocket, as Server-Sent Events"""
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    sub = events_for(tenant, call_sid, agent)
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(sub.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 # ── OPENAI REALTIME API WEBSOCKET HANDLER ──────────────────────────────────
 @app.websocket("/media-stream")
 async def media(ws: WebSocket):
     """Handle Twilio Media Stream with OpenAI Realtime API"""
+    params = ws.query_params
+    # with tenancy on every stream needs a fresh signed token; a tenant's count
+    # against its concurrency, unscoped ones against TENANT_UNSCOPED_STREAMS
+    tenant, refused = tenants.admit_stream(params)
+    if refused:
+        await ws.close(code=refused[0], reason=refused[1])
+        return
     await ws.accept()
-    
-    agent = ws.query_params.get("agent", "alex")
-    prompt = PROMPTS.get(agent, PROMPTS["alex"])
-    
-    print(f"Media stream connected for agent: {agent}")
-    
-    # OpenAI Realtime API WebSocket
-    import asyncio
-    import websockets
-    import json
-    import base64
-    
-    openai_ws = None
-    stream_sid = None
-    call_sid = None
-    
+    capture = capture_for(params, analytics.spool_dir)
     try:
-        # Connect to OpenAI Realtime API
-        openai_ws = await websockets.connect(
-            "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01",
-            extra_headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "OpenAI-Beta": "realtime=v1"
-            }
-        )
-        
-        print("Connected to OpenAI Realtime API")
-        
-        # Configure OpenAI session with agent personality
-        session_config = {
-            "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": prompt,
-                "voice": "alloy",
-                "input_audio_format": "g711_ulaw",
-                "output_audio_format": "g711_ulaw",
-                "input_audio_transcription": {
-                    "model": "whisper-1"
-                },
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 500
-                },
-                "tools": [],
-                "tool_choice": "auto",
-                "temperature": 0.8,
-                "max_response_output_tokens": 4096
-            }
-        }
-        
-        await openai_ws.send(json.dumps(session_config))
-        print("OpenAI session configured")
-        
-        # Task to handle messages from Twilio -> OpenAI
-        async def twilio_to_oai():
-            async for message in ws.iter_text():
-                try:
-                    data = json.loads(message)
-                    
-                    if data["event"] == "start":
-                        stream_sid = data["start"]["streamSid"]
-                        call_sid = data["start"]["callSid"]
-                        print(f"Stream started - SID: {stream_sid}")
-                        
-                    elif data["event"] == "media":
-                        # Forward audio to OpenAI
-                        audio_append = {
-                            "type": "input_audio_buffer.append",
-                            "audio": data["media"]["payload"]
-                        }
-                        await openai_ws.send(json.dumps(audio_append))
-                        
-                    elif data["event"] == "stop":
-                        print("Stream stopped")
-                        break
-                        
-                except json.JSONDecodeError:
-                    print("Invalid JSON from Twilio")
-                except Exception as e:
-                    print(f"Error processing Twilio message: {e}")
-        
-        # Task to handle messages from OpenAI -> Twilio
-        async def oai_to_twilio():
-            async for message in openai_ws:
-                try:
-                    response = json.loads(message)
-                    
-                    if response["type"] == "response.audio.delta":
-                        # Send audio back to Twilio
-                        audio_delta = {
-                            "event": "media",
-                            "streamSid": stream_sid,
-                            "media": {
-                                "payload": response["delta"]
-                            }
-                        }
-                        await ws.send_text(json.dumps(audio_delta))
-                        
-                    elif response["type"] == "response.audio.done":
-                        print("Audio response completed")
-                        
-                    elif response["type"] == "conversation.item.input_audio_transcription.completed":
-                        transcript = response["transcript"]
-                        print(f"User said: {transcript}")
-                        
-                    elif response["type"] == "response.done":
-                        print("Response completed")
-                        
-                except json.JSONDecodeError:
-                    print("Invalid JSON from OpenAI")
-                except Exception as e:
-                    print(f"Error processing OpenAI message: {e}")
-        
-        # Run both tasks concurrently
-        await asyncio.gather(
-            twilio_to_oai(),
-            oai_to_twilio()
-        )
-        
-    except Exception as e:
-        print(f"Error in media stream: {e}")
+        session = await run_bridge(ws, params.get("agent", "alex"), params.get("scenario", "outbound"),
+                                   connect=simulator.connect_scripted if DRY_RUN else connect_upstream,
+                                   capture=capture, expect_call=params.get("call"))
     finally:
-        if openai_ws:
-            await openai_ws.close()
-        await ws.close()
+        tenants.close_stream(tenant)
+    tenants.finished(session.call_sid)
+    analytics.submit(capture, session.agent)
+
+@app.post("/calls/{call_sid}/control")
+async def call_control_action(call_sid: str, request: Request):
+    """
+    Steer a live bridged call. Body is one of:
+      {"action": "inject", "text": ..., "persistent": false, "respond": false}
+      {"action": "cancel"}
+      {"action": "handoff", "agent": "jessica", "respond": true}
+    """
+    if not is_supervisor(request.headers.get("x-admin-token")):
+        return JSONResponse({"error": "ADMIN_TOKEN must be configured and sent as X-Admin-Token"},
+                            status_code=403)
+    session = CALLS.get(call_sid)
+    if session is None or session.closing:
+        return JSONResponse({"error": "no live call with that SID"}, status_code=404)
+    body = await request.json()
+    action = body.get("action")
+    if action == "inject":
+        if not body.get("text"):
+            return JSONResponse({"error": "inject needs text"}, status_code=400)
+        await session.inject(body["text"], bool(body.get("persistent")), bool(body.get("respond")))
+    elif action == "cancel":
+        await session.cancel()
+    elif action == "handoff":
+        if body.get("agent") not in PROMPTS:
+            return JSONResponse({"error": f"unknown agent {body.get('agent')}"}, status_code=400)
+        await session.handoff(body["agent"], body.get("respond", True))
+    else:
+        return JSONResponse({"error": f"unknown action {action}"}, status_code=400)
+    return {"call_sid": call_sid, "agent": session.agent, "action": action}
+
+# ── LISTEN-IN ────────────────────────────────────────────────────────────────
+@app.websocket("/listen/{call_sid}")
+async def listen_ws(ws: WebSocket, call_sid: str):
+    """Both legs of a live call as Twilio media frames; see listen.py"""
+    # header only: a ?token= would end up in access logs
+    if not is_supervisor(ws.headers.get("x-admin-token")):
+        await ws.close(code=1008, reason="admin token required")
+        return
+    session = CALLS.get(call_sid)
+    if session is None:
+        await ws.close(code=1008, reason="no live call with that SID")
+        return
+    await ws.accept()
+    if CALLS.get(call_sid) is not session:
+        await ws.close(code=1000, reason="call ended")     # during the accept, before a tap existed
+        return
+    try:
+        await listen(ws, session)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+# ── ANALYTICS ────────────────────────────────────────────────────────────────
+@app.get("/analytics")
+async def analytics_daily(request: Request, agent: str = None, since: str = None, until: str = None):
+    """Daily per-agent aggregates across tenants (admin); since/until are YYYY-MM-DD, inclusive."""
+    if (denied := admin_denied(request)):
+        return denied
+    return analytics.query(agent, since, until)
+
+@app.get("/analytics/calls/{call_sid}")
+async def analytics_call(call_sid: str, request: Request):
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    row = analytics.call(call_sid) if owns(tenant, call_sid) else None
+    if row is None:
+        return JSONResponse({"error": "no analytics for this call"}, status_code=404)
+    return row
+
+# ── TURN-TAKING ──────────────────────────────────────────────────────────────
+@app.get("/turn-taking")
+async def turn_taking(request: Request):
+    """Each agent's turn-detection profile next to its measured latency and talk-over."""
+    # the stats pool every tenant's calls, so they are admin-only like tuning
+    if (denied := admin_denied(request)):
+        return denied
+    return turns.report(PROMPTS)
+
+@app.post("/turn-taking/{agent}/tune")
+async def turn_taking_tune(agent: str, request: Request):
+    """Run the tuner on the agent's current window now, even with TURN_AUTOTUNE off."""
+    if (denied := admin_denied(request)):
+        return denied
+    change = turns.tune(agent)
+    return {"changed": change is not None, "profile": turns.profile(agent)}
+
+@app.delete("/turn-taking/{agent}")
+async def turn_taking_reset(agent: str, request: Request):
+    """Forget tuned values; the agent goes back to its configured profile."""
+    if (denied := admin_denied(request)):
+        return denied
+    turns.reset(agent)
+    return {"profile": turns.profile(agent)}
 
 # ── TWIML HANDLERS ───────────────────────────────────────────────────────────
+# Twilio signs these too; the TwiML they return carries a stream token, so
+# only Twilio gets one, bound to the CallSid it is asking about
 @app.api_route("/outbound-call-handler", methods=["GET", "POST"])
 async def outbound_handler(request: Request, agent: str = "alex"):
-    vr = VoiceResponse()
-    vr.connect().stream(url=ws_url(request, "/media-stream",
-                                     {"agent": agent, "scenario": "outbound"}))
-    return HTMLResponse(str(vr), media_type="application/xml")
+    form = await twilio_form(request) if request.method == "POST" else {}
+    if not twilio_signed(request, form):
+        return JSONResponse({"error": "invalid X-Twilio-Signature"}, status_code=403)
+    if agent not in PROMPTS:
+        agent = "alex"
+    call_sid = form.get("CallSid") or request.query_params.get("CallSid")
+    return Response(twiml_engine.render(agent, "outbound", tenants.stream_params(None, call_sid) or None),
+                    media_type="application/xml")
 
 @app.api_route("/inbound-call-handler", methods=["GET", "POST"])
 async def inbound_handler(request: Request):
-    vr = VoiceResponse()
-    vr.connect().stream(url=ws_url(request, "/media-stream",
-                                     {"agent": "alex", "scenario": "inbound"}))
-    return HTMLResponse(str(vr), media_type="application/xml")
-
-# ── MEDIA-STREAM BRIDGE ──────────────────────────────────────────────────────
-OPENAI_WS = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
-VOICE = "shimmer" # Or another supported voice like nova, echo, fable, onyx
+    # Twilio sends To/From as form fields on POST, query params on GET
+    form = await twilio_form(request) if request.method == "POST" else {}
+    if not twilio_signed(request, form):
+        return JSONResponse({"error": "invalid X-Twilio-Signature"}, status_code=403)
+    fields = form or request.query_params
+    to, from_ = fields.get("To", ""), fields.get("From", "")
+    agent = router.lookup(to, from_)
+    print(f"Inbound call {from_} -> {to} routed to {agent}")
+    return Response(twiml_engine.render(agent, "inbound",
+                                        tenants.stream_params(None, fields.get("CallSid")) or None),
+                    media_type="application/xml")
 
-@app.websocket("/media-stream")
-async def media(ws: WebSocket):
-    await ws.accept()
-    qs         = dict(parse_qs(ws.url.query))
-    agent      = qs.get("agent", ["alex"])[0]
-    prompt     = PROMPTS.get(agent, PROMPTS["alex"])
-    stream_sid = None
-
-    hdrs = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "OpenAI-Beta": "realtime=v1"
-    }
-
-    # Connect to OpenAI WebSocket
-    async with websockets.connect(OPENAI_WS, extra_headers=hdrs) as oai:
-        # Initialize OpenAI session
-        await oai.send(json.dumps({
-            "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": prompt,
-                "voice": VOICE,
-                "input_audio_format": "g711_ulaw",
-                "output_audio_format": "g711_ulaw",
-                "input_audio_transcription": {
-                    "model": "whisper-1"
-                },
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 200
-                }
-            }
-        }))
-
-        # ── TASK: Twilio → OpenAI ────────────────────────────────────────────
-        async def twilio_to_oai():
-            nonlocal stream_sid
-            try:
-                while True:
-                    msg = await ws.receive_text()
-                    data = json.loads(msg)
-
-                    if data["event"] == "start":
-                        stream_sid = data["start"]["streamSid"]
-                        print(f"Twilio media stream started: {stream_sid}")
-
-                    elif data["event"] == "media":
-                        # Forward audio payload to OpenAI
-                        await oai.send(json.dumps({
-                            "type": "input_audio_buffer.append",
-                            "audio": data["media"]["payload"]
-                        }))
-
-                    elif data["event"] == "stop":
-                        print("Twilio media stream stopped.")
-                        break
-            except WebSocketDisconnect:
-                print("Twilio WebSocket disconnected.")
-            except Exception as e:
-                print(f"Error in twilio_to_oai: {e}")
-
-        # ── TASK: OpenAI → Twilio ───────────────────────────────────────────
-        async def oai_to_twilio():
-            try:
-                async for raw in oai:
-                    if stream_sid:
-                        msg = json.loads(raw)
-                        
-                        if msg.get("type") == "response.audio.delta":
-                            # Send audio data to Twilio
-                            await ws.send_json({
-                                "event": "media",
-                                "streamSid": stream_sid,
-                                "media": {"payload": msg["delta"]}
-                            })
-                            
-                        elif msg.get("type") == "input_audio_buffer.speech_started":
-                            # Clear Twilio buffer when user starts speaking
-                            await ws.send_json({
-                                "event": "clear",
-                                "streamSid": stream_sid
-                            })
-                            
-                        elif msg.get("type") == "conversation.item.input_audio_transcription.completed":
-                            transcript = msg.get("transcript", "")
-                            print(f"User said: {transcript}")
-                            
-                        elif msg.get("type") == "response.audio_transcript.delta":
-                            transcript = msg.get("delta", "")
-                            print(f"AI said: {transcript}")
-                            
-            except websockets.exceptions.ConnectionClosed as e:
-                print(f"OpenAI WebSocket connection closed: {e}")
-            except Exception as e:
-                print(f"Error in oai_to_twilio: {e}")
-
-        await asyncio.gather(twilio_to_oai(), oai_to_twilio())
-
-# ── RECORDING CALLBACK (STUB) ────────────────────────────────────────────────
+# ── RECORDINGS ───────────────────────────────────────────────────────────────
 @app.post("/recording-status-callback")
-async def rec_cb():
-    return {"ok": True}
+async def rec_cb(request: Request):
+    form = await twilio_form(request)
+    status, body = recordings.callback(public_url(request), form,
+                                       request.headers.get("x-twilio-signature"))
+    return JSONResponse(body, status_code=status)
+
+@app.get("/recordings")
+async def recording_jobs(request: Request, state: str = None, limit: int = 100):
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    keep = (lambda job: owns(tenant, job["call_sid"])) if tenant else None
+    return {"counts": recordings.counts(keep), "jobs": recordings.status(state, limit, keep)}
+
+@app.get("/recordings/{recording_sid}")
+async def recording_job(recording_sid: str, request: Request):
+    tenant, denied = caller_scope(request)
+    if denied:
+        return denied
+    job = recordings.jobs.get(recording_sid)
+    if job is None or not owns(tenant, job["call_sid"]):
+        return JSONResponse({"error": "unknown recording"}, status_code=404)
+    return job
 
 # ── ENTRYPOINT ───────────────────────────────────────────────────────────────
 if __name__ == "__main__":
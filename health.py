@@ -0,0 +1,173 @@
+"""
+Background dependency probes behind /health.
+
+Each probe runs on its own interval in a task of its own and writes its
+result into a cache; /health serves the last JSON rendering of that cache,
+so polling it never makes an outbound request and costs no more than the
+constant dict it replaces. A probe that hangs is cut off at its timeout
+and counted as a failure.
+
+Per dependency the cache keeps ok, the last latency, when it was checked,
+the last success, consecutive failures and the last error (kept after
+recovery, with its time). The overall status is "online" while every
+critical probe passes and "degraded" otherwise; the HTTP status stays
+200 so existing pollers keep treating the process as up.
+
+The tunnel probe also owns the public base URL used for dialing (live
+ngrok tunnel if one is up, else FASTAPI_URL), so place_call reads it from
+memory instead of querying ngrok on every call.
+"""
+import os, json, time, socket, asyncio
+from urllib.parse import urlsplit
+
+import httpx
+
+HEALTH_UPSTREAM_S = float(os.getenv("HEALTH_UPSTREAM_S", 30))
+HEALTH_TWILIO_S   = float(os.getenv("HEALTH_TWILIO_S", 60))
+HEALTH_TUNNEL_S   = float(os.getenv("HEALTH_TUNNEL_S", 15))
+HEALTH_LOOP_S     = float(os.getenv("HEALTH_LOOP_S", 1))
+HEALTH_TIMEOUT_S  = float(os.getenv("HEALTH_TIMEOUT_S", 5))
+LOOP_LAG_WARN_S   = float(os.getenv("HEALTH_LOOP_LAG_WARN_S", 0.25))
+NGROK_API         = os.getenv("NGROK_API", "http://localhost:4040/api/tunnels")
+
+class ProbeFailed(Exception):
+    pass
+
+class Probe:
+    __slots__ = ("name", "fn", "interval", "timeout", "critical", "result")
+
+    def __init__(self, name: str, fn, interval: float, timeout: float, critical: bool):
+        self.name     = name
+        self.fn       = fn              # async () -> detail dict or None; raises on failure
+        self.interval = interval
+        self.timeout  = timeout
+        self.critical = critical
+        self.result   = {"ok": None, "critical": critical, "latency_ms": None, "checked_at": None,
+                         "last_ok": None, "failures": 0, "last_error": None, "error_at": None}
+
+# ── MONITOR ──────────────────────────────────────────────────────────────────
+class HealthMonitor:
+    def __init__(self, **static):
+        self.static  = static           # constant fields served with every response
+        self.probes  = {}
+        self.started = time.time()
+        self._tasks  = []
+        self._body   = b""
+        self._render()
+
+    def add(self, name: str, fn, interval: float, timeout: float = HEALTH_TIMEOUT_S,
+            critical: bool = True):
+        self.probes[name] = Probe(name, fn, interval, timeout, critical)
+        self._render()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(p)) for p in self.probes.values()]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    @property
+    def ok(self) -> bool:
+        return all(p.result["ok"] is not False for p in self.probes.values() if p.critical)
+
+    def body(self) -> bytes:
+        """Cached JSON for /health; rebuilt only when a probe finishes."""
+        return self._body
+
+    def snapshot(self) -> dict:
+        return json.loads(self._body)
+
+    async def check(self, probe: Probe):
+        r = probe.result
+        t0 = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(probe.fn(), probe.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            r["ok"] = False
+            r["failures"] += 1
+            r["last_error"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            r["error_at"] = time.time()
+            if r["failures"] == 1:
+                print(f"Health: {probe.name} failing: {r['last_error']}")
+        else:
+            if r["failures"]:
+                print(f"Health: {probe.name} recovered after {r['failures']} failure(s)")
+            r["ok"], r["failures"], r["last_ok"] = True, 0, time.time()
+            if detail:
+                r.update(detail)
+        r["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        r["checked_at"] = time.time()
+        self._render()
+
+    async def _loop(self, probe: Probe):
+        while True:
+            await self.check(probe)
+            await asyncio.sleep(probe.interval)
+
+    def _render(self):
+        self._body = json.dumps({
+            "status": "online" if self.ok else "degraded",
+            **self.static,
+            "started_at": self.started,
+            "checks": {name: p.result for name, p in self.probes.items()},
+        }).encode()
+
+# ── PROBES ───────────────────────────────────────────────────────────────────
+def http_probe(client: httpx.AsyncClient, url: str, **kwargs):
+    """GET url; any 2xx passes, anything else fails with the status code."""
+    async def probe():
+        r = await client.get(url, **kwargs)
+        if r.status_code >= 300:
+            raise ProbeFailed(f"HTTP {r.status_code} from {urlsplit(url).netloc}")
+        return None
+    return probe
+
+class Tunnel:
+    """Public base URL for Twilio callbacks, refreshed by its probe."""
+
+    def __init__(self, client: httpx.AsyncClient, fallback: str, api: str = NGROK_API):
+        self.client   = client
+        self.fallback = fallback
+        self.api      = api
+        self.url      = fallback
+
+    async def probe(self):
+        source = "fallback"
+        try:
+            tunnels = (await self.client.get(self.api, timeout=2)).json().get("tunnels") or []
+        except (httpx.HTTPError, ValueError):
+            tunnels = []
+        https = [t["public_url"] for t in tunnels if t.get("public_url", "").startswith("https")]
+        url = (https or [t["public_url"] for t in tunnels if t.get("public_url")] or [self.fallback])[0]
+        if url != self.fallback:
+            source = "ngrok"
+        if url != self.url:
+            print(f"Public URL: {url} ({source})")
+        self.url = url
+        # a base Twilio can't resolve means every callback and stream fails
+        host = urlsplit(url).hostname
+        await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return {"url": url, "source": source}
+
+class LoopLag:
+    """Event-loop responsiveness: how late a short sleep wakes up."""
+
+    def __init__(self, warn: float = LOOP_LAG_WARN_S, samples: int = 10):
+        self.warn    = warn
+        self.samples = samples
+        self.max_s   = 0.0
+
+    async def probe(self):
+        worst, tick = 0.0, 0.01
+        for _ in range(self.samples):
+            t0 = time.perf_counter()
+            await asyncio.sleep(tick)
+            worst = max(worst, time.perf_counter() - t0 - tick)
+        self.max_s = max(self.max_s, worst)
+        detail = {"lag_ms": round(worst * 1000, 1), "max_lag_ms": round(self.max_s * 1000, 1)}
+        if worst > self.warn:
+            raise ProbeFailed(f"event loop {detail['lag_ms']} ms late")
+        return detail
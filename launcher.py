@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the FastAPI voice service.
+
+Binds the port once, starts N uvicorn workers on the shared socket
+(uvloop/httptools when installed, WebSocket compression off and queues
+sized for 20 ms audio frames), waits for each to become ready, restarts
+crashed or hung workers with exponential backoff, optionally pins workers
+to CPUs, and reports per-worker load.
+
+    python launcher.py --workers 4 --port 8000 --pin-cpus
+
+Per-call state (event hub, active sessions) lives in each worker, so run
+one worker unless the proxy in front keeps a call on one worker.
+"""
+import os, sys, json, time, signal, argparse, importlib.util, urllib.request
+import multiprocessing as mp
+
+import uvicorn
+
+# per-worker slots in the shared stats array
+READY, HEARTBEAT, CONNECTIONS, REQUESTS, STARTED = range(5)
+FIELDS = 5
+
+def _have(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+# ── WORKER ───────────────────────────────────────────────────────────────────
+class _WorkerServer(uvicorn.Server):
+    def __init__(self, config, stats, slot):
+        super().__init__(config)
+        self.stats = stats
+        self.base  = slot * FIELDS
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        self.stats[self.base + READY] = 0 if self.should_exit else 1
+
+    async def on_tick(self, counter: int) -> bool:
+        if counter % 10 == 0:
+            s, b = self.stats, self.base
+            s[b + HEARTBEAT]   = time.time()
+            s[b + CONNECTIONS] = len(self.server_state.connections)
+            s[b + REQUESTS]    = self.server_state.total_requests
+        return await super().on_tick(counter)
+
+def _serve(slot: int, sock, stats, opts: dict):
+    if opts["cpu"] is not None:
+        os.sched_setaffinity(0, {opts["cpu"]})
+    config = uvicorn.Config(
+        opts["app"],
+        loop="uvloop" if _have("uvloop") else "asyncio",
+        http="httptools" if _have("httptools") else "h11",
+        # Media Stream frames are ~20 ms of base64 mu-law: tiny, frequent and
+        # incompressible, so deflate only costs CPU and latency
+        ws_per_message_deflate=False,
+        ws_max_size=opts["ws_max_size"],
+        ws_max_queue=opts["ws_max_queue"],
+        ws_ping_interval=opts["ws_ping_interval"],
+        ws_ping_timeout=opts["ws_ping_interval"],
+        lifespan="on",
+        access_log=opts["access_log"],
+        timeout_graceful_shutdown=opts["graceful_s"],
+    )
+    try:
+        _WorkerServer(config, stats, slot).run(sockets=[sock])
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches the whole process group; shutdown already ran
+
+# ── SUPERVISOR ───────────────────────────────────────────────────────────────
+class Supervisor:
+    def __init__(self, args):
+        self.args     = args
+        self.ctx      = mp.get_context("spawn")
+        self.stats    = self.ctx.Array("d", args.workers * FIELDS, lock=False)
+        self.procs    = [None] * args.workers
+        self.failures = [0] * args.workers
+        self.not_before = [0.0] * args.workers
+        self.stopping = False
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        self.cpus = cpus if args.pin_cpus and cpus else None
+        self.sock = uvicorn.Config(args.app, host=args.host, port=args.port).bind_socket()
+        self._last_requests = [0.0] * args.workers
+
+    def _opts(self, slot: int) -> dict:
+        a = self.args
+        return {"app": a.app, "cpu": self.cpus[slot % len(self.cpus)] if self.cpus else None,
+                "ws_max_size": a.ws_max_size, "ws_max_queue": a.ws_max_queue,
+                "ws_ping_interval": a.ws_ping_interval, "access_log": a.access_log,
+                "graceful_s": a.graceful_s}
+
+    def start(self, slot: int):
+        b = slot * FIELDS
+        for i in range(FIELDS):
+            self.stats[b + i] = 0
+        self.stats[b + STARTED] = time.time()
+        p = self.ctx.Process(target=_serve, args=(slot, self.sock, self.stats, self._opts(slot)),
+                             name=f"voice-worker-{slot}", daemon=False)
+        p.start()
+        self.procs[slot] = p
+        print(f"[launcher] worker {slot} started pid={p.pid}"
+              + (f" cpu={self._opts(slot)['cpu']}" if self.cpus else ""))
+
+    def _restart_later(self, slot: int, reason: str):
+        b = slot * FIELDS
+        if time.time() - self.stats[b + STARTED] > self.args.stable_s:
+            self.failures[slot] = 0
+        delay = min(self.args.max_backoff_s, 2 ** self.failures[slot])
+        self.failures[slot] += 1
+        self.not_before[slot] = time.time() + delay
+        self.procs[slot] = None
+        print(f"[launcher] worker {slot} {reason}; restarting in {delay:.0f}s")
+
+    def check(self):
+        now = time.time()
+        for slot, p in enumerate(self.procs):
+            b = slot * FIELDS
+            if p is None:
+                if now >= self.not_before[slot]:
+                    self.start(slot)
+                continue
+            if not p.is_alive():
+                self._restart_later(slot, f"exited with code {p.exitcode}")
+                continue
+            ready = self.stats[b + READY]
+            if not ready and now - self.stats[b + STARTED] > self.args.ready_timeout_s:
+                p.kill()
+                p.join()
+                self._restart_later(slot, "never became ready")
+            elif ready and now - self.stats[b + HEARTBEAT] > self.args.hang_s:
+                p.kill()
+                p.join()
+                self._restart_later(slot, f"stopped ticking for {now - self.stats[b + HEARTBEAT]:.0f}s")
+
+    def probe(self) -> bool:
+        """HTTP readiness probe through the shared port."""
+        url = f"http://127.0.0.1:{self.args.port}/health"
+        try:
+            with urllib.request.urlopen(url, timeout=2) as r:
+                return r.status == 200
+        except OSError as e:
+            print(f"[launcher] readiness probe failed: {e}")
+            return False
+
+    def report(self, interval: float):
+        rows = []
+        for slot, p in enumerate(self.procs):
+            b = slot * FIELDS
+            reqs = self.stats[b + REQUESTS]
+            rows.append({
+                "worker": slot, "pid": p.pid if p else None,
+                "ready": bool(self.stats[b + READY]),
+                "connections": int(self.stats[b + CONNECTIONS]),
+                "requests": int(reqs),
+                "req_per_s": round(max(0.0, reqs - self._last_requests[slot]) / interval, 1),
+                "restarts": self.failures[slot],
+            })
+            self._last_requests[slot] = reqs
+        print("[launcher] " + "  ".join(
+            f"w{r['worker']}:{'up' if r['ready'] else 'down'} conns={r['connections']} "
+            f"{r['req_per_s']}/s" for r in rows))
+        if self.args.status_file:
+            with open(self.args.status_file + ".tmp", "w") as f:
+                json.dump({"time": time.time(), "workers": rows}, f)
+            os.replace(self.args.status_file + ".tmp", self.args.status_file)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for slot in range(self.args.workers):
+            self.start(slot)
+
+        probed, last_report = False, time.time()
+        while not self.stopping:
+            time.sleep(0.5)
+            self.check()
+            ready = all(self.stats[s * FIELDS + READY] for s in range(self.args.workers))
+            if ready and not probed:
+                probed = self.probe()
+                if probed:
+                    print(f"[launcher] {self.args.workers} worker(s) ready on :{self.args.port}")
+            if time.time() - last_report >= self.args.report_s:
+                self.report(time.time() - last_report)
+                last_report = time.time()
+
+        print("[launcher] shutting down")
+        for p in self.procs:
+            if p and p.is_alive():
+                p.terminate()
+        deadline = time.time() + self.args.graceful_s + 5
+        for p in self.procs:
+            if p:
+                p.join(max(0.1, deadline - time.time()))
+                if p.is_alive():
+                    p.kill()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--app", default="fastapi_service:app")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", 1)))
+    ap.add_argument("--pin-cpus", action="store_true", help="pin worker i to CPU i mod ncpu")
+    ap.add_argument("--ws-max-size", type=int, default=1 << 20)
+    ap.add_argument("--ws-max-queue", type=int, default=64)
+    ap.add_argument("--ws-ping-interval", type=float, default=20.0)
+    ap.add_argument("--access-log", action="store_true")
+    ap.add_argument("--ready-timeout-s", type=float, default=30.0)
+    ap.add_argument("--hang-s", type=float, default=10.0, help="restart a worker that stops ticking")
+    ap.add_argument("--stable-s", type=float, default=60.0, help="uptime that resets backoff")
+    ap.add_argument("--max-backoff-s", type=float, default=30.0)
+    ap.add_argument("--graceful-s", type=int, default=10)
+    ap.add_argument("--report-s", type=float, default=30.0)
+    ap.add_argument("--status-file", default=os.getenv("LAUNCHER_STATUS_FILE"))
+    args = ap.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    Supervisor(args).run()
+
+if __name__ == "__main__":
+    main()
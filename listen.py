@@ -0,0 +1,102 @@
+"""
+Live listen-in for supervisors on /listen/{call_sid}.
+
+A bridged call gets a Tap the first time someone listens. The bridge
+pushes into it the exact strings it already received from or sent to
+Twilio (one Media Stream JSON frame per 20 ms of mu-law per leg), so a
+listener costs the live call one list store and an event set per frame:
+no copy, no re-encoding, no await. Frames live in a fixed ring indexed by
+sequence number; every listener keeps its own cursor into it and is
+served by its own task, so a slow listener only ever delays itself.
+
+A listener further than LISTEN_MAX_LAG frames behind is dropped (close
+code 1013) instead of being allowed to hold old audio. When the last
+listener leaves, the tap is detached and the bridge goes back to not
+pushing at all.
+
+Listening needs ADMIN_TOKEN configured and sent as the X-Admin-Token
+header; without one configured the endpoint refuses everyone.
+
+Frames arrive unchanged: the caller's carry "track": "inbound", the
+agent's have no track. The first message describes the call and the last
+is {"event": "stop"}.
+"""
+import os, json, asyncio
+
+from metrics import Counter, Gauge
+
+LISTEN_BUFFER_FRAMES = int(os.getenv("LISTEN_BUFFER_FRAMES", 500))   # both legs, ~5 s
+LISTEN_MAX_LAG       = int(os.getenv("LISTEN_MAX_LAG", 250))
+
+LISTENERS = set()
+Gauge("listen_listeners_active", "Supervisors listening to live calls", fn=lambda: len(LISTENERS))
+DROPPED = Counter("listen_listeners_dropped_total", "Listeners dropped for falling behind")
+
+class FellBehind(Exception):
+    pass
+
+class Tap:
+    __slots__ = ("frames", "size", "seq", "wakes", "closed")
+
+    def __init__(self, size: int = LISTEN_BUFFER_FRAMES):
+        self.frames = [None] * size
+        self.size   = size
+        self.seq    = 0            # frames ever pushed; the next one goes to seq % size
+        self.wakes  = []           # one Event per listener
+        self.closed = False
+
+    def push(self, frame: str):
+        """Called by the bridge on its hot path; never awaits."""
+        self.frames[self.seq % self.size] = frame
+        self.seq += 1
+        for wake in self.wakes:
+            wake.set()
+
+    def close(self):
+        self.closed = True
+        for wake in self.wakes:
+            wake.set()
+
+    async def follow(self, max_lag: int = LISTEN_MAX_LAG):
+        """Yield frames from now on until the call ends; raises FellBehind."""
+        wake = asyncio.Event()
+        self.wakes.append(wake)
+        cursor = self.seq
+        try:
+            while True:
+                # the call may have ended (or pushed) before this listener was registered
+                if cursor == self.seq and not self.closed:
+                    await wake.wait()
+                wake.clear()
+                while cursor < self.seq:
+                    if self.seq - cursor > min(max_lag, self.size):
+                        raise FellBehind(f"{self.seq - cursor} frames behind")
+                    yield self.frames[cursor % self.size]
+                    cursor += 1
+                if self.closed:
+                    return
+        finally:
+            self.wakes.remove(wake)
+
+async def listen(ws, session, max_lag: int = LISTEN_MAX_LAG):
+    """Serve one accepted listener socket until the call or the listener ends."""
+    if session.tap is None:
+        session.tap = Tap()
+    tap = session.tap
+    LISTENERS.add(ws)
+    try:
+        await ws.send_text(json.dumps({"event": "start", "call_sid": session.call_sid,
+                                       "agent": session.agent, "stream_sid": session.stream_sid,
+                                       "format": "audio/x-mulaw;rate=8000"}))
+        async for frame in tap.follow(max_lag):
+            await ws.send_text(frame)
+        await ws.send_text('{"event":"stop"}')
+        await ws.close()
+    except FellBehind as e:
+        DROPPED.inc()
+        print(f"Listener on {session.call_sid} dropped: {e}")
+        await ws.close(code=1013, reason="listener fell behind")
+    finally:
+        LISTENERS.discard(ws)
+        if not tap.wakes and session.tap is tap:
+            session.tap = None
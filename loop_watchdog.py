@@ -0,0 +1,134 @@
+"""
+Event-loop lag watchdog.
+
+A daemon thread posts a heartbeat onto the loop every WATCHDOG_INTERVAL_MS
+and times how long it waits to run; every wait lands in the
+event_loop_lag_seconds histogram. When a heartbeat is still waiting after
+WATCHDOG_STALL_MS the loop is blocked right now, so the thread grabs the
+loop thread's stack at that moment (the blocking call is on it) together
+with the task that was running. The stall is finished off, with its full
+duration, when the heartbeat finally runs.
+
+Tasks are labelled so a stall names what it hurt: TaskNames (ASGI
+middleware) names request tasks after their method and path, and the
+bridge renames its pumps with the call SID once Twilio's start frame
+arrives. The last WATCHDOG_KEEP stalls are kept for /admin/stalls.
+
+Each start() runs a new thread against the running loop, so the app's
+lifespan can run more than once in a process (tests, reloads); the
+stall history survives restarts.
+"""
+import os, re, sys, time, asyncio, threading, traceback
+from collections import deque
+
+from metrics import Counter, Histogram
+
+WATCHDOG             = os.getenv("WATCHDOG", "1") == "1"
+WATCHDOG_INTERVAL_S  = float(os.getenv("WATCHDOG_INTERVAL_MS", 100)) / 1000
+WATCHDOG_STALL_S     = float(os.getenv("WATCHDOG_STALL_MS", 100)) / 1000
+WATCHDOG_KEEP        = int(os.getenv("WATCHDOG_KEEP", 50))
+STACK_DEPTH          = 30
+
+LAG    = Histogram("event_loop_lag_seconds", "Delay before a posted callback ran",
+                   (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+STALLS = Counter("event_loop_stalls_total", "Times the loop was blocked past the stall threshold")
+
+_CALL_SID = re.compile(r"\bCA[0-9a-f]{32}\b")
+
+class TaskNames:
+    """Pure ASGI middleware: the task serving a request is named after it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            task = asyncio.current_task()
+            if task is not None:
+                task.set_name(f"{scope.get('method', 'WS')} {scope['path']}")
+        await self.app(scope, receive, send)
+
+class Watchdog:
+    def __init__(self, interval: float = WATCHDOG_INTERVAL_S, stall: float = WATCHDOG_STALL_S,
+                 keep: int = WATCHDOG_KEEP):
+        self.interval = interval
+        self.stall    = stall
+        self.stalls   = deque(maxlen=keep)
+        self.loop     = None
+        self.loop_tid = None
+        self.thread   = None
+        self._ran     = threading.Event()
+        self._lock    = threading.Lock()
+        self._halt    = threading.Event()
+        self._open    = None          # the stall record waiting for its heartbeat
+
+    def start(self, loop=None):
+        """Call from the loop thread."""
+        self.stop()
+        self.loop     = loop or asyncio.get_running_loop()
+        self.loop_tid = threading.get_ident()
+        self._halt    = threading.Event()
+        self._ran     = threading.Event()
+        self._open    = None
+        self.thread   = threading.Thread(target=self._run, args=(self._halt, self._ran),
+                                         name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._halt.set()
+        self._ran.set()
+        if self.thread is not None:
+            self.thread.join(self.interval + self.stall)
+            self.thread = None
+
+    def _run(self, halt: threading.Event, ran: threading.Event):
+        # this run's events, so a thread outliving stop() can't act on the next run's
+        while not halt.wait(self.interval):
+            ran.clear()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(self._beat, sent, ran)
+            except RuntimeError:          # loop closed
+                return
+            if not ran.wait(self.stall) and not halt.is_set():
+                self._capture(sent, ran)
+                ran.wait()
+
+    def _capture(self, sent: float, ran: threading.Event):
+        # asyncio has no public way to ask another thread's loop for its task
+        current = getattr(asyncio.tasks, "_current_tasks", None)
+        task = current.get(self.loop) if isinstance(current, dict) else None
+        name = task.get_name() if task is not None else "(callback)" if current is not None else "(unknown)"
+        frame = sys._current_frames().get(self.loop_tid)
+        stack = traceback.format_stack(frame)[-STACK_DEPTH:] if frame is not None else []
+        match = _CALL_SID.search(name)
+        record = {
+            "at": time.time() - (time.monotonic() - sent),
+            "task": name,
+            "call_sid": match.group(0) if match else None,
+            "lag_ms": None,
+            "stack": [line.rstrip() for line in stack],
+        }
+        with self._lock:
+            if not ran.is_set():            # the heartbeat may have run meanwhile
+                self._open = record
+
+    def _beat(self, sent: float, ran: threading.Event):
+        """Runs on the loop."""
+        lag = time.monotonic() - sent
+        LAG.observe(lag)
+        with self._lock:
+            stall, self._open = self._open, None
+            ran.set()
+        if stall is not None:
+            stall["lag_ms"] = round(lag * 1000, 1)
+            self.stalls.append(stall)
+            STALLS.inc()
+            where = " | ".join(l.strip() for l in stall["stack"][-1].splitlines()) if stall["stack"] else "?"
+            print(f"Event loop blocked {stall['lag_ms']} ms in {stall['task']}: {where}")
+
+    def report(self, limit: int = 20) -> dict:
+        return {"interval_ms": self.interval * 1000, "stall_ms": self.stall * 1000,
+                "stalls": list(self.stalls)[-limit:][::-1]}
+
+watchdog = Watchdog()
@@ -0,0 +1,87 @@
+"""
+Minimal in-process metrics with Prometheus text exposition for /metrics.
+
+    REAPS = Counter("voice_sessions_reaped_total", "...", ("reason",))
+    REAPS.inc(reason="inbound_idle")
+"""
+import bisect
+
+REGISTRY = []
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+# ── TYPES ────────────────────────────────────────────────────────────────────
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, n: float = 1, **labels):
+        key = tuple(labels[l] for l in self.labels)
+        self.values[key] = self.values.get(key, 0) + n
+
+    def samples(self):
+        for key, v in self.values.items():
+            yield self.name + _labels(self.labels, key), v
+
+class Gauge(Counter):
+    """Set directly, or pass `fn` to read the value at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, v: float, **labels):
+        self.values[tuple(labels[l] for l in self.labels)] = v
+
+    def samples(self):
+        if self.fn is not None:
+            yield self.name, self.fn()
+        else:
+            yield from super().samples()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series  = {}        # label values -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, v: float, **labels):
+        key = tuple(labels[l] for l in self.labels)
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = [0] * (len(self.buckets) + 2)
+        i = bisect.bisect_left(self.buckets, v)
+        if i < len(self.buckets):
+            s[i] += 1
+        s[-2] += v
+        s[-1] += 1
+
+    def samples(self):
+        for key, s in self.series.items():
+            cum = 0
+            for le, n in zip(self.buckets, s):
+                cum += n
+                yield self.name + "_bucket" + _labels(self.labels + ("le",), key + (le,)), cum
+            yield self.name + "_bucket" + _labels(self.labels + ("le",), key + ("+Inf",)), s[-1]
+            yield self.name + "_sum" + _labels(self.labels, key), s[-2]
+            yield self.name + "_count" + _labels(self.labels, key), s[-1]
+
+# ── EXPOSITION ───────────────────────────────────────────────────────────────
+def render() -> str:
+    lines = []
+    for m in REGISTRY:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(f"{name} {value}" for name, value in m.samples())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""
+On-demand profiling of live calls, armed from /admin/profile.
+
+A target is one call_sid, every call of one agent, or the next N calls.
+While a profiled call runs, its bridge tasks are CPU-profiled (yappi when
+installed, tagged per call; otherwise a stack sampler thread that only
+counts samples while one of the call's tasks is on the event loop) and
+tracemalloc tracks allocations. Results land in PROFILE_DIR when the
+call ends:
+
+    <call_sid>.prof        pstats (yappi)   or  <call_sid>.folded  (sampler)
+    <call_sid>.alloc.txt   top allocation sites over the call
+
+When nothing is armed the bridge only reads `profiler.armed`.
+"""
+import os, sys, time, asyncio, threading, tracemalloc, importlib.util
+from collections import Counter
+
+PROFILE_DIR       = os.getenv("PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_MS", 5)) / 1000
+TRACEMALLOC_DEPTH = 10
+
+# ── STACK SAMPLER (fallback) ─────────────────────────────────────────────────
+class StackSampler(threading.Thread):
+    """Samples the loop thread and charges each stack to the task running it."""
+    def __init__(self, loop, task_tags: dict):
+        super().__init__(name="call-profiler", daemon=True)
+        self.loop      = loop
+        self.loop_tid  = threading.get_ident()   # created from the loop thread
+        self.task_tags = task_tags               # task -> tag, owned by Profiler
+        self.stacks    = {}                      # tag -> Counter(folded stack)
+        self._halt     = threading.Event()      # not _stop: that would shadow Thread._stop
+
+    def run(self):
+        current = asyncio.tasks._current_tasks
+        while not self._halt.wait(SAMPLE_INTERVAL_S):
+            tag = self.task_tags.get(current.get(self.loop))
+            if not tag:
+                continue
+            frame = sys._current_frames().get(self.loop_tid)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks.setdefault(tag, Counter())[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._halt.set()
+
+# ── PROFILER ─────────────────────────────────────────────────────────────────
+class CallProfile:
+    __slots__ = ("tag", "call_sid", "agent", "started", "snapshot")
+
+class Profiler:
+    def __init__(self):
+        self.armed     = False
+        self.call_sid  = None
+        self.agent     = None
+        self.remaining = 0
+        self.until     = None
+        self.active    = {}          # tag -> CallProfile
+        self.task_tags = {}          # bridge task -> tag of the call it serves
+        self._loop     = None
+        self.written   = []
+        self._next_tag = 0
+        self._sampler  = None
+        self._writes   = set()       # end() tasks still writing results
+        self._yappi    = importlib.util.find_spec("yappi") is not None
+
+    # -- control --------------------------------------------------------------
+    def arm(self, call_sid: str = None, agent: str = None, next_calls: int = 0,
+            seconds: float = None):
+        self.call_sid, self.agent, self.remaining = call_sid, agent, next_calls
+        self.until = time.monotonic() + seconds if seconds else None
+        self.armed = bool(call_sid or agent or next_calls)
+
+    def disarm(self):
+        self.armed = False
+        self.call_sid = self.agent = self.until = None
+        self.remaining = 0
+
+    def status(self):
+        return {"armed": self.armed, "call_sid": self.call_sid, "agent": self.agent,
+                "next_calls": self.remaining, "backend": "yappi" if self._yappi else "sampler",
+                "active": [p.call_sid for p in self.active.values()], "written": self.written[-20:]}
+
+    def wants(self, call_sid: str, agent: str) -> bool:
+        if self.until and time.monotonic() > self.until:
+            self.disarm()
+            return False
+        if self.call_sid:
+            if call_sid != self.call_sid:
+                return False
+            self.disarm()            # a single call was asked for
+            return True
+        if self.agent:
+            return agent == self.agent
+        if self.remaining > 0:
+            self.remaining -= 1
+            if not self.remaining:
+                self.armed = False
+            return True
+        return False
+
+    # -- per call -------------------------------------------------------------
+    def begin(self, call_sid: str, agent: str, tasks) -> CallProfile:
+        self._next_tag += 1
+        prof = CallProfile()
+        prof.tag, prof.call_sid, prof.agent, prof.started = self._next_tag, call_sid, agent, time.time()
+
+        if not self.active:
+            tracemalloc.start(TRACEMALLOC_DEPTH)
+            self._start_cpu()
+        prof.snapshot = tracemalloc.take_snapshot()
+        self.active[prof.tag] = prof
+
+        for t in tasks:
+            self.task_tags[t] = prof.tag
+        print(f"Profiling call {call_sid} ({agent})")
+        return prof
+
+    def end(self, prof: CallProfile):
+        """
+        Stop charging the call's tasks and write its results from a worker
+        thread; the snapshot compare and file writes would otherwise stall the
+        loop. The profile stays active until written, so a call starting
+        meanwhile doesn't restart tracing underneath it.
+        """
+        for t in [t for t, tag in self.task_tags.items() if tag == prof.tag]:
+            del self.task_tags[t]
+        stacks = self._sampler.stacks.pop(prof.tag, Counter()) if self._sampler else None
+        task = asyncio.create_task(self._finish(prof, stacks))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _finish(self, prof: CallProfile, stacks):
+        base = os.path.join(PROFILE_DIR, prof.call_sid or f"call-{prof.tag}")
+        try:
+            self.written += await asyncio.to_thread(self._write, prof, base, stacks)
+            print(f"Profile for {prof.call_sid} written to {base}.*")
+        except Exception as e:
+            print(f"Profile for {prof.call_sid} failed: {e}")
+        finally:
+            self.active.pop(prof.tag, None)
+            if not self.active:
+                self._stop_cpu()
+                tracemalloc.stop()
+
+    def _write(self, prof: CallProfile, base: str, stacks) -> list:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        top = tracemalloc.take_snapshot().compare_to(prof.snapshot, "lineno")[:50]
+        with open(base + ".alloc.txt", "w") as f:
+            f.write(f"# {prof.call_sid} agent={prof.agent} {time.time() - prof.started:.1f}s\n")
+            f.writelines(f"{stat}\n" for stat in top)
+        written = [base + ".alloc.txt"]
+
+        if self._yappi:
+            import yappi
+            stats = yappi.get_func_stats(filter={"tag": prof.tag})
+            stats.save(base + ".prof", type="pstat")
+            written.append(base + ".prof")
+        elif stacks is not None:
+            with open(base + ".folded", "w") as f:
+                f.writelines(f"{stack} {n}\n" for stack, n in stacks.most_common())
+            written.append(base + ".folded")
+        return written
+
+    # -- CPU backends ---------------------------------------------------------
+    def _current_tag(self) -> int:
+        return self.task_tags.get(asyncio.tasks._current_tasks.get(self._loop), 0)
+
+    def _start_cpu(self):
+        self._loop = asyncio.get_running_loop()
+        if self._yappi:
+            import yappi
+            yappi.clear_stats()
+            yappi.set_clock_type("cpu")
+            yappi.set_tag_callback(self._current_tag)
+            yappi.start()
+        else:
+            self._sampler = StackSampler(self._loop, self.task_tags)
+            self._sampler.start()
+
+    def _stop_cpu(self):
+        if self._yappi:
+            import yappi
+            yappi.stop()
+        elif self._sampler:
+            self._sampler.stop()
+            self._sampler = None
+
+profiler = Profiler()
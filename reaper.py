@@ -0,0 +1,79 @@
+"""
+Central reaper for bridged sessions that stopped making progress.
+
+A call whose Twilio leg goes quiet without a `stop`, whose upstream goes
+silent without closing, or that outlives MAX_CALL_S would otherwise hold
+both sockets (and the billed upstream session) until something upstream
+times out. One task sweeps bridge.SESSIONS every REAP_INTERVAL_S, shuts
+overdue sessions down through the normal close path, and hangs the call up
+over the REST API in case Twilio still thinks it is live.
+
+Twilio sends a media frame every 20 ms for the whole call, silence
+included, so a few seconds without one means the inbound leg is gone. The
+upstream is legitimately quiet while nobody talks, hence the longer limit.
+"""
+import os, time, asyncio
+
+from bridge import SESSIONS
+from event_hub import hub
+from metrics import Counter
+
+INBOUND_IDLE_S  = float(os.getenv("REAP_INBOUND_IDLE_S", 10))
+UPSTREAM_IDLE_S = float(os.getenv("REAP_UPSTREAM_IDLE_S", 120))
+MAX_CALL_S      = float(os.getenv("REAP_MAX_CALL_S", 1800))
+REAP_INTERVAL_S = float(os.getenv("REAP_INTERVAL_S", 2))
+
+HANGUP_TWIML = "<Response><Hangup/></Response>"
+
+REAPS = Counter("bridge_sessions_reaped_total", "Sessions closed by the reaper", ("reason",))
+HANGUP_ERRORS = Counter("bridge_reaper_hangup_errors_total", "REST hangups that failed after a reap")
+
+def overdue(session, now: float):
+    """Reap reason for a session, or None while it is healthy."""
+    if now - session.started > MAX_CALL_S:
+        return "max_duration"
+    if now - session.last_inbound > INBOUND_IDLE_S:
+        return "inbound_idle"
+    if now - session.last_upstream > UPSTREAM_IDLE_S:
+        return "upstream_idle"
+    return None
+
+class Reaper:
+    def __init__(self, hangup=None, interval: float = REAP_INTERVAL_S):
+        """`hangup(call_sid)` is a blocking REST call, run in a thread."""
+        self.hangup   = hangup
+        self.interval = interval
+        self._pending = set()
+
+    def sweep(self) -> int:
+        now, reaped = time.monotonic(), 0
+        for session in list(SESSIONS):
+            if session.closing:
+                continue
+            reason = overdue(session, now)
+            if reason:
+                task = asyncio.ensure_future(self.reap(session, reason))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+                reaped += 1
+        return reaped
+
+    async def reap(self, session, reason: str):
+        print(f"Reaping {session.call_sid or 'unstarted session'} ({session.agent}): {reason}")
+        REAPS.inc(reason=reason)
+        hub.publish("session.reaped", session.call_sid, session.agent, reason=reason)
+        session.shutdown(reason)
+        if self.hangup and session.call_sid:
+            try:
+                await asyncio.to_thread(self.hangup, session.call_sid)
+            except Exception as e:      # usually the call already completed
+                HANGUP_ERRORS.inc()
+                print(f"Hangup for {session.call_sid} failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Reaper sweep failed: {e}")
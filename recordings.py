@@ -0,0 +1,253 @@
+"""
+Recording download and post-processing pipeline behind
+/recording-status-callback.
+
+Each completed recording becomes a job on an asyncio queue served by
+RECORDING_WORKERS tasks. A worker streams the WAV from Twilio over one
+pooled httpx client (connections capped at RECORDING_WORKERS) straight to
+disk in chunks, retrying connection errors, 5xx and the brief 404 Twilio
+returns before a fresh recording is readable. Trimming leading/trailing
+silence and transcoding to 8-bit G.711 mu-law WAV (half the size, what
+the phone network carried anyway) run in a process pool so they never
+hold up the event loop. Those two steps need numpy (the [audio] extra);
+without it a job is done as soon as the download is, and keeps the raw
+PCM WAV. Job state is kept in memory, newest last.
+
+Callbacks must carry a valid X-Twilio-Signature. The posted RecordingUrl
+is never fetched: the download URL is built from the RecordingSid against
+RECORDINGS_API_BASE (default api.twilio.com), and a callback naming any
+other host is refused. The account credentials go only to that host;
+a redirect to presigned storage is followed without them. A local
+stand-in for the recordings endpoint sets RECORDINGS_API_BASE:
+
+    RECORDINGS_API_BASE=http://127.0.0.1:9000 python recordings.py fetch RE0123...
+"""
+import os, re, sys, time, wave, struct, asyncio, importlib.util
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from twilio.request_validator import RequestValidator
+
+RECORDINGS_DIR      = os.getenv("RECORDINGS_DIR", "recordings")
+RECORDINGS_API_BASE = os.getenv("RECORDINGS_API_BASE")      # e.g. http://127.0.0.1:9000
+RECORDING_WORKERS   = int(os.getenv("RECORDING_WORKERS", 4))
+RECORDING_PROCESSES = int(os.getenv("RECORDING_PROCESSES", 2))
+RECORDING_RETRIES   = int(os.getenv("RECORDING_RETRIES", 4))
+SILENCE_DBFS        = float(os.getenv("RECORDING_SILENCE_DBFS", -45))
+JOB_HISTORY         = 5000
+CHUNK               = 64 * 1024
+MAX_REDIRECTS       = 3
+TWILIO_API          = "https://api.twilio.com"
+HAVE_NUMPY          = importlib.util.find_spec("numpy") is not None
+RECORDING_SID       = re.compile(r"RE[0-9a-fA-F]{32}")
+
+class RetryableDownload(Exception):
+    pass
+
+# ── POST-PROCESSING (runs in worker processes) ───────────────────────────────
+def _write_ulaw_wav(path: str, ulaw: bytes, rate: int, channels: int):
+    """WAVE_FORMAT_MULAW (7); the stdlib wave module only writes PCM."""
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 4 + 26 + 12 + 8 + len(ulaw)) + b"WAVE")
+        f.write(b"fmt " + struct.pack("<IHHIIHHH", 18, 7, channels, rate,
+                                      rate * channels, channels, 8, 0))
+        f.write(b"fact" + struct.pack("<II", 4, len(ulaw) // channels))
+        f.write(b"data" + struct.pack("<I", len(ulaw)) + ulaw)
+
+def process_recording(src: str, dst: str, silence_dbfs: float = SILENCE_DBFS) -> dict:
+    """Trim silence off both ends of a 16-bit PCM WAV and write it as mu-law."""
+    import numpy as np
+    import audio
+
+    with wave.open(src, "rb") as w:
+        channels, rate, width = w.getnchannels(), w.getframerate(), w.getsampwidth()
+        if width != 2:
+            raise ValueError(f"expected 16-bit PCM, got {8 * width}-bit")
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2").reshape(-1, channels)
+
+    # 20 ms frames, loudest channel; keep from the first to the last frame above threshold
+    frame = rate // 50
+    n = len(pcm) // frame
+    start = end = 0
+    if n:
+        frames = pcm[:n * frame].astype(np.float32).reshape(n, frame, channels)
+        rms = np.sqrt((frames ** 2).mean(axis=1)).max(axis=1)
+        loud = np.flatnonzero(rms > 32768 * 10 ** (silence_dbfs / 20))
+        if len(loud):
+            start, end = loud[0] * frame, (loud[-1] + 1) * frame
+    trimmed = pcm[start:end]
+
+    _write_ulaw_wav(dst, audio.pcm16_to_ulaw(trimmed.ravel()).tobytes(), rate, channels)
+    return {"seconds": round(len(pcm) / rate, 2), "kept_seconds": round(len(trimmed) / rate, 2),
+            "bytes": os.path.getsize(dst)}
+
+# ── PIPELINE ─────────────────────────────────────────────────────────────────
+class RecordingPipeline:
+    def __init__(self, auth=None, directory: str = RECORDINGS_DIR,
+                 workers: int = RECORDING_WORKERS, processes: int = RECORDING_PROCESSES,
+                 retries: int = RECORDING_RETRIES, api_base: str = RECORDINGS_API_BASE,
+                 account: str = None):
+        self.auth      = auth               # (account_sid, auth_token)
+        self.account   = account or (auth[0] if auth else None)
+        self.validator = RequestValidator(auth[1]) if auth else None
+        self.directory = directory
+        self.workers   = workers
+        self.processes = processes
+        self.retries   = retries
+        self.api_base  = (api_base or TWILIO_API).rstrip("/")
+        self.jobs      = OrderedDict()      # recording_sid -> job dict
+        self.queue     = asyncio.Queue()
+        self.client    = None
+        self.pool      = None
+        self._tasks    = []
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # no client-wide auth or redirects: credentials are attached per request, to api_base only
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=self.workers,
+                                max_keepalive_connections=self.workers),
+            follow_redirects=False,
+        )
+        self.pool = ProcessPoolExecutor(self.processes)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.client:
+            await self.client.aclose()
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def callback(self, url: str, form: dict, signature: str):
+        """(status, body) for a recording status callback Twilio posted to public `url`."""
+        if self.validator and not self.validator.validate(url, form, signature or ""):
+            return 403, {"error": "invalid X-Twilio-Signature"}
+        if form.get("RecordingStatus") != "completed":
+            return 200, {"ok": True, "queued": False}
+        sid = form.get("RecordingSid", "")
+        if not RECORDING_SID.fullmatch(sid):
+            return 400, {"error": "RecordingSid required"}
+        if form.get("RecordingUrl") and not self.trusted(form["RecordingUrl"]):
+            return 400, {"error": "RecordingUrl is not on the Twilio API host"}
+        job = self.submit(sid, form.get("CallSid"), duration=form.get("RecordingDuration"))
+        return 200, {"ok": True, "queued": True, "state": job["state"]}
+
+    def trusted(self, url: str) -> bool:
+        return urlsplit(url).hostname in {urlsplit(TWILIO_API).hostname,
+                                          urlsplit(self.api_base).hostname}
+
+    def submit(self, recording_sid: str, call_sid: str = None, **meta) -> dict:
+        job = self.jobs.get(recording_sid)
+        if job and job["state"] != "failed":
+            return job                       # Twilio retries callbacks
+        job = {"recording_sid": recording_sid, "call_sid": call_sid,
+               "url": self.media_url(recording_sid),
+               "state": "queued", "attempts": 0, "queued_at": time.time(), **meta}
+        self.jobs[recording_sid] = job
+        self.jobs.move_to_end(recording_sid)
+        while len(self.jobs) > JOB_HISTORY:
+            self.jobs.popitem(last=False)
+        self.queue.put_nowait(job)
+        return job
+
+    def status(self, state: str = None, limit: int = 100, keep=None) -> list:
+        jobs = [j for j in reversed(self.jobs.values())
+                if (state is None or j["state"] == state) and (keep is None or keep(j))]
+        return jobs[:limit]
+
+    def counts(self, keep=None) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            if keep is None or keep(job):
+                counts[job["state"]] = counts.get(job["state"], 0) + 1
+        return counts
+
+    def media_url(self, recording_sid: str) -> str:
+        return f"{self.api_base}/2010-04-01/Accounts/{self.account}/Recordings/{recording_sid}.wav"
+
+    async def _download(self, job: dict, path: str):
+        tmp = path + ".part"
+        url, auth = job["url"], self.auth
+        for _ in range(MAX_REDIRECTS + 1):
+            async with self.client.stream("GET", url, auth=auth) as r:
+                if r.is_redirect:
+                    # presigned storage URL: follow it, but never with the account credentials
+                    url, auth = str(r.url.join(r.headers["location"])), None
+                    continue
+                if r.status_code == 404 or r.status_code >= 500 or r.status_code == 429:
+                    raise RetryableDownload(f"HTTP {r.status_code}")
+                r.raise_for_status()
+                size = 0
+                with open(tmp, "wb") as f:
+                    async for chunk in r.aiter_bytes(CHUNK):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp, path)
+            job["bytes_downloaded"] = size
+            return
+        raise RetryableDownload(f"more than {MAX_REDIRECTS} redirects")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            sid = job["recording_sid"]
+            raw = os.path.join(self.directory, f"{sid}.wav")
+            try:
+                job["state"] = "downloading"
+                for attempt in range(self.retries + 1):
+                    job["attempts"] = attempt + 1
+                    try:
+                        await self._download(job, raw)
+                        break
+                    except (RetryableDownload, httpx.TransportError) as e:
+                        if attempt == self.retries:
+                            raise
+                        job["last_error"] = str(e)
+                        await asyncio.sleep(min(2 ** attempt, 30))
+                job["downloaded_at"] = time.time()
+
+                if not HAVE_NUMPY:
+                    # trim/transcode need numpy; the raw recording is still the recording
+                    job["path"], job["processed"], job["state"] = raw, False, "done"
+                    print(f"Recording {sid} for {job.get('call_sid')}: kept raw (numpy not installed)")
+                    continue
+                job["state"] = "processing"
+                out = os.path.join(self.directory, f"{sid}.ulaw.wav")
+                job.update(await loop.run_in_executor(self.pool, process_recording, raw, out))
+                job["path"], job["processed"] = out, True
+                os.remove(raw)
+                job["state"] = "done"
+                print(f"Recording {sid} for {job.get('call_sid')}: {job['kept_seconds']}s kept")
+            except Exception as e:
+                job["state"], job["error"] = "failed", f"{type(e).__name__}: {e}"
+                print(f"Recording {sid} failed: {job['error']}")
+            finally:
+                job["finished_at"] = time.time()
+                self.queue.task_done()
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "fetch":
+        sys.exit("usage: python recordings.py fetch RECORDING_SID [...]")
+    if not os.getenv("TWILIO_ACCOUNT_SID"):
+        sys.exit("TWILIO_ACCOUNT_SID is required to build recording URLs")
+
+    async def main(sids):
+        sid, token = os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN")
+        pipeline = RecordingPipeline(auth=(sid, token) if token else None, account=sid)
+        await pipeline.start()
+        for recording_sid in sids:
+            pipeline.submit(recording_sid)
+        await pipeline.queue.join()
+        await pipeline.stop()
+        for job in pipeline.jobs.values():
+            print(job)
+        return all(j["state"] == "done" for j in pipeline.jobs.values())
+
+    sys.exit(0 if asyncio.run(main(sys.argv[2:])) else 1)
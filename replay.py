@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Replay a captured /media-stream session (capture.py) through the real
+bridge against stand-in sockets, then check timing invariants and report
+per-stage latency next to what was recorded in production.
+
+    python replay.py session.twcap [--speed 4] [--max-stage-ms 5] [--json]
+
+--speed 1 replays in real time, higher values compress the timeline and
+--speed 0 delivers every event as fast as the bridge takes it.
+"""
+import sys, json, time, asyncio, argparse
+
+from capture import read_capture, CHANNELS, TWILIO_IN, UPSTREAM_OUT, UPSTREAM_IN, TWILIO_OUT, META
+from bridge import run_bridge
+
+def _is_twilio_media(text):
+    return '"media"' in text and json.loads(text).get("event") == "media"
+
+def _is_append(text):
+    return '"input_audio_buffer.append"' in text
+
+def _is_audio_delta(text):
+    return '"response.audio.delta"' in text
+
+def _is_outbound_media(text):
+    return '"event": "media"' in text or '"event":"media"' in text
+
+def _append_audio(records):
+    return [json.loads(t)["audio"] for _, t in records if _is_append(t)]
+
+# ── STAND-INS ────────────────────────────────────────────────────────────────
+class ReplayClock:
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.t0    = time.monotonic_ns()
+
+    def now(self) -> int:
+        return time.monotonic_ns() - self.t0
+
+    async def until(self, t_ns: int):
+        if self.speed:
+            delay = (t_ns / self.speed - self.now()) / 1e9
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+
+class _Leg:
+    """Feeds recorded inbound text on schedule and timestamps what is sent back."""
+    def __init__(self, inbound, clock: ReplayClock):
+        self.inbound   = inbound
+        self.clock     = clock
+        self.delivered = []   # (t_ns, text) when handed to the bridge
+        self.sent      = []   # (t_ns, text) the bridge sent to this leg
+
+    async def _feed(self):
+        for t_ns, text in self.inbound:
+            await self.clock.until(t_ns)
+            self.delivered.append((self.clock.now(), text))
+            yield text
+
+    async def close(self):
+        pass
+
+class StandInTwilio(_Leg):
+    query_params = {}
+
+    def iter_text(self):
+        return self._feed()
+
+    async def send_text(self, text: str):
+        self.sent.append((self.clock.now(), text))
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+class StandInUpstream(_Leg):
+    def __aiter__(self):
+        return self._feed()
+
+    async def send(self, text: str):
+        self.sent.append((self.clock.now(), text))
+
+# ── ANALYSIS ─────────────────────────────────────────────────────────────────
+def _pair_latencies(inputs, outputs):
+    """n-th input paired with n-th output -> list of latencies in ms."""
+    return [(t_out - t_in) / 1e6 for (t_in, _), (t_out, _) in zip(inputs, outputs)]
+
+def _stats(samples):
+    if not samples:
+        return {"n": 0}
+    s = sorted(samples)
+    return {"n": len(s), "p50": s[len(s) // 2], "p99": s[max(0, int(len(s) * 0.99) - 1)], "max": s[-1]}
+
+def stage_latencies(twilio_in, upstream_out, upstream_in, twilio_out):
+    return {
+        "twilio_in->upstream_out": _stats(_pair_latencies(
+            [r for r in twilio_in if _is_twilio_media(r[1])],
+            [r for r in upstream_out if _is_append(r[1])])),
+        "upstream_in->twilio_out": _stats(_pair_latencies(
+            [r for r in upstream_in if _is_audio_delta(r[1])],
+            [r for r in twilio_out if _is_outbound_media(r[1])])),
+    }
+
+# ── REPLAY ───────────────────────────────────────────────────────────────────
+async def replay(path: str, speed: float = 1.0):
+    records = read_capture(path)
+    by_channel = {c: [(t, text) for ch, t, text in records if ch == c] for c in CHANNELS}
+    meta = json.loads(by_channel[META][0][1]) if by_channel[META] else {}
+
+    clock    = ReplayClock(speed)
+    twilio   = StandInTwilio(by_channel[TWILIO_IN], clock)
+    upstream = StandInUpstream(by_channel[UPSTREAM_IN], clock)
+
+    async def connect():
+        return upstream
+
+    started = time.monotonic()
+    await run_bridge(twilio, meta.get("agent", "alex"), meta.get("scenario", "outbound"),
+                     connect=connect)
+    wall = time.monotonic() - started
+
+    recorded = stage_latencies(by_channel[TWILIO_IN], by_channel[UPSTREAM_OUT],
+                               by_channel[UPSTREAM_IN], by_channel[TWILIO_OUT])
+    replayed = stage_latencies(twilio.delivered, upstream.sent, upstream.delivered, twilio.sent)
+    span_s = (records[-1][1] / 1e9) if records else 0.0
+    return {
+        "file": path, "agent": meta.get("agent"), "speed": speed,
+        "recorded_span_s": span_s, "replay_wall_s": wall,
+        "counts": {
+            "recorded_appends": sum(_is_append(t) for _, t in by_channel[UPSTREAM_OUT]),
+            "replayed_appends": sum(_is_append(t) for _, t in upstream.sent),
+            "recorded_twilio_media_out": sum(_is_outbound_media(t) for _, t in by_channel[TWILIO_OUT]),
+            "replayed_twilio_media_out": sum(_is_outbound_media(t) for _, t in twilio.sent),
+        },
+        "payload_order_ok": _append_audio(upstream.sent) == _append_audio(by_channel[UPSTREAM_OUT]),
+        "recorded": recorded,
+        "replayed": replayed,
+    }
+
+def check_invariants(report, max_stage_ms: float):
+    problems = []
+    c = report["counts"]
+    if c["replayed_appends"] != c["recorded_appends"]:
+        problems.append(f"appends {c['replayed_appends']} != recorded {c['recorded_appends']}")
+    if c["replayed_twilio_media_out"] != c["recorded_twilio_media_out"]:
+        problems.append(f"twilio media out {c['replayed_twilio_media_out']} "
+                        f"!= recorded {c['recorded_twilio_media_out']}")
+    if not report["payload_order_ok"]:
+        problems.append("upstream audio payloads differ from the recording")
+    for stage, st in report["replayed"].items():
+        if st["n"] and st["p99"] > max_stage_ms:
+            problems.append(f"{stage} p99 {st['p99']:.2f} ms > {max_stage_ms} ms")
+    if report["speed"] and report["replay_wall_s"] > report["recorded_span_s"] / report["speed"] + 1.0:
+        problems.append(f"replay took {report['replay_wall_s']:.2f}s, "
+                        f"expected ~{report['recorded_span_s'] / report['speed']:.2f}s")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("captures", nargs="+")
+    ap.add_argument("--speed", type=float, default=1.0)
+    ap.add_argument("--max-stage-ms", type=float, default=5.0)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    failed = False
+    for path in args.captures:
+        report = asyncio.run(replay(path, args.speed))
+        problems = check_invariants(report, args.max_stage_ms)
+        report["problems"] = problems
+        failed |= bool(problems)
+        if args.json:
+            print(json.dumps(report))
+            continue
+        print(f"{path}  agent={report['agent']}  span={report['recorded_span_s']:.1f}s  "
+              f"replay={report['replay_wall_s']:.2f}s @ {args.speed}x")
+        for stage in report["replayed"]:
+            rec, rep = report["recorded"][stage], report["replayed"][stage]
+            if rep["n"]:
+                print(f"  {stage:26s} n={rep['n']:<6d} p50 {rep['p50']:.3f} ms  p99 {rep['p99']:.3f} ms"
+                      f"  max {rep['max']:.3f} ms   (recorded p50 {rec.get('p50', 0):.3f} ms"
+                      f"  p99 {rec.get('p99', 0):.3f} ms)")
+        for p in problems:
+            print(f"  FAIL {p}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
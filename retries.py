@@ -0,0 +1,260 @@
+"""
+Persistent retry scheduler for dials that end busy, no-answer or failed.
+
+Outcomes arrive on Twilio's status callback. A retryable one is given a
+due time from the agent's backoff rule, pushed forward into the callee's
+calling-hours window (local time from the NANP area code), written to
+SQLite and pushed onto an in-memory min-heap of (due, id). The dispatcher
+only ever looks at the heap top, so hundreds of thousands of pending
+retries cost nothing until they come due; rows are re-read by primary key
+when popped, and heap entries made stale by a reschedule or cancel are
+dropped then. Each launcher worker runs its own dispatcher against the
+same database, so a row is claimed with a conditional UPDATE and only the
+worker that moved it out of 'pending' dials it. Due retries are fed to
+the dialer at RETRY_DIAL_RATE calls per second. A row left 'dialing' for
+longer than RETRY_DIALING_TIMEOUT_S (the process died, or the status
+callback never came) is put back to 'pending' at startup; the attempt it
+claimed stays spent.
+
+A retry of a tenant's call is stored with the tenant and goes back
+through that tenant's admission when it comes due; a dialer that can't
+place it yet raises RetryLater, which puts the row back without spending
+an attempt.
+
+Backoff rules map an outcome to the delays (seconds) before each further
+attempt; once the list runs out the number is given up on. Per-agent
+overrides come from RETRY_RULES (a JSON file):
+
+    {"jessica": {"no-answer": [3600, 86400], "busy": [600]}}
+"""
+import os, json, time, heapq, sqlite3, asyncio
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from routing import Rule, digits
+
+RETRY_DB        = os.getenv("RETRY_DB", "retries.db")
+RETRY_RULES     = os.getenv("RETRY_RULES", "retry_rules.json")
+RETRY_DIAL_RATE = float(os.getenv("RETRY_DIAL_RATE", 1))
+RETRY_DIALING_TIMEOUT_S = float(os.getenv("RETRY_DIALING_TIMEOUT_S", 4 * 3600))
+CALL_HOURS      = os.getenv("RETRY_CALL_HOURS", "09:00-20:00")
+CALL_DAYS       = [int(d) for d in os.getenv("RETRY_CALL_DAYS", "0,1,2,3,4,5").split(",")]
+DEFAULT_TZ      = os.getenv("RETRY_DEFAULT_TZ", "America/Chicago")
+
+DEFAULT_RULES = {
+    "busy":      [300, 1800, 7200],
+    "no-answer": [3600, 14400, 86400],
+    "failed":    [900, 7200],
+}
+RETRYABLE = frozenset(DEFAULT_RULES)
+
+class RetryLater(Exception):
+    """Raised by the dialer to put a due retry back for `delay` seconds."""
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason)
+        self.delay = delay
+
+# ── CALLEE TIME ZONE ─────────────────────────────────────────────────────────
+# NANP area codes outside Eastern time; other +1 numbers are taken as
+# Eastern. Codes that straddle a zone line use their majority zone.
+_ZONES = {
+    "America/Los_Angeles": "206 209 213 253 279 310 323 341 350 360 408 415 424 425 442 458 503 "
+                           "509 510 530 541 559 562 564 619 626 628 650 657 661 669 702 707 714 "
+                           "725 747 760 775 805 818 820 831 858 909 916 925 949 951 971",
+    "America/Denver":      "208 303 307 385 406 435 505 575 719 720 801 915 970 983",
+    "America/Phoenix":     "480 520 602 623 928",
+    "America/Chicago":     "205 210 214 217 218 219 224 225 228 251 254 256 262 281 309 312 314 "
+                           "316 318 319 320 325 331 334 337 346 361 402 405 409 414 417 430 432 "
+                           "469 479 501 504 507 512 515 531 563 573 580 601 605 608 612 615 618 "
+                           "620 630 636 641 651 659 660 662 682 701 708 712 713 715 726 731 737 "
+                           "763 769 773 779 785 806 815 816 817 830 832 847 870 872 901 903 913 "
+                           "918 920 931 936 938 940 945 952 956 972 979 985",
+    "America/Anchorage":   "907",
+    "Pacific/Honolulu":    "808",
+}
+AREA_TZ = {code: tz for tz, codes in _ZONES.items() for code in codes.split()}
+
+def callee_tz(e164: str) -> ZoneInfo:
+    d = digits(e164)
+    if len(d) == 11 and d[0] == "1":
+        return ZoneInfo(AREA_TZ.get(d[1:4], "America/New_York"))
+    return ZoneInfo(DEFAULT_TZ)
+
+def next_open(when: float, tz: ZoneInfo, window: Rule) -> float:
+    """Earliest epoch >= when that falls inside the calling window in tz."""
+    local = datetime.fromtimestamp(when, tz)
+    if window.open_at(local.hour * 60 + local.minute, local.weekday()):
+        return when
+    start_h, start_m = divmod(window.start or 0, 60)
+    for offset in range(8):
+        day = local.date() + timedelta(days=offset)
+        candidate = datetime(day.year, day.month, day.day, start_h, start_m, tzinfo=tz)
+        if candidate > local and window.open_at(window.start or 0, candidate.weekday()):
+            return candidate.timestamp()
+    return when   # empty window: don't hold the retry forever
+
+# ── SCHEDULER ────────────────────────────────────────────────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS retries (
+    id       INTEGER PRIMARY KEY,
+    number   TEXT NOT NULL,
+    agent    TEXT NOT NULL,
+    attempt  INTEGER NOT NULL,       -- retries already placed
+    due      REAL NOT NULL,
+    state    TEXT NOT NULL,          -- pending | dialing | done | exhausted | canceled
+    outcome  TEXT,                   -- last dial outcome
+    call_sid TEXT,
+    updated  REAL NOT NULL,
+    tenant   TEXT                    -- tenant whose dial this retries, if any
+);
+CREATE INDEX IF NOT EXISTS retries_pending ON retries (state, due);
+CREATE INDEX IF NOT EXISTS retries_number  ON retries (number);
+"""
+
+class RetryScheduler:
+    def __init__(self, path: str = RETRY_DB, rules_path: str = RETRY_RULES,
+                 rate: float = RETRY_DIAL_RATE, dialing_timeout: float = RETRY_DIALING_TIMEOUT_S):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        if "tenant" not in [c[1] for c in self.db.execute("PRAGMA table_info(retries)")]:
+            self.db.execute("ALTER TABLE retries ADD COLUMN tenant TEXT")
+        self.rate   = rate
+        self.window = Rule(None, CALL_HOURS, CALL_DAYS)
+        self.rules  = {}
+        if os.path.exists(rules_path):
+            with open(rules_path) as f:
+                self.rules = json.load(f)
+        now = time.time()
+        with self.db:
+            stuck = self.db.execute("UPDATE retries SET state = 'pending', due = ?, updated = ? "
+                                    "WHERE state = 'dialing' AND updated < ?",
+                                    (now, now, now - dialing_timeout)).rowcount
+        self.heap   = self.db.execute(
+            "SELECT due, id FROM retries WHERE state = 'pending'").fetchall()
+        heapq.heapify(self.heap)
+        self._wake  = asyncio.Event()
+        print(f"Retry scheduler: {len(self.heap)} pending"
+              + (f", {stuck} requeued from dialing" if stuck else ""))
+
+    def delays(self, agent: str, outcome: str):
+        return self.rules.get(agent, {}).get(outcome, DEFAULT_RULES[outcome])
+
+    def _push(self, due: float, row_id: int):
+        heapq.heappush(self.heap, (due, row_id))
+        if self.heap[0][1] == row_id:
+            self._wake.set()
+
+    def outcome(self, call_sid: str, number: str, agent: str, status: str, retry_id: int = None,
+                tenant: str = None):
+        """Record a final call status. Returns the retry's state, or None if untracked."""
+        now = time.time()
+        row = None
+        if retry_id is not None:
+            row = self.db.execute("SELECT attempt, state FROM retries WHERE id = ?",
+                                  (retry_id,)).fetchone()
+            if row is None or row[1] != "dialing":
+                return None            # canceled meanwhile, or a duplicate callback
+        if status not in RETRYABLE:
+            if row is not None:
+                with self.db:
+                    self.db.execute("UPDATE retries SET state = 'done', outcome = ?, updated = ? "
+                                    "WHERE id = ?", (status, now, retry_id))
+                return "done"
+            return None
+
+        attempt = row[0] if row is not None else 0
+        delays = self.delays(agent, status)
+        if attempt >= len(delays):
+            with self.db:
+                self.db.execute("UPDATE retries SET state = 'exhausted', outcome = ?, updated = ? "
+                                "WHERE id = ?", (status, now, retry_id))
+            return "exhausted"
+        due = next_open(now + delays[attempt], callee_tz(number), self.window)
+        with self.db:
+            if row is not None:
+                self.db.execute("UPDATE retries SET state = 'pending', outcome = ?, due = ?, "
+                                "call_sid = ?, updated = ? WHERE id = ?",
+                                (status, due, call_sid, now, retry_id))
+            else:
+                retry_id = self.db.execute(
+                    "INSERT INTO retries (number, agent, attempt, due, state, outcome, call_sid, updated, "
+                    "tenant) VALUES (?, ?, 0, ?, 'pending', ?, ?, ?, ?)",
+                    (number, agent, due, status, call_sid, now, tenant)).lastrowid
+        self._push(due, retry_id)
+        return "pending"
+
+    def cancel(self, number: str, tenant: str = None) -> int:
+        """Drop pending retries for a number (only tenant's, if given); their heap entries go stale."""
+        sql, args = ("UPDATE retries SET state = 'canceled', updated = ? "
+                     "WHERE number = ? AND state = 'pending'", [time.time(), number])
+        if tenant is not None:
+            sql += " AND tenant = ?"
+            args.append(tenant)
+        with self.db:
+            return self.db.execute(sql, args).rowcount
+
+    def stats(self) -> dict:
+        counts = dict(self.db.execute("SELECT state, COUNT(*) FROM retries GROUP BY state"))
+        return {"states": counts, "heap": len(self.heap),
+                "next_due": self.heap[0][0] if self.heap else None}
+
+    def _pop_due(self, now: float):
+        """Next due (id, number, agent, tenant) row, skipping stale heap entries."""
+        while self.heap and self.heap[0][0] <= now:
+            due, row_id = heapq.heappop(self.heap)
+            row = self.db.execute("SELECT number, agent, due, state, tenant FROM retries WHERE id = ?",
+                                  (row_id,)).fetchone()
+            if row and row[3] == "pending" and row[2] == due:
+                return row_id, row[0], row[1], row[4]
+        return None
+
+    async def run(self, dial, blocked=None):
+        """
+        Feed due retries to `dial(number, agent, retry_id, tenant) -> call_sid`
+        at the configured rate. `blocked(number)` vetoes a dial (e.g. do-not-call).
+        """
+        interval = 1 / self.rate
+        while True:
+            now = time.time()
+            item = self._pop_due(now)
+            if item is None:
+                self._wake.clear()
+                timeout = self.heap[0][0] - now if self.heap else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            row_id, number, agent, tenant = item
+            if blocked and blocked(number):
+                with self.db:
+                    self.db.execute("UPDATE retries SET state = 'canceled', updated = ? "
+                                    "WHERE id = ? AND state = 'pending'", (now, row_id))
+                continue
+            # every worker runs a dispatcher on the same file; only the one whose
+            # claim flips the row out of pending may dial it
+            with self.db:
+                claimed = self.db.execute("UPDATE retries SET state = 'dialing', attempt = attempt + 1, "
+                                          "updated = ? WHERE id = ? AND state = 'pending'",
+                                          (now, row_id)).rowcount
+            if not claimed:
+                continue
+            try:
+                call_sid = await dial(number, agent, row_id, tenant)
+                with self.db:
+                    self.db.execute("UPDATE retries SET call_sid = ? WHERE id = ?",
+                                    (call_sid, row_id))
+            except RetryLater as e:
+                due = now + e.delay
+                with self.db:
+                    self.db.execute("UPDATE retries SET state = 'pending', attempt = attempt - 1, "
+                                    "due = ?, updated = ? WHERE id = ? AND state = 'dialing'",
+                                    (due, now, row_id))
+                self._push(due, row_id)
+            except Exception as e:
+                print(f"Retry dial to {number} failed: {e}")
+                self.outcome(None, number, agent, "failed", row_id)
+            await asyncio.sleep(interval)
@@ -0,0 +1,177 @@
+"""
+Inbound routing table: which agent answers a call, by the Twilio number
+that was dialed (To) or the caller's prefix (From), with optional
+time-of-day windows. Rules live in a JSON file that is reloaded when it
+changes:
+
+    {
+      "default": "alex",
+      "timezone": "America/Chicago",
+      "rules": [
+        {"to": "+14055550100", "agent": "jessica"},
+        {"from": "+1405", "agent": "jessica"},
+        {"from": "+1918", "agent": "stacy", "hours": "18:00-08:00", "days": [5, 6]}
+      ]
+    }
+
+Numbers and prefixes go into digit tries, so a lookup costs one step per
+digit no matter how many rules are loaded. The longest matching prefix
+wins; on the same prefix a rule whose window is open beats a plain one.
+A matching "to" rule beats any "from" rule.
+
+Inside the event loop a changed file is parsed on a worker thread while
+lookups keep using the previous table; the new tries replace it in one
+assignment once they are complete.
+"""
+import os, json, time, asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+ROUTING_TABLE  = os.getenv("ROUTING_TABLE", "routing.json")
+RELOAD_EVERY_S = float(os.getenv("ROUTING_RELOAD_S", 2))
+
+def digits(number: str) -> str:
+    return "".join(c for c in number or "" if c.isdigit())
+
+def _minutes(hhmm: str) -> int:
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+# ── RULE ─────────────────────────────────────────────────────────────────────
+class Rule:
+    __slots__ = ("agent", "start", "end", "days")
+
+    def __init__(self, agent: str, hours: str = None, days=None):
+        self.agent = agent
+        self.start = self.end = None
+        if hours:
+            start, end = hours.split("-")
+            self.start, self.end = _minutes(start), _minutes(end)
+        self.days = frozenset(days) if days is not None else None
+
+    @property
+    def windowed(self):
+        return self.start is not None or self.days is not None
+
+    def open_at(self, minute: int, weekday: int) -> bool:
+        if self.days is not None and weekday not in self.days:
+            return False
+        if self.start is None:
+            return True
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end  # wraps midnight
+
+# ── TRIE ─────────────────────────────────────────────────────────────────────
+class DigitTrie:
+    """Nodes are [children, rules]; after freeze() rules keep windowed ones first."""
+    __slots__ = ("root", "size")
+
+    def __init__(self):
+        self.root = [{}, None]
+        self.size = 0
+
+    def insert(self, prefix: str, rule: Rule):
+        node = self.root
+        for d in digits(prefix):
+            node = node[0].setdefault(d, [{}, None])
+        if node[1] is None:
+            node[1] = []
+        node[1].append(rule)
+        self.size += 1
+
+    def freeze(self):
+        """Order every node's rules once, after the last insert (stable: file order within a kind)."""
+        stack = [self.root]
+        while stack:
+            children, rules = stack.pop()
+            if rules and len(rules) > 1:
+                rules.sort(key=lambda r: not r.windowed)
+            stack.extend(children.values())
+        return self
+
+    def match(self, number: str, minute: int, weekday: int):
+        best, node = None, self.root
+        for d in digits(number):
+            node = node[0].get(d)
+            if node is None:
+                break
+            for rule in node[1] or ():
+                if rule.open_at(minute, weekday):
+                    best = rule
+                    break
+        return best
+
+# ── ROUTER ───────────────────────────────────────────────────────────────────
+class Router:
+    def __init__(self, path: str = ROUTING_TABLE, agents=None, default: str = "alex"):
+        self.path      = path
+        self.agents    = set(agents) if agents is not None else None
+        self.default   = default
+        # (to_trie, from_trie, tz, default), replaced whole so a lookup never
+        # sees half of one table and half of the next
+        self.table     = (DigitTrie(), DigitTrie(), ZoneInfo("America/Chicago"), default)
+        self._mtime    = None
+        self._checked  = 0.0
+        self._reloading = None
+        self.reload()
+
+    def reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                table = json.load(f)
+            to_trie, from_trie = DigitTrie(), DigitTrie()
+            for r in table.get("rules", []):
+                if self.agents is not None and r["agent"] not in self.agents:
+                    raise ValueError(f"unknown agent {r['agent']}")
+                rule = Rule(r["agent"], r.get("hours"), r.get("days"))
+                if "to" in r:
+                    to_trie.insert(r["to"], rule)
+                else:
+                    from_trie.insert(r["from"], rule)
+            to_trie.freeze(), from_trie.freeze()
+            tz = ZoneInfo(table.get("timezone", "America/Chicago"))
+            default = table.get("default", self.default)
+            if self.agents is not None and default not in self.agents:
+                raise ValueError(f"unknown default agent {default}")
+        except (ValueError, KeyError, TypeError) as e:
+            # keep serving the previous table rather than a half-loaded one
+            print(f"Routing table {self.path} rejected: {e}")
+            self._mtime = mtime
+            return
+        self.table = (to_trie, from_trie, tz, default)
+        self._mtime = mtime
+        print(f"Routing table loaded: {to_trie.size} number rules, {from_trie.size} prefix rules")
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_EVERY_S or self._reloading is not None:
+            return
+        self._checked = now
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.reload()       # no event loop (scripts, benchmarks): load inline
+            return
+        self._reloading = loop.create_task(asyncio.to_thread(self.reload))
+        self._reloading.add_done_callback(self._reloaded)
+
+    def _reloaded(self, task):
+        self._reloading = None
+        if not task.cancelled() and task.exception():
+            print(f"Routing table reload failed: {task.exception()}")
+
+    def lookup(self, to: str, from_: str, when: datetime = None) -> str:
+        self.maybe_reload()
+        to_trie, from_trie, tz, default = self.table
+        when = when.astimezone(tz) if when else datetime.now(tz)
+        minute, weekday = when.hour * 60 + when.minute, when.weekday()
+        rule = (to_trie.match(to, minute, weekday)
+                or from_trie.match(from_, minute, weekday))
+        return rule.agent if rule else default
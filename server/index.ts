@@ -39,7 +39,7 @@ app.use((req, res, next) => {
 
 // Start FastAPI service in background
 function startFastAPIService() {
-  const fastApiProcess = spawn('python', ['-m', 'uvicorn', 'fastapi_service:app', '--host', '0.0.0.0', '--port', '8000'], {
+  const fastApiProcess = spawn('python', ['launcher.py', '--host', '0.0.0.0', '--port', '8000'], {
     stdio: 'pipe',
     detached: true
   });
@@ -134,7 +134,16 @@ export async function registerRoutes(app: Express): Promise<Server> {
         });
         
         if (response.ok) {
-          fastApiStatus = 'online';
+          // /health reports the service's cached dependency probes
+          const health = await response.json();
+          fastApiStatus = health.status || 'online';
+          const checks = health.checks || {};
+          if (checks.twilio) {
+            twilioStatus = checks.twilio.ok ? 'connected' : 'unreachable';
+          }
+          if (checks.upstream) {
+            openaiStatus = checks.upstream.ok ? 'active' : 'unreachable';
+          }
         }
       } catch (error) {
         console.log('FastAPI health check failed:', error);
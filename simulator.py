@@ -0,0 +1,331 @@
+"""
+Dry-run calls (DRY_RUN=1): the real service, minus Twilio and OpenAI.
+
+`dial()` replaces the Twilio REST call. It starts a SimulatedCaller that
+behaves like Twilio's side of a call: it reads the Stream URL out of the
+TwiML it was given, connects to /media-stream over a real WebSocket, sends
+connected/start, 20 ms mu-law frames (speech bursts and silence) in real
+time and stop, listens to the audio that comes back, and finally posts
+the call's status to the status callback. Some dials end busy or
+no-answer instead (DRY_RUN_OUTCOMES), so retries get exercised too.
+
+The bridge's upstream is a ScriptedRealtime. It speaks enough of the
+Realtime protocol for the bridge, context tracking and the event hub:
+- an energy VAD on the appended audio emits speech_started/stopped
+- it commits user items with scripted transcripts
+- each turn gets a response streamed as audio deltas, faster than real time
+- barge-in cancels the response in flight
+
+Everything between the two stand-ins (routing, suppression, capture,
+analytics, reaper, metrics, ...) is the production code path, which
+makes this a cheap way to load the whole stack.
+"""
+import os, re, json, math, uuid, base64, random, asyncio
+from array import array
+from html import unescape
+
+import httpx
+import websockets
+from twilio.request_validator import RequestValidator
+
+DRY_RUN            = os.getenv("DRY_RUN", "0") == "1"
+DRY_RUN_TURNS      = int(os.getenv("DRY_RUN_TURNS", 4))
+DRY_RUN_OUTCOMES   = os.getenv("DRY_RUN_OUTCOMES", "completed:0.8,no-answer:0.1,busy:0.1")
+RESPONSE_DELAY_MS  = int(os.getenv("DRY_RUN_RESPONSE_MS", 400))
+
+FRAME_MS   = 20
+END_OF_TURN_FRAMES = 25            # 500 ms of silence, the bridge's server_vad setting
+REPLY_S    = 1.6
+LINES = ["Hi, who is this?", "Okay, tell me more.", "How much does it cost?",
+         "I'm not sure, can you call back later?", "Alright, thanks. Bye."]
+
+# ── SYNTHETIC AUDIO ──────────────────────────────────────────────────────────
+def _ulaw(sample: int) -> int:
+    sign = 0x80 if sample < 0 else 0
+    mag = min(abs(sample), 32635) + 0x84
+    exp = max(0, mag.bit_length() - 8)
+    return ~(sign | (exp << 4) | ((mag >> (exp + 3)) & 0x0F)) & 0xFF
+
+def _voice(rate: int, seconds: float, pitch: float):
+    """Vowel-ish buzz with a 4 Hz syllable envelope, as 16-bit samples."""
+    n = int(rate * seconds)
+    return [int(9000 * abs(math.sin(math.pi * 4 * i / rate))
+                * sum(math.sin(2 * math.pi * pitch * h * i / rate) / h for h in (1, 2, 3)))
+            for i in range(n)]
+
+def _encode(samples, fmt: str) -> bytes:
+    if fmt == "pcm16":
+        return array("h", samples).tobytes()
+    return bytes(_ulaw(s) for s in samples)
+
+def _chunks(data: bytes, size: int):
+    return [base64.b64encode(data[i:i + size]).decode() for i in range(0, len(data), size)]
+
+CALLER_SPEECH = _chunks(_encode(_voice(8000, 1.0, 180), "g711_ulaw"), 160)   # 50 frames, looped
+SILENCE_FRAME = base64.b64encode(b"\xff" * 160).decode()
+_REPLY_CACHE  = {}
+
+def reply_deltas(fmt: str):
+    """~REPLY_S of agent speech as 100 ms deltas in the session's audio format."""
+    if fmt not in _REPLY_CACHE:
+        rate, width = (24000, 2) if fmt == "pcm16" else (8000, 1)
+        _REPLY_CACHE[fmt] = _chunks(_encode(_voice(rate, REPLY_S, 220), fmt), rate * width // 10)
+    return _REPLY_CACHE[fmt]
+
+def is_speech(payload: str, fmt: str) -> bool:
+    raw = base64.b64decode(payload)
+    if fmt == "pcm16":
+        samples = array("h", raw[:len(raw) & ~1])
+        return max(map(abs, samples[::8]), default=0) > 1000
+    # mu-law bytes with segment 0 (0x?F.. after inversion) are near-silent
+    sampled = raw[::8]
+    return sum((b & 0x70) != 0x70 for b in sampled) > len(sampled) // 4
+
+# ── UPSTREAM STAND-IN ────────────────────────────────────────────────────────
+class ScriptedRealtime:
+    """A local Realtime session: async-iterable for events, send() for client events."""
+
+    def __init__(self):
+        self.queue     = asyncio.Queue()
+        self.format    = "g711_ulaw"
+        self.closed    = False
+        self.ms        = 0             # input audio received, in ms
+        self.speaking  = False
+        self.quiet     = 0
+        self.speech_at = 0
+        self.turn      = 0
+        self.prev_item = None
+        self.response  = None          # task streaming the current response
+        self.emit("session.created", session={"id": f"sess_{uuid.uuid4().hex[:16]}"})
+
+    def emit(self, kind: str, **fields):
+        self.queue.put_nowait(json.dumps({"type": kind, "event_id": f"event_{uuid.uuid4().hex[:12]}",
+                                          **fields}, separators=(",", ":")))
+
+    async def __aiter__(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            yield message
+
+    async def send(self, text: str):
+        if text.startswith('{"type":"input_audio_buffer.append"'):
+            i = text.find('"audio":"') + 9
+            self.on_audio(text[i:text.find('"', i)])
+            return
+        event = json.loads(text)
+        kind = event.get("type")
+        if kind == "input_audio_buffer.append":
+            self.on_audio(event["audio"])
+        elif kind == "session.update":
+            self.format = event["session"].get("input_audio_format", self.format)
+            self.emit("session.updated", session=event["session"])
+        elif kind == "response.create":
+            self.start_response()
+        elif kind == "response.cancel":
+            self.cancel_response()
+        elif kind == "conversation.item.create":
+            item = dict(event["item"], id=event["item"].get("id") or f"item_{uuid.uuid4().hex[:12]}")
+            self.emit("conversation.item.created", item=item,
+                      previous_item_id=None if event.get("previous_item_id") == "root" else self.prev_item)
+        elif kind == "conversation.item.delete":
+            self.emit("conversation.item.deleted", item_id=event["item_id"])
+
+    def on_audio(self, payload: str):
+        self.ms += FRAME_MS if self.format != "pcm16" else len(payload) * 3 // 4 // 48
+        if is_speech(payload, self.format):
+            self.quiet = 0
+            if not self.speaking:
+                self.speaking, self.speech_at = True, self.ms
+                self.cancel_response()
+                self.emit("input_audio_buffer.speech_started", audio_start_ms=self.ms,
+                          item_id=f"item_u{self.turn}")
+        elif self.speaking:
+            self.quiet += 1
+            if self.quiet >= END_OF_TURN_FRAMES:
+                self.speaking = False
+                self.end_of_turn()
+
+    def end_of_turn(self):
+        item_id = f"item_u{self.turn}"
+        self.emit("input_audio_buffer.speech_stopped", audio_end_ms=self.ms, item_id=item_id)
+        self.emit("input_audio_buffer.committed", item_id=item_id, previous_item_id=self.prev_item)
+        self.emit("conversation.item.created", previous_item_id=self.prev_item,
+                  item={"id": item_id, "type": "message", "role": "user",
+                        "content": [{"type": "input_audio", "transcript": None}]})
+        self.prev_item = item_id
+        self.emit("conversation.item.input_audio_transcription.completed", item_id=item_id,
+                  content_index=0, transcript=LINES[self.turn % len(LINES)])
+        self.turn += 1
+        self.start_response()
+
+    def start_response(self):
+        self.cancel_response()
+        self.response = asyncio.ensure_future(self._respond(self.turn))
+
+    def cancel_response(self):
+        if self.response and not self.response.done():
+            self.response.cancel()
+        self.response = None
+
+    async def _respond(self, turn: int):
+        response_id, item_id = f"resp_{turn}_{uuid.uuid4().hex[:8]}", f"item_a{turn}"
+        text = f"Scripted reply number {turn}."
+        self.emit("response.created", response={"id": response_id, "status": "in_progress"})
+        try:
+            await asyncio.sleep(RESPONSE_DELAY_MS / 1000)
+            self.emit("conversation.item.created", previous_item_id=self.prev_item,
+                      item={"id": item_id, "type": "message", "role": "assistant", "content": []})
+            self.prev_item = item_id
+            for delta in reply_deltas(self.format):
+                self.emit("response.audio.delta", response_id=response_id, item_id=item_id,
+                          output_index=0, content_index=0, delta=delta)
+                await asyncio.sleep(0.02)      # ~5x faster than real time, like the API
+            self.emit("response.audio.done", response_id=response_id, item_id=item_id)
+            self.emit("response.audio_transcript.done", response_id=response_id,
+                      item_id=item_id, transcript=text)
+            self.emit("response.done", response={"id": response_id, "status": "completed"})
+        except asyncio.CancelledError:
+            self.emit("response.done", response={"id": response_id, "status": "cancelled"})
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.cancel_response()
+            self.queue.put_nowait(None)
+
+async def connect_scripted():
+    """Drop-in for bridge.connect_upstream."""
+    return ScriptedRealtime()
+
+# ── SIMULATED CALLER ─────────────────────────────────────────────────────────
+def _outcome() -> str:
+    roll, acc = random.random(), 0.0
+    for part in DRY_RUN_OUTCOMES.split(","):
+        status, weight = part.split(":")
+        acc += float(weight)
+        if roll < acc:
+            return status
+    return "completed"
+
+class SimulatedCaller:
+    def __init__(self, call_sid: str, number: str, twiml: str, status_callback: str,
+                 turns: int = DRY_RUN_TURNS, outcome: str = None, auth_token: str = None):
+        match = re.search(r'<Stream url="([^"]+)"', twiml)
+        if not match:
+            raise ValueError("TwiML has no <Stream url>")
+        self.url      = unescape(match.group(1))
+        self.call_sid = call_sid
+        self.number   = number
+        self.status_callback = status_callback
+        self.auth_token = auth_token        # signs the status callback, as Twilio does
+        self.turns    = turns
+        self.outcome  = outcome or _outcome()
+        self.stream_sid = "MZ" + uuid.uuid4().hex
+        self.received = 0
+        self.last_rx  = 0.0
+        self.seq      = 0
+
+    def frame(self, payload: str) -> str:
+        self.seq += 1
+        return ('{"event":"media","sequenceNumber":"%d","media":{"track":"inbound","chunk":"%d",'
+                '"timestamp":"%d","payload":"%s"},"streamSid":"%s"}'
+                % (self.seq, self.seq, self.seq * FRAME_MS, payload, self.stream_sid))
+
+    async def _listen(self, ws):
+        loop = asyncio.get_running_loop()
+        async for message in ws:
+            if '"media"' in message:
+                self.received += 1
+                self.last_rx = loop.time()
+
+    async def _talk(self, ws):
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+
+        async def send(payload):
+            nonlocal next_at
+            await ws.send(self.frame(payload))
+            next_at += FRAME_MS / 1000
+            await asyncio.sleep(max(0, next_at - loop.time()))
+
+        for _ in range(25):                                    # answer, half a second of line
+            await send(SILENCE_FRAME)
+        for turn in range(self.turns):
+            for i in range(random.randint(50, 120)):           # 1-2.4 s of speech
+                await send(CALLER_SPEECH[i % len(CALLER_SPEECH)])
+            # wait for the agent to answer and finish (or 6 s), feeding silence meanwhile
+            heard, waited = self.received, 0
+            while waited < 300:
+                await send(SILENCE_FRAME)
+                waited += 1
+                if self.received > heard and loop.time() - self.last_rx > 0.8:
+                    break
+        for _ in range(25):
+            await send(SILENCE_FRAME)
+
+    async def run(self):
+        duration = 0
+        if self.outcome == "completed":
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            try:
+                async with websockets.connect(self.url) as ws:
+                    await ws.send('{"event":"connected","protocol":"Call","version":"1.0.0"}')
+                    await ws.send(json.dumps({
+                        "event": "start", "sequenceNumber": "1", "streamSid": self.stream_sid,
+                        "start": {"streamSid": self.stream_sid, "callSid": self.call_sid,
+                                  "accountSid": "ACdryrun", "tracks": ["inbound"],
+                                  "customParameters": {},
+                                  "mediaFormat": {"encoding": "audio/x-mulaw",
+                                                  "sampleRate": 8000, "channels": 1}},
+                    }, separators=(",", ":")))
+                    listener = asyncio.ensure_future(self._listen(ws))
+                    try:
+                        await self._talk(ws)
+                        await ws.send('{"event":"stop","streamSid":"%s"}' % self.stream_sid)
+                    finally:
+                        listener.cancel()
+            except asyncio.CancelledError:
+                pass                                           # hung up from our side
+            except Exception as e:
+                print(f"Simulated call {self.call_sid} failed: {e}")
+                self.outcome = "failed"
+            duration = round(loop.time() - t0)
+        else:
+            await asyncio.sleep(random.uniform(2, 6))          # ringing
+        await self.post_status(duration)
+
+    async def post_status(self, duration: int):
+        if not self.status_callback:
+            return
+        form = {"CallSid": self.call_sid, "CallStatus": self.outcome, "To": self.number,
+                "CallDuration": str(duration), "AccountSid": "ACdryrun"}
+        headers = {}
+        if self.auth_token:
+            headers["X-Twilio-Signature"] = RequestValidator(self.auth_token).compute_signature(
+                self.status_callback, form)
+        try:
+            async with httpx.AsyncClient() as client:
+                await client.post(self.status_callback, data=form, headers=headers)
+        except Exception as e:
+            print(f"Simulated status callback for {self.call_sid} failed: {e}")
+
+# ── DIALER ───────────────────────────────────────────────────────────────────
+CALLERS = {}
+
+def dial(number: str, twiml: str, status_callback: str = None, **kwargs) -> str:
+    """Stand-in for twilio.calls.create; returns the new call SID."""
+    call_sid = "CA" + uuid.uuid4().hex
+    caller = SimulatedCaller(call_sid, number, twiml, status_callback, **kwargs)
+    task = asyncio.ensure_future(caller.run())
+    CALLERS[call_sid] = task
+    task.add_done_callback(lambda _: CALLERS.pop(call_sid, None))
+    return call_sid
+
+def hangup(call_sid: str):
+    """Stand-in for the REST hangup; safe to call from any thread."""
+    task = CALLERS.get(call_sid)
+    if task:
+        task.get_loop().call_soon_threadsafe(task.cancel)
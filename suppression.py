@@ -0,0 +1,243 @@
+"""
+Pre-dial suppression (do-not-call, already-contacted).
+
+Each list is a sorted file of int64 E.164 numbers that is memory-mapped at
+startup, so loading millions of numbers costs one mmap call. Lookups are a
+Bloom filter probe (when a .bloom file was built next to the list) and a
+bisect over the mapped array. Numbers added at runtime go to an in-memory
+set and an append-only journal; `compact` folds the journal into the file.
+
+Compaction is safe against a running server. It rotates the journal to
+.journal.1 rather than deleting it, and replaces the .bloom before the
+.bin, so an index never pairs a list with a filter that lacks its
+numbers. Every SUPPRESSION_RELOAD_S a server checks whether the .bin was
+replaced. If so it maps the new file, reloads the filter and reopens the
+journal. Numbers it added that the new file doesn't hold yet (written to
+the rotated journal after the compactor read it) are appended again.
+
+    python suppression.py build dnc numbers.txt     # one number per line
+    python suppression.py compact dnc
+"""
+import os, sys, mmap, time, bisect
+from array import array
+
+SUPPRESSION_DIR = os.getenv("SUPPRESSION_DIR", "suppression")
+RELOAD_EVERY_S  = float(os.getenv("SUPPRESSION_RELOAD_S", 2))
+LISTS           = ("dnc", "contacted")
+BLOOM_BITS_PER  = 10   # ~1% false positives with 7 hashes
+BLOOM_HASHES    = 7
+
+# ── E.164 ────────────────────────────────────────────────────────────────────
+def normalize_e164(number: str, default_cc: str = "1") -> str:
+    """'(405) 555-0100' -> '+14055550100'; raises ValueError if not a number."""
+    raw = (number or "").strip()
+    d = "".join(c for c in raw if c.isdigit())
+    if raw.startswith("+"):
+        pass
+    elif raw.startswith("00"):
+        d = d[2:]
+    elif default_cc == "1" and len(d) == 11 and d[0] == "1":
+        pass
+    else:
+        d = default_cc + d
+    if not 8 <= len(d) <= 15 or d[0] == "0":
+        raise ValueError(f"invalid phone number {number!r}")
+    if d[0] == "1" and len(d) != 11:
+        raise ValueError(f"invalid NANP number {number!r}")
+    return "+" + d
+
+def e164_int(e164: str) -> int:
+    return int(e164[1:])
+
+# ── BLOOM ────────────────────────────────────────────────────────────────────
+_MASK = (1 << 64) - 1
+
+class Bloom:
+    __slots__ = ("bits", "m")
+
+    def __init__(self, bits: bytearray):
+        self.bits = bits
+        self.m    = len(bits) * 8
+
+    @classmethod
+    def sized(cls, n: int):
+        return cls(bytearray(max(1, n * BLOOM_BITS_PER // 8)))
+
+    def _positions(self, x: int):
+        h1 = (x * 0x9E3779B97F4A7C15) & _MASK
+        h2 = ((x ^ (x >> 31)) * 0xBF58476D1CE4E5B9) & _MASK | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(BLOOM_HASHES)]
+
+    def add(self, x: int):
+        for p in self._positions(x):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, x: int) -> bool:
+        bits = self.bits
+        for p in self._positions(x):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+# ── INDEX ────────────────────────────────────────────────────────────────────
+class SuppressionIndex:
+    def __init__(self, name: str, directory: str = SUPPRESSION_DIR):
+        self.name    = name
+        self.path    = os.path.join(directory, f"{name}.bin")
+        self.added   = set()
+        self.bloom   = None
+        self._map    = None
+        self._sorted = memoryview(b"").cast("q")
+        self._journal = None
+        self._ident   = None      # (st_dev, st_ino) of the mapped .bin
+        self._checked = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        if self._map is not None:
+            self._sorted.release()
+            self._map.close()
+            self._map = None
+            self._sorted = memoryview(b"").cast("q")
+        self._ident = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                self._ident = (st.st_dev, st.st_ino)
+                if st.st_size:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._sorted = memoryview(self._map).cast("q")
+        self.bloom = None
+        if os.path.exists(self.path + ".bloom"):
+            with open(self.path + ".bloom", "rb") as f:
+                self.bloom = Bloom(bytearray(f.read()))
+        self.added = set()
+        if os.path.exists(self.path + ".journal"):
+            with open(self.path + ".journal", "rb") as f:
+                self.added.update(array("q", f.read()))
+            if self.bloom is not None:
+                for x in self.added:
+                    self.bloom.add(x)
+
+    def _in_file(self, x: int) -> bool:
+        arr = self._sorted
+        i = bisect.bisect_left(arr, x)
+        return i < len(arr) and arr[i] == x
+
+    def refresh(self):
+        """Pick up a .bin another process (compact, build) replaced; throttled."""
+        now = time.monotonic()
+        if now - self._checked < RELOAD_EVERY_S:
+            return
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+            ident = (st.st_dev, st.st_ino)
+        except FileNotFoundError:
+            ident = None
+        if ident == self._ident:
+            return
+        mine = self.added
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._open()
+        # what this process journaled after the compactor read the old journal
+        missing = [x for x in mine if x not in self.added and not self._in_file(x)]
+        if missing:
+            self._append(missing)
+        print(f"Suppression list {self.name} reloaded: {len(self)} numbers")
+
+    def __len__(self):
+        return len(self._sorted) + len(self.added)
+
+    def __contains__(self, x: int) -> bool:
+        self.refresh()
+        if self.bloom is not None and x not in self.bloom:
+            return False
+        return x in self.added or self._in_file(x)
+
+    def add(self, numbers):
+        new = [x for x in dict.fromkeys(numbers) if x not in self]
+        if not new:
+            return 0
+        self._append(new)
+        return len(new)
+
+    def _append(self, new):
+        self.added.update(new)
+        if self.bloom is not None:
+            for x in new:
+                self.bloom.add(x)
+        if self._journal is None:
+            self._journal = open(self.path + ".journal", "ab")
+        self._journal.write(array("q", new).tobytes())
+        self._journal.flush()
+
+    def compact(self):
+        """Merge the journal into the sorted file and rebuild the Bloom filter."""
+        journal = self.path + ".journal"
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        # rotate first, so a server's appends from here on go to a fresh journal
+        # (or into the rotated one, which it re-appends after seeing the new .bin)
+        if os.path.exists(journal):
+            os.replace(journal, journal + ".1")
+            with open(journal + ".1", "rb") as f:
+                self.added.update(array("q", f.read()))
+        merged = array("q", sorted(set(self._sorted).union(self.added)))
+        write_list(self.path, merged)
+        self._open()
+
+def write_list(path: str, numbers: array):
+    """
+    Write a sorted int64 list plus its Bloom filter, replacing each atomically;
+    the filter goes first so it always covers whichever list a reader maps.
+    """
+    bloom = Bloom.sized(len(numbers))
+    for x in numbers:
+        bloom.add(x)
+    for suffix, data in ((".bloom", bytes(bloom.bits)), ("", numbers.tobytes())):
+        with open(path + suffix + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + suffix + ".tmp", path + suffix)
+
+# ── SUPPRESSION LISTS ────────────────────────────────────────────────────────
+class Suppression:
+    def __init__(self, directory: str = SUPPRESSION_DIR):
+        self.lists = {name: SuppressionIndex(name, directory) for name in LISTS}
+
+    def check(self, e164: str):
+        """Name of the first list containing the number, or None."""
+        x = e164_int(e164)
+        for name, index in self.lists.items():
+            if x in index:
+                return name
+        return None
+
+    def add(self, list_name: str, numbers) -> int:
+        return self.lists[list_name].add(e164_int(normalize_e164(n)) for n in numbers)
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    cmd, name = sys.argv[1], sys.argv[2]
+    index_path = os.path.join(SUPPRESSION_DIR, f"{name}.bin")
+    if cmd == "build":
+        os.makedirs(SUPPRESSION_DIR, exist_ok=True)
+        nums, bad = set(), 0
+        with open(sys.argv[3]) as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        nums.add(e164_int(normalize_e164(line)))
+                    except ValueError:
+                        bad += 1
+        write_list(index_path, array("q", sorted(nums)))
+        print(f"{name}: {len(nums)} numbers written ({bad} skipped)")
+    elif cmd == "compact":
+        index = SuppressionIndex(name)
+        index.compact()
+        print(f"{name}: {len(index)} numbers")
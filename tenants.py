@@ -0,0 +1,241 @@
+"""
+Per-tenant API keys, concurrent-call quotas and dial-rate limits.
+
+Tenants come from TENANTS (a JSON file). Keys are stored only as SHA-256
+hex digests; generate one with `python tenants.py hash <key>`:
+
+    {"roofing": {"key_sha256": "9f86d0...", "max_concurrent": 10,
+                 "dial_rate": 0.5, "burst": 5, "agents": ["alex", "jessica"]}}
+
+dial_rate is dials per second refilled into a token bucket of size
+burst; a missing "agents" list allows every agent. Without the file the
+service stays open as before (tenancy off).
+
+Every check is O(1): one hash and dict lookup for the key, a bucket
+refill, and the length of the tenant's live-call table. A call counts
+against its tenant from admission (a slot is reserved before Twilio is
+asked, and given back if the dial fails) until its final status callback
+or the end of its bridge, whichever comes first; entries older than
+TENANT_CALL_TTL_S are expired from the front of the table in case
+neither ever arrives.
+
+With tenancy on, a media stream must carry a token from stream_params:
+the tenant it belongs to (empty for unscoped calls: inbound, or dialed
+with the admin token), the call SID when the TwiML was rendered for a
+known call, else a random nonce, and an expiry TENANT_STREAM_TTL_S out,
+all signed. A token opens one stream before it expires; the bridge also
+checks a bound call SID against the stream's start frame. Unscoped
+streams share a cap of TENANT_UNSCOPED_STREAMS.
+"""
+import os, sys, hmac, json, time, hashlib, secrets
+from collections import OrderedDict
+
+from metrics import Counter, Gauge
+
+TENANTS           = os.getenv("TENANTS", "tenants.json")
+TENANT_CALL_TTL_S = float(os.getenv("TENANT_CALL_TTL_S", 7200))
+TENANT_STREAM_TTL_S = float(os.getenv("TENANT_STREAM_TTL_S", 600))
+TENANT_UNSCOPED_STREAMS = int(os.getenv("TENANT_UNSCOPED_STREAMS", 20))
+
+DIALS  = Counter("tenant_dials_total", "Dial attempts by tenant and result", ("tenant", "result"))
+ACTIVE = Gauge("tenant_calls_active", "Calls dialed and not yet finished, by tenant", ("tenant",))
+STREAMS = Gauge("tenant_streams_active", "Bridged media streams, by tenant", ("tenant",))
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class Tenant:
+    __slots__ = ("name", "key_sha256", "max_concurrent", "rate", "burst", "agents",
+                 "tokens", "stamp", "calls", "dialing", "streams")
+
+    def __init__(self, name: str, key_sha256: str, max_concurrent: int = 5,
+                 dial_rate: float = 1.0, burst: int = 5, agents=None):
+        self.name           = name
+        self.key_sha256     = key_sha256
+        self.max_concurrent = max_concurrent
+        self.rate           = dial_rate
+        self.burst          = burst
+        self.agents         = frozenset(agents) if agents is not None else None
+        self.tokens         = float(burst)
+        self.stamp          = time.monotonic()
+        self.calls          = OrderedDict()   # call_sid -> monotonic dial time, oldest first
+        self.dialing        = 0               # slots reserved by admit_dial, not yet placed
+        self.streams        = 0
+
+    def allows(self, agent: str) -> bool:
+        return self.agents is None or agent in self.agents
+
+    def take(self, now: float = None) -> float:
+        """Take a dial token; returns 0 on success, else seconds until one is free."""
+        now = now or time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+class Tenants:
+    def __init__(self, path: str = TENANTS, secret: str = None):
+        self.secret  = secret.encode() if secret else os.urandom(32)
+        self.by_name = {}
+        self.by_hash = {}
+        self.by_call = {}          # call_sid -> Tenant
+        self.spent   = OrderedDict()   # stream token id -> expiry, oldest first
+        self.unscoped = 0          # open streams with no tenant
+        if os.path.exists(path):
+            with open(path) as f:
+                for name, spec in json.load(f).items():
+                    tenant = Tenant(name, **spec)
+                    self.by_name[name] = tenant
+                    self.by_hash[tenant.key_sha256] = tenant
+            print(f"Tenants: {len(self.by_name)} loaded from {path}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.by_name)
+
+    def authenticate(self, headers):
+        """Tenant for the request's X-API-Key (or Bearer token), else None."""
+        key = headers.get("x-api-key")
+        if not key:
+            auth = headers.get("authorization", "")
+            key = auth[7:] if auth[:7].lower() == "bearer " else None
+        return self.by_hash.get(hash_key(key)) if key else None
+
+    def get(self, name: str):
+        return self.by_name.get(name)
+
+    def active(self, tenant: Tenant) -> int:
+        """Live calls for the tenant, after expiring ones nothing ever finished."""
+        now = time.monotonic()
+        while tenant.calls:
+            sid, started = next(iter(tenant.calls.items()))
+            if now - started < TENANT_CALL_TTL_S:
+                break
+            del tenant.calls[sid]
+            self.by_call.pop(sid, None)
+        return len(tenant.calls)
+
+    def admit_dial(self, tenant: Tenant, agent: str):
+        """
+        None if the tenant may dial now, else (status, error, retry_after).
+        Admission reserves a call slot; follow it with dialed() or release().
+        """
+        if not tenant.allows(agent):
+            DIALS.inc(tenant=tenant.name, result="agent_denied")
+            return 403, f"agent {agent} is not enabled for this key", None
+        if self.active(tenant) + tenant.dialing >= tenant.max_concurrent:
+            DIALS.inc(tenant=tenant.name, result="over_quota")
+            return 429, f"concurrent call quota of {tenant.max_concurrent} reached", None
+        wait = tenant.take()
+        if wait:
+            DIALS.inc(tenant=tenant.name, result="rate_limited")
+            return 429, "dial rate limit exceeded", wait
+        tenant.dialing += 1
+        return None
+
+    def dialed(self, tenant: Tenant, call_sid: str):
+        """The admitted dial was placed: its reserved slot becomes the call."""
+        tenant.dialing -= 1
+        tenant.calls[call_sid] = time.monotonic()
+        self.by_call[call_sid] = tenant
+        DIALS.inc(tenant=tenant.name, result="placed")
+        ACTIVE.set(len(tenant.calls), tenant=tenant.name)
+
+    def release(self, tenant: Tenant):
+        """The admitted dial failed before a call existed."""
+        tenant.dialing -= 1
+        DIALS.inc(tenant=tenant.name, result="dial_failed")
+
+    def finished(self, call_sid: str):
+        tenant = self.by_call.pop(call_sid, None)
+        if tenant is not None:
+            tenant.calls.pop(call_sid, None)
+            ACTIVE.set(len(tenant.calls), tenant=tenant.name)
+
+    def _sign(self, *fields) -> str:
+        return hmac.new(self.secret, "|".join(fields).encode(), hashlib.sha256).hexdigest()[:32]
+
+    def stream_params(self, tenant=None, call_sid: str = None) -> dict:
+        """
+        Media-stream query parameters for one call placed under tenant (None:
+        unscoped), bound to call_sid when it is already known.
+        """
+        if not self.enabled:
+            return {}
+        name = tenant.name if tenant else ""
+        params = {"tenant": name}
+        if call_sid:
+            params["call"] = call_sid
+        else:
+            params["nonce"] = secrets.token_hex(8)
+        params["exp"] = str(int(time.time() + TENANT_STREAM_TTL_S))
+        params["sig"] = self._sign(name, params.get("call", ""), params.get("nonce", ""), params["exp"])
+        return params
+
+    def _spend(self, token: str, exp: int) -> bool:
+        """Mark a stream token used; False if it already was."""
+        now = time.time()
+        while self.spent:
+            oldest, until = next(iter(self.spent.items()))
+            if until >= now:
+                break
+            del self.spent[oldest]
+        if token in self.spent:
+            return False
+        self.spent[token] = exp
+        return True
+
+    def admit_stream(self, params):
+        """(tenant or None, None) if the stream may open, else (None, (close code, reason))."""
+        if not self.enabled:
+            return None, None
+        name, call, nonce, exp = (params.get(k, "") for k in ("tenant", "call", "nonce", "exp"))
+        if not hmac.compare_digest(params.get("sig", ""), self._sign(name, call, nonce, exp)):
+            return None, (1008, "unsigned stream")
+        if not exp.isdigit() or int(exp) < time.time():
+            return None, (1008, "expired stream token")
+        if not self._spend(call or nonce, int(exp)):
+            return None, (1008, "stream token already used")
+        if not name:
+            if self.unscoped >= TENANT_UNSCOPED_STREAMS:
+                return None, (1013, "unscoped stream limit reached")
+            self.unscoped += 1
+            STREAMS.set(self.unscoped, tenant="")
+            return None, None
+        tenant = self.by_name.get(name)
+        if tenant is None:
+            return None, (1008, "unknown tenant")
+        if not self.open_stream(tenant):
+            return None, (1013, "tenant stream quota reached")
+        return tenant, None
+
+    def open_stream(self, tenant: Tenant) -> bool:
+        if tenant.streams >= tenant.max_concurrent:
+            return False
+        tenant.streams += 1
+        STREAMS.set(tenant.streams, tenant=tenant.name)
+        return True
+
+    def close_stream(self, tenant: Tenant = None):
+        """End a stream admit_stream let open (tenant None: an unscoped one)."""
+        if not self.enabled:
+            return
+        if tenant is None:
+            self.unscoped -= 1
+            STREAMS.set(self.unscoped, tenant="")
+            return
+        tenant.streams -= 1
+        STREAMS.set(tenant.streams, tenant=tenant.name)
+
+    def usage(self) -> dict:
+        return {t.name: {"active_calls": self.active(t), "dialing": t.dialing, "streams": t.streams,
+                         "max_concurrent": t.max_concurrent, "dial_tokens": round(t.tokens, 2),
+                         "agents": sorted(t.agents) if t.agents is not None else None}
+                for t in self.by_name.values()}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "hash":
+        sys.exit("usage: python tenants.py hash API_KEY")
+    print(hash_key(sys.argv[2]))
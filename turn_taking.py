@@ -0,0 +1,234 @@
+"""
+Per-agent turn-detection profiles, measured turn-taking stats, and an
+optional auto-tuner for both.
+
+A profile is the server_vad settings sent in session.update: the
+defaults below, overridden per agent from TURN_PROFILES (a JSON file),
+then by whatever the tuner has learned (TURN_TUNING, rewritten on every
+change):
+
+    {"jessica": {"silence_duration_ms": 350}, "stacy": {"threshold": 0.6}}
+
+Each bridged call carries a TurnMeter fed from the upstream VAD events and
+audio deltas. It measures two things per agent:
+
+  * response latency: speech_stopped to the first audio delta of the reply
+  * talk-over: the caller starting to speak while the agent's audio is
+    still playing on the phone. Playout is estimated from the audio sent
+    so far, since deltas arrive faster than real time. A talk-over shorter
+    than TALKOVER_NOISE_S is counted as noise (a cough, a door) rather than
+    the caller carrying on.
+
+With TURN_AUTOTUNE=1, every TURN_TUNE_EVERY responses the agent's window
+is checked against TURN_TARGET_TALKOVER and TURN_TARGET_LATENCY_MS and
+one setting moves by one step, never outside the bounds below. Too many
+noise talk-overs raise the threshold; too many real ones lengthen the
+silence; a quiet line with slow replies shortens it. Changes apply to the
+next call, never to a call in progress.
+"""
+import os, json
+from collections import deque
+
+from event_hub import hub
+from metrics import Counter, Histogram
+
+TURN_PROFILES          = os.getenv("TURN_PROFILES", "turn_profiles.json")
+TURN_TUNING            = os.getenv("TURN_TUNING", "turn_tuning.json")
+TURN_AUTOTUNE          = os.getenv("TURN_AUTOTUNE", "0") == "1"
+TURN_TUNE_EVERY        = int(os.getenv("TURN_TUNE_EVERY", 30))
+TURN_TARGET_TALKOVER   = float(os.getenv("TURN_TARGET_TALKOVER", 0.15))
+TURN_TARGET_LATENCY_MS = int(os.getenv("TURN_TARGET_LATENCY_MS", 900))
+TURN_WINDOW            = 500          # latencies kept per agent for percentiles
+TALKOVER_NOISE_S       = 0.5
+
+DEFAULT_PROFILE = {
+    "threshold": 0.5,
+    "prefix_padding_ms": 300,
+    "silence_duration_ms": 500,
+}
+# (low, high, step) the tuner stays inside
+BOUNDS = {
+    "threshold":           (0.35, 0.8, 0.05),
+    "silence_duration_ms": (200, 1000, 50),
+}
+
+# seconds of playout per base64 character of a delta
+_PLAYOUT_S = {"g711_ulaw": 0.75 / 8000, "pcm16": 0.75 / 48000}
+
+LATENCY   = Histogram("turn_response_latency_seconds", "Caller speech stop to first reply audio",
+                      (0.3, 0.5, 0.7, 0.9, 1.2, 1.5, 2, 3, 5), ("agent",))
+RESPONSES = Counter("turn_responses_total", "Agent audio responses", ("agent",))
+TALKOVERS = Counter("turn_talkovers_total", "Caller speech during agent playout",
+                    ("agent", "kind"))
+
+def _pct(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+# ── STATS ────────────────────────────────────────────────────────────────────
+class TurnStats:
+    __slots__ = ("latencies", "responses", "talkovers", "noise",
+                 "w_responses", "w_talkovers", "w_noise", "w_latencies")
+
+    def __init__(self):
+        self.latencies = deque(maxlen=TURN_WINDOW)
+        self.responses = self.talkovers = self.noise = 0
+        self.reset_window()
+
+    def reset_window(self):
+        self.w_responses = self.w_talkovers = self.w_noise = 0
+        self.w_latencies = []
+
+    def summary(self) -> dict:
+        p50, p90 = _pct(self.latencies, 0.5), _pct(self.latencies, 0.9)
+        return {
+            "responses": self.responses,
+            "talkovers": self.talkovers,
+            "noise_talkovers": self.noise,
+            "talkover_rate": round(self.talkovers / self.responses, 3) if self.responses else None,
+            "latency_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "latency_p90_ms": round(p90 * 1000) if p90 is not None else None,
+        }
+
+# ── PER-CALL METER ───────────────────────────────────────────────────────────
+class TurnMeter:
+    """Fed by one bridge; all times are the bridge's monotonic clock."""
+    __slots__ = ("agent", "owner", "playout_s", "stopped_at", "playout_until", "talkover_at")
+
+    def __init__(self, owner, agent: str, audio_format: str = "g711_ulaw"):
+        self.owner         = owner
+        self.agent         = agent
+        self.playout_s     = _PLAYOUT_S.get(audio_format, _PLAYOUT_S["g711_ulaw"])
+        self.stopped_at    = None     # caller's last speech_stopped, until reply audio
+        self.playout_until = 0.0      # when the audio sent so far finishes playing
+        self.talkover_at   = None
+
+    def speech_started(self, now: float):
+        if now < self.playout_until:
+            self.talkover_at = now
+
+    def speech_stopped(self, now: float):
+        self.stopped_at = now
+        if self.talkover_at is not None:
+            noise = now - self.talkover_at < TALKOVER_NOISE_S
+            self.talkover_at = None
+            self.owner.talkover(self.agent, noise)
+
+    def audio(self, now: float, chars: int):
+        """An audio delta of `chars` base64 characters is on its way to the caller."""
+        if now >= self.playout_until:          # nothing playing: a new response
+            self.owner.response(self.agent, now - self.stopped_at if self.stopped_at else None)
+            self.stopped_at = None
+            self.playout_until = now
+        self.playout_until += chars * self.playout_s
+
+# ── PROFILES ─────────────────────────────────────────────────────────────────
+class TurnProfiles:
+    def __init__(self, path: str = TURN_PROFILES, tuning_path: str = TURN_TUNING,
+                 autotune: bool = TURN_AUTOTUNE, every: int = TURN_TUNE_EVERY):
+        self.tuning_path = tuning_path
+        self.autotune    = autotune
+        self.every       = every
+        self.overrides   = {}
+        self.tuned       = {}
+        self.stats       = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.overrides = json.load(f)
+        if os.path.exists(tuning_path):
+            with open(tuning_path) as f:
+                self.tuned = json.load(f)
+
+    def profile(self, agent: str) -> dict:
+        return {**DEFAULT_PROFILE, **self.overrides.get(agent, {}), **self.tuned.get(agent, {})}
+
+    def turn_detection(self, agent: str) -> dict:
+        return {"type": "server_vad", **self.profile(agent)}
+
+    def meter(self, agent: str, audio_format: str = "g711_ulaw") -> TurnMeter:
+        return TurnMeter(self, agent, audio_format)
+
+    def _stats(self, agent: str) -> TurnStats:
+        s = self.stats.get(agent)
+        if s is None:
+            s = self.stats[agent] = TurnStats()
+        return s
+
+    # ── fed by meters ────────────────────────────────────────────────────────
+    def response(self, agent: str, latency: float = None):
+        s = self._stats(agent)
+        s.responses += 1
+        s.w_responses += 1
+        RESPONSES.inc(agent=agent)
+        if latency is not None:
+            s.latencies.append(latency)
+            s.w_latencies.append(latency)
+            LATENCY.observe(latency, agent=agent)
+        if self.autotune and s.w_responses >= self.every:
+            self.tune(agent)
+
+    def talkover(self, agent: str, noise: bool):
+        s = self._stats(agent)
+        s.talkovers += 1
+        s.w_talkovers += 1
+        if noise:
+            s.noise += 1
+            s.w_noise += 1
+        TALKOVERS.inc(agent=agent, kind="noise" if noise else "speech")
+
+    # ── tuning ───────────────────────────────────────────────────────────────
+    def tune(self, agent: str):
+        """Move at most one setting one step from the current window; returns the change."""
+        s = self._stats(agent)
+        if not s.w_responses:
+            return None
+        rate = s.w_talkovers / s.w_responses
+        p50  = _pct(s.w_latencies, 0.5)
+        change = None
+        if rate > TURN_TARGET_TALKOVER:
+            if s.w_noise * 2 >= s.w_talkovers:
+                change = ("threshold", +1)
+            else:
+                change = ("silence_duration_ms", +1)
+        elif rate < TURN_TARGET_TALKOVER / 2 and p50 is not None and p50 * 1000 > TURN_TARGET_LATENCY_MS:
+            change = ("silence_duration_ms", -1)
+        s.reset_window()
+        if change is None:
+            return None
+
+        key, direction = change
+        low, high, step = BOUNDS[key]
+        old = self.profile(agent)[key]
+        new = round(min(high, max(low, old + direction * step)), 2)
+        if new == old:
+            return None
+        self.tuned.setdefault(agent, {})[key] = new
+        self._save()
+        print(f"Turn profile for {agent}: {key} {old} -> {new} "
+              f"(talk-over {rate:.0%}, p50 {round(p50 * 1000) if p50 else '-'} ms)")
+        hub.publish("turn.tuned", agent=agent, setting=key, old=old, new=new,
+                    talkover_rate=round(rate, 3))
+        return key, old, new
+
+    def reset(self, agent: str):
+        """Drop what the tuner learned for an agent."""
+        self.tuned.pop(agent, None)
+        self._save()
+
+    def _save(self):
+        tmp = self.tuning_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.tuned, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.tuning_path)
+
+    def report(self, agents=()) -> dict:
+        names = sorted(set(agents) | set(self.stats) | set(self.overrides) | set(self.tuned))
+        return {
+            "autotune": self.autotune,
+            "agents": {a: {"profile": self.profile(a), "tuned": self.tuned.get(a, {}),
+                           **self._stats(a).summary()} for a in names},
+        }
+
+turns = TurnProfiles()
@@ -0,0 +1,63 @@
+"""
+Precompiled TwiML for the media-stream webhooks.
+
+Every (agent, scenario) document is rendered once with VoiceResponse and
+split around a placeholder in the Stream URL; a webhook only joins the
+cached bytes with its URL-encoded, XML-escaped per-call parameters.
+"""
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape
+
+from twilio.twiml.voice_response import VoiceResponse
+
+SCENARIOS = ("outbound", "inbound")
+_SLOT     = "__PER_CALL_PARAMS__"
+
+def ws_base(url: str) -> str:
+    """https://host -> wss://host, http://host -> ws://host"""
+    if url.startswith("https://"):
+        url = "wss://" + url[len("https://"):]
+    elif url.startswith("http://"):
+        url = "ws://" + url[len("http://"):]
+    return url.rstrip("/")
+
+# ── ENGINE ───────────────────────────────────────────────────────────────────
+class TwimlEngine:
+    def __init__(self, base_url: str, agents, path: str = "/media-stream"):
+        self.path       = path
+        self.base_url   = None
+        self._agents    = list(agents)
+        self._templates = {}
+        self.compile(base_url)
+
+    def compile(self, base_url: str, agents=None):
+        """(Re)build every template; call on startup or when config changes."""
+        if agents is not None:
+            self._agents = list(agents)
+        base = ws_base(base_url)
+        templates = {}
+        for agent in self._agents:
+            for scenario in SCENARIOS:
+                url = f"{base}{self.path}?" + urlencode({"agent": agent, "scenario": scenario})
+                vr = VoiceResponse()
+                vr.connect().stream(url=url + _SLOT)
+                head, tail = str(vr).encode().split(_SLOT.encode())
+                templates[(agent, scenario)] = (head, tail, head + tail)
+        # single assignment: concurrent renders see the old set or the new one
+        self._templates = templates
+        self.base_url = base_url
+        print(f"TwiML compiled: {len(templates)} templates for {base}")
+
+    def ensure_base(self, base_url: str):
+        if base_url != self.base_url:
+            self.compile(base_url)
+
+    def render(self, agent: str, scenario: str, params: dict = None) -> bytes:
+        head, tail, full = self._templates[(agent, scenario)]
+        if not params:
+            return full
+        return b"".join((head, escape("&" + urlencode(params)).encode(), tail))
+
+    def stream_url(self, agent: str, scenario: str, params: dict = None) -> str:
+        qs = {"agent": agent, "scenario": scenario, **(params or {})}
+        return f"{ws_base(self.base_url)}{self.path}?{urlencode(qs)}"